@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Indexed aggregate store behind the dashboard's /api endpoints.
+query_messages_detailed.py writes message_stats.db with every resolved contact's
+sent/received counts and response-time quantiles per month; chart/serve.py answers
+date-range + top-N queries from it, so a chart downloads only the periods and
+contacts it draws instead of the full CSVs.
+
+Counts are stored as a rollup pyramid: rollup() sums the per-day, per-contact counts
+into weeks (starting Monday) and months, months into quarters and quarters into
+years, and all five levels live in one table keyed by (level, period, contact_id).
+series() serves whichever level fits the chart's pixel width, so a 15-year range
+comes back as months or years rather than ~5,500 days.
+
+Periods are integer keys: days are date ordinals, weeks (ordinal - 1) // 7, months
+year * 12 + month - 1, quarters year * 4 + quarter - 1, years the year. Every table
+is keyed by period then contact_id, so a date range is an index range scan.
+contact_id is the contact's all-time rank (1 = most messages), which the charts also
+use for colors.
+Usage: python3 aggregate_store.py   # store summary and payload sizes per range
+"""
+
+import heapq
+import json
+import os
+import re
+import sqlite3
+import statistics
+from datetime import date
+
+STORE_PATH = "message_stats.db"
+
+SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE contacts (
+        contact_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    );
+    CREATE TABLE rollup (
+        level INTEGER NOT NULL,
+        period INTEGER NOT NULL,
+        contact_id INTEGER NOT NULL,
+        sent INTEGER NOT NULL,
+        recv INTEGER NOT NULL,
+        PRIMARY KEY (level, period, contact_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX rollup_by_contact ON rollup (level, contact_id, period);
+    CREATE VIEW monthly AS
+        SELECT period AS month, contact_id, sent, recv FROM rollup WHERE level = 2;
+    CREATE TABLE response (
+        month INTEGER NOT NULL,
+        contact_id INTEGER NOT NULL,
+        my_median REAL,
+        their_median REAL,
+        my_count INTEGER NOT NULL,
+        their_count INTEGER NOT NULL,
+        my_p90 REAL,
+        their_p90 REAL,
+        my_p99 REAL,
+        their_p99 REAL,
+        PRIMARY KEY (month, contact_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX response_by_contact ON response (contact_id, month);
+"""
+
+LEVELS = ("day", "week", "month", "quarter", "year")
+DAY, WEEK, MONTH, QUARTER, YEAR = range(len(LEVELS))
+
+MONTH_RE = re.compile(r"^(\d{4})-(\d{2})$")
+DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+RESPONSE_SORTS = ("my_response", "their_response", "difference")
+# response() ranks only the busiest contacts in the range, like the exporters' default --top 50,
+# so a contact with a handful of replies can't take the fastest/slowest slots
+RESPONSE_CANDIDATES = 50
+RACE_MODES = ("monthly", "cumulative")
+MAX_RACE_BARS = 50
+# series() picks the finest level that leaves every period at least this many pixels
+MIN_POINT_PX = 4
+DEFAULT_WIDTH = 1000
+MAX_WIDTH = 20_000
+# series() rows at most; with pick_level() this bounds a response to rows x width / MIN_POINT_PX values
+MAX_SERIES_TOP = 100
+# How long a reader waits for a write (fold_updates()) to finish before giving up
+READ_BUSY_SECONDS = 5
+
+
+def month_key(label):
+    """'2023-01' -> 2023 * 12 + 0. Raises ValueError for anything else."""
+    match = MONTH_RE.match(label or "")
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"expected YYYY-MM, got {label!r}")
+    return int(match.group(1)) * 12 + int(match.group(2)) - 1
+
+
+def month_label(key):
+    return f"{key // 12}-{key % 12 + 1:02d}"
+
+
+def quarter_label(key):
+    return f"{key // 12}-Q{key % 12 // 3 + 1}"
+
+
+def day_key(label, end=False):
+    """
+    '2023-01-05' -> its date ordinal. A 'YYYY-MM' label means the month's first day,
+    or its last with end=True. Raises ValueError for anything else.
+    """
+    match = DATE_RE.match(label or "")
+    try:
+        if match:
+            return date(*map(int, match.groups())).toordinal()
+        return period_start(MONTH, month_key(label) + end).toordinal() - end
+    except ValueError:
+        raise ValueError(f"expected YYYY-MM or YYYY-MM-DD, got {label!r}") from None
+
+
+def store_end_month(latest):
+    """
+    Last month key of a store whose newest message falls in month key latest. The range
+    runs one month past it; full exports and fold_updates() both use this rule.
+    """
+    return latest + 1
+
+
+def period_of(level, ordinal):
+    """Period key containing a day (date ordinal) at a pyramid level."""
+    if level == DAY:
+        return ordinal
+    if level == WEEK:
+        return (ordinal - 1) // 7  # date ordinal 1 is a Monday
+    day = date.fromordinal(ordinal)
+    key = day.year * 12 + day.month - 1
+    return {MONTH: key, QUARTER: key // 3, YEAR: day.year}[level]
+
+
+def period_start(level, key):
+    """First day of a period, as a date."""
+    if level == DAY:
+        return date.fromordinal(key)
+    if level == WEEK:
+        return date.fromordinal(key * 7 + 1)
+    if level == YEAR:
+        return date(key, 1, 1)
+    if level == QUARTER:
+        key *= 3
+    return date(key // 12, key % 12 + 1, 1)
+
+
+def period_label(level, key):
+    """'2023-01-05' for days and weeks (the Monday), '2023-01', '2023-Q1', '2023'."""
+    if level == YEAR:
+        return str(key)
+    if level == QUARTER:
+        return f"{key // 4}-Q{key % 4 + 1}"
+    if level == MONTH:
+        return month_label(key)
+    return period_start(level, key).isoformat()
+
+
+def _roll(cells, period_map):
+    out = {}
+    for (period, contact_id), (sent, recv) in cells.items():
+        cell = out.setdefault((period_map(period), contact_id), [0, 0])
+        cell[0] += sent
+        cell[1] += recv
+    return out
+
+
+def rollup(daily):
+    """
+    Every pyramid level from per-day counts in one pass per level.
+    daily: {(date ordinal, contact_id): [sent, recv]}
+    Returns {level: {(period, contact_id): [sent, recv]}}. Weeks and months are summed
+    from days (weeks straddle months), quarters from months and years from quarters.
+    """
+    month_of = {}
+    for ordinal, _ in daily:
+        if ordinal not in month_of:
+            month_of[ordinal] = period_of(MONTH, ordinal)
+    levels = {DAY: daily}
+    levels[WEEK] = _roll(daily, lambda ordinal: (ordinal - 1) // 7)
+    levels[MONTH] = _roll(daily, month_of.__getitem__)
+    levels[QUARTER] = _roll(levels[MONTH], lambda key: key // 3)
+    levels[YEAR] = _roll(levels[QUARTER], lambda key: key // 4)
+    return levels
+
+
+def _rollup_rows(daily, contact_ids):
+    """rollup() of {(date ordinal, name): [sent, recv]} as rollup table rows."""
+    levels = rollup({(ordinal, contact_ids[name]): counts for (ordinal, name), counts in daily.items()})
+    return [
+        (level, period, contact_id, sent, recv)
+        for level, cells in levels.items()
+        for (period, contact_id), (sent, recv) in cells.items()
+        if sent or recv
+    ]
+
+
+def write_store(results, months, daily, response_rows, watermark, path=STORE_PATH):
+    """
+    Rebuild the store.
+    results: [{"name", ...}] for every contact, in rank order
+    months: [(year, month)] of the exported range (response_rows index into it)
+    daily: {(date ordinal, name): [sent, recv]} per-day counts, rolled up here
+    response_rows: [(name, month_idx, my_median, their_median, my_count, their_count,
+                     my_p90, their_p90, my_p99, their_p99)]
+    watermark: highest chat.db message ROWID the counts include (see fold_updates())
+    Written to a temp file and swapped in, so the server never reads a half-built store.
+    """
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    keys = [y * 12 + m - 1 for y, m in months]
+    contact_ids = {r["name"]: contact_id for contact_id, r in enumerate(results, 1)}
+
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO meta VALUES (?, ?)",
+        [("first_month", str(keys[0])), ("last_month", str(keys[-1])), ("last_rowid", str(watermark))],
+    )
+    conn.executemany("INSERT INTO contacts VALUES (?, ?)", [(i, name) for name, i in contact_ids.items()])
+    conn.executemany("INSERT INTO rollup VALUES (?, ?, ?, ?, ?)", _rollup_rows(daily, contact_ids))
+    conn.executemany(
+        "INSERT INTO response VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (keys[row[1]], contact_ids[row[0]], *row[2:])
+            for row in response_rows
+            if row[0] in contact_ids
+        ),
+    )
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def fold_updates(conn, counts, responses, watermark):
+    """
+    Apply an incremental update in one transaction (conn is a writable connection).
+    counts: {(date ordinal, name): [sent, recv]} added to the stored counts at every
+            pyramid level
+    responses: {(month, name): response values or None} replacing those cells
+    watermark: new highest folded ROWID
+    Contacts seen for the first time are appended after the existing ranks.
+    """
+    contact_ids = dict(conn.execute("SELECT name, contact_id FROM contacts"))
+    next_id = max(contact_ids.values(), default=0) + 1
+    for _, name in list(counts) + list(responses):
+        if name not in contact_ids:
+            contact_ids[name] = next_id
+            conn.execute("INSERT INTO contacts VALUES (?, ?)", (next_id, name))
+            next_id += 1
+
+    conn.executemany(
+        """
+        INSERT INTO rollup VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (level, period, contact_id) DO UPDATE
+        SET sent = sent + excluded.sent, recv = recv + excluded.recv
+        """,
+        _rollup_rows(counts, contact_ids),
+    )
+    for (month, name), values in responses.items():
+        conn.execute("DELETE FROM response WHERE month = ? AND contact_id = ?", (month, contact_ids[name]))
+        if values:
+            conn.execute(
+                "INSERT INTO response VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (month, contact_ids[name], *values),
+            )
+
+    _, last = _bounds(conn)
+    last = max([last] + [store_end_month(period_of(MONTH, ordinal)) for ordinal, _ in counts])
+    conn.executemany(
+        "UPDATE meta SET value = ? WHERE key = ?",
+        [(str(last), "last_month"), (str(watermark), "last_rowid")],
+    )
+    conn.commit()
+
+
+def watermark(conn):
+    """(highest folded chat.db ROWID, first month key) of the store."""
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+    return int(meta["last_rowid"]), int(meta["first_month"])
+
+
+def connect(path=STORE_PATH):
+    """Read-only connection; raises sqlite3.OperationalError if the store is missing.
+    Waits up to READ_BUSY_SECONDS while the live watcher's fold_updates() holds the lock."""
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=READ_BUSY_SECONDS)
+
+
+def is_busy(error):
+    """Whether a sqlite3.Error is a lock held by a writer rather than a missing or old store."""
+    return isinstance(error, sqlite3.OperationalError) and any(
+        word in str(error) for word in ("database is locked", "database table is locked")
+    )
+
+
+def _bounds(conn):
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+    return int(meta["first_month"]), int(meta["last_month"])
+
+
+def _range(conn, start, end):
+    """Month-key range for optional start/end labels, clamped to the store."""
+    first, last = _bounds(conn)
+    lo = max(first, month_key(start)) if start else first
+    hi = min(last, month_key(end)) if end else last
+    return lo, hi
+
+
+def _top_arg(top):
+    if top in (None, "", "all"):
+        return -1  # SQLite LIMIT -1 = no limit
+    top = int(top)
+    if top < 1:
+        raise ValueError("top must be a positive number or 'all'")
+    return top
+
+
+def _day_range(conn, start, end):
+    """Date-ordinal range for optional start/end labels, clamped to the store."""
+    first, last = _bounds(conn)
+    first_day = period_start(MONTH, first).toordinal()
+    last_day = period_start(MONTH, last + 1).toordinal() - 1
+    lo = max(first_day, day_key(start)) if start else first_day
+    hi = min(last_day, day_key(end, end=True)) if end else last_day
+    return lo, hi
+
+
+def top_contacts(conn, lo, hi, top, level=MONTH):
+    """[(contact_id, name, sent, recv)] ranked by messages within periods [lo, hi] of a level."""
+    return conn.execute(
+        """
+        SELECT s.contact_id, c.name, s.sent, s.recv
+        FROM (
+            SELECT contact_id, SUM(sent) AS sent, SUM(recv) AS recv
+            FROM rollup
+            WHERE level = ? AND period BETWEEN ? AND ?
+            GROUP BY contact_id
+        ) s
+        JOIN contacts c ON c.contact_id = s.contact_id
+        ORDER BY s.sent + s.recv DESC, s.contact_id
+        LIMIT ?
+        """,
+        (level, lo, hi, top),
+    ).fetchall()
+
+
+def pick_level(lo, hi, width):
+    """Finest level whose periods in days [lo, hi] each get MIN_POINT_PX of width pixels."""
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        raise ValueError("width must be a number of pixels") from None
+    if not 1 <= width <= MAX_WIDTH:
+        raise ValueError(f"width must be between 1 and {MAX_WIDTH}")
+    budget = max(1, width // MIN_POINT_PX)
+    for level in (DAY, WEEK, MONTH, QUARTER):
+        if period_of(level, hi) - period_of(level, lo) + 1 <= budget:
+            return level
+    return YEAR
+
+
+def meta(conn):
+    """Every month and quarter label in the store, for the date selects."""
+    first, last = _bounds(conn)
+    keys = range(first, last + 1)
+    return {
+        "months": [month_label(k) for k in keys],
+        "quarters": list(dict.fromkeys(quarter_label(k) for k in keys)),
+    }
+
+
+def series(conn, start=None, end=None, top=None, level=None, width=None):
+    """
+    Top contacts by DM total within [start, end] (YYYY-MM or YYYY-MM-DD), with one
+    value per period of one pyramid level:
+      {"level", "periods": [labels], "starts": [YYYY-MM-DD], "rows": [{"name", "rank",
+       "total_dm", "values": [...]}]}
+    level names the resolution; with level "auto" (or none), width (the chart's pixels,
+    default DEFAULT_WIDTH) picks it with pick_level(). An explicit level finer than that
+    is coarsened to it, and top is capped at MAX_SERIES_TOP (also for "all"). The ranking uses the exact range (whole months when it is
+    month-aligned, otherwise days); values cover whole periods, so the first and last
+    week or quarter may include days outside it.
+    """
+    if level not in (None, "", "auto") + LEVELS:
+        raise ValueError(f"level must be auto or one of {', '.join(LEVELS)}")
+    lo, hi = _day_range(conn, start, end)
+    finest = pick_level(lo, hi, DEFAULT_WIDTH if width in (None, "") else width)
+    level = max(LEVELS.index(level), finest) if level in LEVELS else finest
+    top = _top_arg(top)
+    top = MAX_SERIES_TOP if top < 0 else min(top, MAX_SERIES_TOP)
+
+    month_aligned = (
+        lo == period_start(MONTH, period_of(MONTH, lo)).toordinal()
+        and hi + 1 == period_start(MONTH, period_of(MONTH, hi + 1)).toordinal()
+    )
+    if month_aligned:
+        ranked = top_contacts(conn, period_of(MONTH, lo), period_of(MONTH, hi), top)
+    else:
+        ranked = top_contacts(conn, lo, hi, top, level=DAY)
+
+    value_lo, value_hi = period_of(level, lo), period_of(level, hi)
+    keys = range(value_lo, value_hi + 1)
+    rows = {
+        contact_id: {"name": name, "rank": contact_id, "total_dm": sent + recv, "values": [0] * len(keys)}
+        for contact_id, name, sent, recv in ranked
+    }
+    if rows:
+        placeholders = ",".join("?" * len(rows))
+        for period, contact_id, count in conn.execute(
+            f"""
+            SELECT period, contact_id, sent + recv FROM rollup
+            WHERE level = ? AND period BETWEEN ? AND ? AND contact_id IN ({placeholders})
+            """,
+            (level, value_lo, value_hi, *rows),
+        ):
+            rows[contact_id]["values"][period - value_lo] = count
+    return {
+        "level": LEVELS[level],
+        "periods": [period_label(level, k) for k in keys],
+        "starts": [period_start(level, k).isoformat() for k in keys],
+        "rows": list(rows.values()),
+    }
+
+
+def monthly(conn, start=None, end=None, top=None, granularity="month"):
+    """
+    Top contacts by DM total within [start, end], with one value per visible period:
+    {"periods": [...], "rows": [{"name", "rank", "total_dm", "values": [...]}]}.
+    With quarters the ranking still uses the exact months, but values cover whole
+    quarters (as message_stats_quarterly.csv does).
+    """
+    if granularity not in ("month", "quarter"):
+        raise ValueError("granularity must be 'month' or 'quarter'")
+    data = series(conn, start, end, top, level=granularity)
+    return {"periods": data["periods"], "rows": data["rows"]}
+
+
+def sent_recv(conn, start=None, end=None, top=None):
+    """Sent and received totals within [start, end] for the top contacts."""
+    lo, hi = _range(conn, start, end)
+    return {
+        "rows": [
+            {"name": name, "rank": contact_id, "sent": sent, "recv": recv}
+            for contact_id, name, sent, recv in top_contacts(conn, lo, hi, _top_arg(top))
+        ]
+    }
+
+
+def race(conn, start=None, end=None, bars=12, mode="monthly"):
+    """
+    Bar-chart-race frames for [start, end], one per month, so race.js only applies
+    deltas and animates:
+      {"periods": [...], "contacts": [{"name", "rank"}], "max": axis maximum,
+       "frames": [{"order": [contact index, ...], "values": [[contact index, value], ...]}]}
+    "order" is the frame's top `bars` ranking, sent only when it differs from the
+    previous frame. "values" holds the frame's ranked contacts whose value differs from
+    the last one sent for them. contacts lists everyone who ever makes a frame, in order
+    of first appearance. mode "monthly" races each month's count, "cumulative" the
+    running total from start.
+    Built in one pass over the range's cells in primary key order (no sort), with one
+    top-N selection per month: O(periods * contacts) time, O(contacts) memory.
+    """
+    if mode not in RACE_MODES:
+        raise ValueError(f"mode must be one of {', '.join(RACE_MODES)}")
+    bars = int(bars)
+    if not 1 <= bars <= MAX_RACE_BARS:
+        raise ValueError(f"bars must be between 1 and {MAX_RACE_BARS}")
+    lo, hi = _range(conn, start, end)
+    periods = [month_label(k) for k in range(lo, hi + 1)]
+
+    cells = conn.execute(
+        "SELECT month, contact_id, sent + recv FROM monthly WHERE month BETWEEN ? AND ? ORDER BY month",
+        (lo, hi),
+    )
+    cell = next(cells, None)
+    values = {}
+    index = {}  # contact_id -> position in "contacts"
+    sent = {}  # contact_id -> last value sent to the client
+    frames = []
+    previous_order = None
+    axis_max = 0
+    for month in range(lo, hi + 1):
+        if mode == "monthly":
+            values = {}
+        while cell is not None and cell[0] == month:
+            values[cell[1]] = values.get(cell[1], 0) + cell[2]
+            cell = next(cells, None)
+
+        # Ties go to the better all-time rank (lower contact_id)
+        top = heapq.nlargest(bars, values.items(), key=lambda kv: (kv[1], -kv[0]))
+        order = [index.setdefault(contact_id, len(index)) for contact_id, _ in top]
+        frame = {}
+        if order != previous_order:
+            frame["order"] = order
+        frame["values"] = [[index[contact_id], value] for contact_id, value in top if sent.get(contact_id) != value]
+        sent.update(top)
+        frames.append(frame)
+        previous_order = order
+        if top:
+            axis_max = max(axis_max, top[0][1])
+
+    names = dict(conn.execute("SELECT contact_id, name FROM contacts"))
+    return {
+        "periods": periods,
+        "contacts": [{"name": names[contact_id], "rank": contact_id} for contact_id in index],
+        "max": axis_max,
+        "frames": frames,
+    }
+
+
+def contact(conn, name=None):
+    """
+    One contact's history for the detail panels: non-zero months with sent/received
+    counts, and the months with response times.
+    """
+    found = conn.execute("SELECT contact_id FROM contacts WHERE name = ?", (name,)).fetchone()
+    if found is None:
+        raise ValueError(f"unknown contact {name!r}")
+    counts = conn.execute(
+        "SELECT month, sent, recv FROM monthly WHERE contact_id = ? ORDER BY month", found
+    ).fetchall()
+    responses = conn.execute(
+        "SELECT month, my_median, their_median FROM response WHERE contact_id = ? ORDER BY month", found
+    ).fetchall()
+    return {
+        "months": [month_label(month) for month, _, _ in counts],
+        "sent": [sent for _, sent, _ in counts],
+        "recv": [recv for _, _, recv in counts],
+        "response": {
+            "months": [month_label(month) for month, _, _ in responses],
+            "my_median": [my_median for _, my_median, _ in responses],
+            "their_median": [their_median for _, _, their_median in responses],
+        },
+    }
+
+
+def response(conn, start=None, end=None, top=None, sort="difference"):
+    """
+    Per-contact response times within [start, end]: the median of the monthly
+    medians, sorted like response.js (fastest first, missing values last). Only the
+    RESPONSE_CANDIDATES contacts with the most messages in the range are ranked.
+    """
+    if sort not in RESPONSE_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(RESPONSE_SORTS)}")
+    lo, hi = _range(conn, start, end)
+    candidates = [contact_id for contact_id, *_ in top_contacts(conn, lo, hi, RESPONSE_CANDIDATES)]
+    by_contact = {}
+    for name, my_median, their_median in conn.execute(
+        f"""
+        SELECT c.name, r.my_median, r.their_median
+        FROM response r
+        JOIN contacts c ON c.contact_id = r.contact_id
+        WHERE r.month BETWEEN ? AND ?
+        AND r.contact_id IN ({','.join('?' * len(candidates))})
+        ORDER BY r.contact_id, r.month
+        """,
+        (lo, hi, *candidates),
+    ):
+        mine, theirs = by_contact.setdefault(name, ([], []))
+        if my_median:
+            mine.append(my_median)
+        if their_median:
+            theirs.append(their_median)
+
+    rows = []
+    for name, (mine, theirs) in by_contact.items():
+        if not mine and not theirs:
+            continue
+        my_response = statistics.median(mine) if mine else None
+        their_response = statistics.median(theirs) if theirs else None
+        rows.append({
+            "name": name,
+            "myResponse": my_response,
+            "theirResponse": their_response,
+            "difference": (my_response or 0) - (their_response or 0),
+        })
+    if sort == "my_response":
+        rows.sort(key=lambda d: d["myResponse"] or 999)
+    elif sort == "their_response":
+        rows.sort(key=lambda d: d["theirResponse"] or 999)
+    else:
+        rows.sort(key=lambda d: d["difference"])
+    top = _top_arg(top)
+    return {"rows": rows if top < 0 else rows[:top]}
+
+
+def _summary():
+    """Print the store's size and what a few typical API calls would return."""
+    conn = connect()
+    first, last = _bounds(conn)
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("contacts", "rollup", "response")
+    }
+    print(f"{STORE_PATH}: {month_label(first)} to {month_label(last)}, "
+          + ", ".join(f"{n:,} {table} rows" for table, n in counts.items()))
+    levels = dict(conn.execute("SELECT level, COUNT(*) FROM rollup GROUP BY level"))
+    print("  rollup rows per level: " + ", ".join(f"{name} {levels.get(i, 0):,}" for i, name in enumerate(LEVELS)))
+    if os.path.exists("message_stats_monthly.csv"):
+        print(f"  full message_stats_monthly.csv: {os.path.getsize('message_stats_monthly.csv'):>10,} bytes")
+    for label, params in (
+        ("all time, top 10", {"top": 10}),
+        ("last 12 months, top 10", {"start": month_label(max(first, last - 11)), "top": 10}),
+        ("last 12 months, top 50", {"start": month_label(max(first, last - 11)), "top": 50}),
+    ):
+        body = json.dumps(monthly(conn, **params), separators=(",", ":"))
+        print(f"  /api/monthly {label:<24} {len(body):>10,} bytes")
+    for width in (300, 1200, 4000):
+        data = series(conn, top=10, width=width)
+        body = json.dumps(data, separators=(",", ":"))
+        label = f"all time, top 10, {width}px"
+        print(f"  /api/series {label:<25} {len(body):>10,} bytes ({len(data['periods'])} {data['level']}s)")
+    for mode in RACE_MODES:
+        body = json.dumps(race(conn, mode=mode), separators=(",", ":"))
+        print(f"  /api/race all time, {mode:<18} {len(body):>10,} bytes")
+    conn.close()
+
+
+if __name__ == "__main__":
+    _summary()
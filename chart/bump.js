@@ -1,6 +1,7 @@
 // Bump Chart - shows ranking changes over time
-const csvPathMonthly = "../message_stats_monthly.csv?" + Date.now();
-const csvPathQuarterly = "../message_stats_quarterly.csv?" + Date.now();
+// serve.py answers /api/* from message_stats.db with only the selected range and top N
+const apiMeta = "/api/meta";
+const apiMonthly = "/api/monthly";
 
 const margin = { top: 30, right: 150, bottom: 50, left: 60 };
 const width = Math.min(1400, window.innerWidth - 80) - margin.left - margin.right;
@@ -21,88 +22,65 @@ const rankModeSelect = document.getElementById("rank-mode");
 const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
 
-let monthlyData, quarterlyData, colorMap;
-let allMonths = [], allQuarters = [];
-
-// Load both datasets
-Promise.all([
-    d3.csv(csvPathMonthly),
-    d3.csv(csvPathQuarterly)
-]).then(([monthly, quarterly]) => {
-    monthlyData = monthly;
-    quarterlyData = quarterly;
-
-    // Get all period columns
-    allMonths = Object.keys(monthly[0]).filter(k => k !== "name" && k !== "total_dm");
-    allQuarters = Object.keys(quarterly[0]).filter(k => k !== "name" && k !== "total_dm");
+let rangeData;
+const colorMap = new Map();
 
+d3.json(apiMeta).then(meta => {
     // Populate date selects with months
-    allMonths.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
-
-    // Assign colors based on monthly data order
-    colorMap = new Map();
-    monthlyData.forEach((d, i) => {
-        colorMap.set(d.name, colors[i % colors.length]);
-    });
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
-    render();
-
-    timePeriodSelect.addEventListener("change", render);
-    topNSelect.addEventListener("change", render);
+    timePeriodSelect.addEventListener("change", refresh);
+    topNSelect.addEventListener("change", refresh);
     rankModeSelect.addEventListener("change", render);
-    startDateSelect.addEventListener("change", render);
-    endDateSelect.addEventListener("change", render);
+    startDateSelect.addEventListener("change", refresh);
+    endDateSelect.addEventListener("change", refresh);
+
+    watchStore(startDateSelect, endDateSelect, refresh);
+    return refresh();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_monthly.py</code> first.<br>
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.<br>
             <small style="color: #888;">Error: ${err.message}</small>
         </p>`;
 });
 
+// Fetch the top contacts within the date range (ranked by their monthly totals),
+// with one value per month or quarter, then draw
+function refresh() {
+    const topN = parseInt(topNSelect.value);
+    const params = new URLSearchParams({
+        start: startDateSelect.value,
+        end: endDateSelect.value,
+        top: Math.max(topN * 2, 30),
+        granularity: timePeriodSelect.value === "monthly" ? "month" : "quarter"
+    });
+    return d3.json(`${apiMonthly}?${params}`).then(data => {
+        rangeData = data;
+        // Colors follow all-time rank so a contact keeps its color across ranges
+        data.rows.forEach(d => colorMap.set(d.name, colors[(d.rank - 1) % colors.length]));
+        render();
+    });
+}
+
 function render() {
     svg.selectAll("*").remove();
 
     const timePeriod = timePeriodSelect.value;
     const topN = parseInt(topNSelect.value);
     const mode = rankModeSelect.value;
-    const startDate = startDateSelect.value;
-    const endDate = endDateSelect.value;
-
-    const rawData = timePeriod === "monthly" ? monthlyData : quarterlyData;
-    let allPeriods = timePeriod === "monthly" ? allMonths : allQuarters;
-
-    // Filter periods within date range
-    let periods;
-    if (timePeriod === "monthly") {
-        periods = allPeriods.filter(p => p >= startDate && p <= endDate);
-    } else {
-        // Convert months to quarters for filtering
-        const startQ = startDate.slice(0, 4) + "-Q" + Math.ceil(parseInt(startDate.slice(5, 7)) / 3);
-        const endQ = endDate.slice(0, 4) + "-Q" + Math.ceil(parseInt(endDate.slice(5, 7)) / 3);
-        periods = allPeriods.filter(p => p >= startQ && p <= endQ);
-    }
 
+    const periods = rangeData.periods;
     if (periods.length === 0) return;
 
-    // Calculate top contacts within this date range (using monthly data for consistency)
-    const filteredMonths = allMonths.filter(m => m >= startDate && m <= endDate);
-    const contactTotals = monthlyData.map(d => {
-        let total = 0;
-        filteredMonths.forEach(m => total += (+d[m] || 0));
-        return { name: d.name, total };
-    });
-    contactTotals.sort((a, b) => b.total - a.total);
-    const topContactNames = new Set(contactTotals.slice(0, Math.max(topN * 2, 30)).map(c => c.name));
-
     // Parse period labels
     const parsePeriod = timePeriod === "monthly"
         ? d3.timeParse("%Y-%m")
@@ -116,8 +94,8 @@ function render() {
         ? d3.timeFormat("%b %Y")
         : d3.timeFormat("Q%q %Y");
 
-    // Filter data to only include top contacts from the date range
-    const filteredData = rawData.filter(d => topContactNames.has(d.name));
+    // Rows are already limited to the top contacts from the date range
+    const filteredData = rangeData.rows;
 
     // Calculate rankings for each period
     const rankings = {};
@@ -127,13 +105,13 @@ function render() {
     periods.forEach((period, periodIdx) => {
         // Update cumulative
         filteredData.forEach(d => {
-            cumulative[d.name] += +d[period] || 0;
+            cumulative[d.name] += d.values[periodIdx];
         });
 
         // Get values based on mode
         let values;
         if (mode === "period") {
-            values = filteredData.map(d => ({ name: d.name, value: +d[period] || 0 }));
+            values = filteredData.map(d => ({ name: d.name, value: d.values[periodIdx] }));
         } else {
             values = filteredData.map(d => ({ name: d.name, value: cumulative[d.name] }));
         }
@@ -1,5 +1,7 @@
 // Line chart with date range filtering
-const csvPath = "../message_stats_monthly.csv?" + Date.now();
+// serve.py answers /api/* from message_stats.db with only the selected range and top N
+const apiMeta = "/api/meta";
+const apiMonthly = "/api/monthly";
 
 const margin = { top: 20, right: 30, bottom: 50, left: 60 };
 const width = Math.min(1400, window.innerWidth - 80) - margin.left - margin.right;
@@ -19,70 +21,67 @@ const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
 const topNSelect = document.getElementById("top-n");
 
-let rawData, allMonths, colorMap = new Map();
+let rangeData, colorMap = new Map();
 const hiddenContacts = new Set();
 
-d3.csv(csvPath).then(data => {
-    rawData = data;
-    allMonths = Object.keys(data[0]).filter(k => k !== "name" && k !== "total_dm");
-
+d3.json(apiMeta).then(meta => {
     // Populate date selects
-    allMonths.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
-
-    // Assign colors to all contacts
-    data.forEach((d, i) => {
-        colorMap.set(d.name, colors[i % colors.length]);
-    });
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
-    render();
+    startDateSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
+    endDateSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
+    topNSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
 
-    startDateSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
-    endDateSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
-    topNSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
+    watchStore(startDateSelect, endDateSelect, refresh);
+    return refresh();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_monthly.py</code> first.
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.
         </p>`;
 });
 
+// Fetch the selected range's top N contacts, then draw
+function refresh() {
+    const params = new URLSearchParams({
+        start: startDateSelect.value,
+        end: endDateSelect.value,
+        top: topNSelect.value
+    });
+    return d3.json(`${apiMonthly}?${params}`).then(data => {
+        rangeData = data;
+        // Colors follow all-time rank so a contact keeps its color across ranges
+        data.rows.forEach(d => colorMap.set(d.name, colors[(d.rank - 1) % colors.length]));
+        render();
+    });
+}
+
 function render() {
     svg.selectAll("*").remove();
     d3.select("#legend").selectAll("*").remove();
 
-    const startDate = startDateSelect.value;
-    const endDate = endDateSelect.value;
-    const topN = parseInt(topNSelect.value);
-
-    // Filter months within range
-    const months = allMonths.filter(m => m >= startDate && m <= endDate);
+    const months = rangeData.periods;
     if (months.length === 0) return;
 
     const parseMonth = d3.timeParse("%Y-%m");
 
-    // Calculate totals within range and get top N
-    const contactTotals = rawData.map(d => {
-        let total = 0;
-        months.forEach(m => total += (+d[m] || 0));
-        return { name: d.name, total, data: d };
-    });
-    contactTotals.sort((a, b) => b.total - a.total);
-    const topContacts = contactTotals.slice(0, topN);
+    // Rows arrive ranked by total within the range
+    const topContacts = rangeData.rows;
 
     // Build series data for top contacts
     const series = topContacts.map(c => ({
         name: c.name,
-        values: months.map(m => ({
+        values: months.map((m, i) => ({
             date: parseMonth(m),
-            value: +c.data[m] || 0
+            value: c.values[i]
         }))
     }));
 
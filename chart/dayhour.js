@@ -1,5 +1,11 @@
 // Day/Hour Heatmap
-const jsonPath = "../message_day_hour.json?" + Date.now();
+const jsonPath = "../message_day_hour.json";
+// Compact form written by query_messages_detailed.py --compact-dayhour:
+// packed little-endian uint32 blocks of 168 cells (day * 24 + hour) + JSON index
+const binPath = "../message_day_hour.bin";
+const indexPath = "../message_day_hour.index.json";
+// {"format": "compact" | "json"}: which of the two the last export wrote
+const formatPath = "../message_day_hour.format.json";
 
 const margin = { top: 30, right: 30, bottom: 30, left: 80 };
 const cellSize = 28;
@@ -29,9 +35,44 @@ const startYearSelect = document.getElementById("start-year");
 const endYearSelect = document.getElementById("end-year");
 const colorSchemeSelect = document.getElementById("color-scheme");
 
+// Both sources expose { contacts: { name: { by_year: { year: grid } } } } where a grid
+// is a flat 168-cell array indexed by day * 24 + hour
 let rawData;
 
-d3.json(jsonPath).then(data => {
+function loadCompact() {
+    return Promise.all([d3.json(indexPath), d3.buffer(binPath)]).then(([index, buffer]) => {
+        const cells = index.cells;
+        const data = {};
+        Object.entries(index.contacts).forEach(([name, entry]) => {
+            const byYear = {};
+            Object.entries(entry.by_year).forEach(([year, block]) => {
+                // Zero-copy view into the ArrayBuffer
+                byYear[year] = new Uint32Array(buffer, block * cells * 4, cells);
+            });
+            data[name] = { by_year: byYear };
+        });
+        return data;
+    });
+}
+
+function loadJson() {
+    return d3.json(jsonPath).then(json => {
+        const data = {};
+        Object.entries(json).forEach(([name, contactData]) => {
+            const byYear = {};
+            Object.entries(contactData.by_year || {}).forEach(([year, grid]) => {
+                byYear[year] = grid.flat();
+            });
+            data[name] = { by_year: byYear };
+        });
+        return data;
+    });
+}
+
+// Exports from before the format file only wrote JSON
+d3.json(formatPath).catch(() => ({ format: "json" })).then(info =>
+    info.format === "compact" ? loadCompact() : loadJson()
+).then(data => {
     rawData = data;
 
     // Populate contact dropdown
@@ -95,7 +136,7 @@ function render() {
                 const sourceGrid = contactData.by_year[y] || [];
                 for (let day = 0; day < 7; day++) {
                     for (let hour = 0; hour < 24; hour++) {
-                        grid[day][hour] += (sourceGrid[day]?.[hour] || 0);
+                        grid[day][hour] += (sourceGrid[day * 24 + hour] || 0);
                     }
                 }
             }
@@ -108,7 +149,7 @@ function render() {
             const sourceGrid = contactData.by_year[y] || [];
             for (let day = 0; day < 7; day++) {
                 for (let hour = 0; hour < 24; hour++) {
-                    grid[day][hour] += (sourceGrid[day]?.[hour] || 0);
+                    grid[day][hour] += (sourceGrid[day * 24 + hour] || 0);
                 }
             }
         }
@@ -1,9 +1,12 @@
 // Heatmap - contacts × periods grid
-const csvPathMonthly = "../message_stats_monthly.csv?" + Date.now();
-const csvPathQuarterly = "../message_stats_quarterly.csv?" + Date.now();
+// serve.py answers /api/* from message_stats.db with only the selected range and top N
+const apiMeta = "/api/meta";
+const apiSeries = "/api/series";
 
 const margin = { top: 60, right: 30, bottom: 30, left: 140 };
 const cellHeight = 18;
+// Grid width the "auto" time period fits its columns into
+const autoWidth = Math.max(300, window.innerWidth - 80 - margin.left - margin.right);
 
 const tooltip = d3.select("#tooltip");
 const timePeriodSelect = document.getElementById("time-period");
@@ -13,8 +16,7 @@ const scaleModeSelect = document.getElementById("scale-mode");
 const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
 
-let monthlyData, quarterlyData;
-let allMonths = [], allQuarters = [];
+let rangeData;
 
 const colorSchemes = {
     greens: d3.interpolateGreens,
@@ -24,82 +26,70 @@ const colorSchemes = {
     magma: d3.interpolateMagma
 };
 
-Promise.all([
-    d3.csv(csvPathMonthly),
-    d3.csv(csvPathQuarterly)
-]).then(([monthly, quarterly]) => {
-    monthlyData = monthly;
-    quarterlyData = quarterly;
-
-    // Get all period columns
-    allMonths = Object.keys(monthly[0]).filter(k => k !== "name" && k !== "total_dm");
-    allQuarters = Object.keys(quarterly[0]).filter(k => k !== "name" && k !== "total_dm");
-
+d3.json(apiMeta).then(meta => {
     // Populate date selects with months
-    allMonths.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
-
-    render();
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
-    timePeriodSelect.addEventListener("change", render);
-    topNSelect.addEventListener("change", render);
+    timePeriodSelect.addEventListener("change", refresh);
+    topNSelect.addEventListener("change", refresh);
     colorSchemeSelect.addEventListener("change", render);
     scaleModeSelect.addEventListener("change", render);
-    startDateSelect.addEventListener("change", render);
-    endDateSelect.addEventListener("change", render);
+    startDateSelect.addEventListener("change", refresh);
+    endDateSelect.addEventListener("change", refresh);
+
+    watchStore(startDateSelect, endDateSelect, refresh);
+    return refresh();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_monthly.py</code> first.
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.
         </p>`;
 });
 
+// Select value -> /api/series level; "auto" lets the server pick the finest of
+// day/week/month/quarter/year that fits the window
+const seriesLevels = { monthly: "month", quarterly: "quarter", auto: "auto" };
+
+// Fetch the top N contacts within the date range (ranked by their totals in it),
+// with one value per period, then draw
+function refresh() {
+    const params = new URLSearchParams({
+        start: startDateSelect.value,
+        end: endDateSelect.value,
+        top: topNSelect.value,
+        level: seriesLevels[timePeriodSelect.value],
+        width: autoWidth
+    });
+    return d3.json(`${apiSeries}?${params}`).then(data => {
+        rangeData = data;
+        render();
+    });
+}
+
 function render() {
     d3.select("#chart").selectAll("*").remove();
 
-    const timePeriod = timePeriodSelect.value;
-    const topN = parseInt(topNSelect.value);
+    const level = rangeData.level;
     const colorScheme = colorSchemes[colorSchemeSelect.value];
     const scaleMode = scaleModeSelect.value;
-    const startDate = startDateSelect.value;
-    const endDate = endDateSelect.value;
-
-    const rawData = timePeriod === "monthly" ? monthlyData : quarterlyData;
-    let allPeriods = timePeriod === "monthly" ? allMonths : allQuarters;
-
-    // Filter periods within date range
-    let periods;
-    if (timePeriod === "monthly") {
-        periods = allPeriods.filter(p => p >= startDate && p <= endDate);
-    } else {
-        const startQ = startDate.slice(0, 4) + "-Q" + Math.ceil(parseInt(startDate.slice(5, 7)) / 3);
-        const endQ = endDate.slice(0, 4) + "-Q" + Math.ceil(parseInt(endDate.slice(5, 7)) / 3);
-        periods = allPeriods.filter(p => p >= startQ && p <= endQ);
-    }
 
+    const periods = rangeData.periods;
     if (periods.length === 0) return;
 
-    const cellWidth = timePeriod === "monthly" ? 12 : 35;
-
-    // Calculate top contacts within this date range (using monthly data for consistency)
-    const filteredMonths = allMonths.filter(m => m >= startDate && m <= endDate);
-    const contactTotals = monthlyData.map(d => {
-        let total = 0;
-        filteredMonths.forEach(m => total += (+d[m] || 0));
-        return { name: d.name, total, data: d };
-    });
-    contactTotals.sort((a, b) => b.total - a.total);
-    const topContactNames = contactTotals.slice(0, topN).map(c => c.name);
+    const cellWidth = timePeriodSelect.value === "monthly" ? 12
+        : timePeriodSelect.value === "quarterly" ? 35
+        : Math.max(4, Math.min(35, Math.floor(autoWidth / periods.length)));
 
-    // Get the data for top contacts from the appropriate dataset
-    const contacts = topContactNames.map(name => rawData.find(d => d.name === name)).filter(Boolean);
+    // Rows arrive ranked by total within the range
+    const contacts = rangeData.rows;
     const width = periods.length * cellWidth + margin.left + margin.right;
     const height = contacts.length * cellHeight + margin.top + margin.bottom;
 
@@ -111,8 +101,8 @@ function render() {
         .attr("transform", `translate(${margin.left},${margin.top})`);
 
     // Calculate max values
-    const globalMax = d3.max(contacts, d => d3.max(periods, m => +d[m]));
-    const rowMaxes = contacts.map(d => d3.max(periods, m => +d[m]));
+    const globalMax = d3.max(contacts, d => d3.max(d.values));
+    const rowMaxes = contacts.map(d => d3.max(d.values));
 
     // Update color scale legend (log scale)
     const gradient = document.getElementById("gradient");
@@ -152,15 +142,15 @@ function render() {
             .attr("width", cellWidth - 1)
             .attr("height", cellHeight - 1)
             .attr("rx", 2)
-            .attr("fill", p => {
-                const val = +contact[p];
+            .attr("fill", (p, i) => {
+                const val = contact.values[i];
                 // Use colorScheme(0) for zero values so they fit the scale
                 return val === 0 ? colorScheme(0) : colorScale(val);
             })
             .attr("stroke", "#1a1a2e")
             .attr("stroke-width", 1)
             .on("mouseenter", function(event, p) {
-                const val = +contact[p];
+                const val = contact.values[periods.indexOf(p)];
                 tooltip
                     .html(`<strong>${contact.name}</strong><br>${p}<br>${val.toLocaleString()} messages`)
                     .style("opacity", 1);
@@ -191,8 +181,8 @@ function render() {
             window.location.href = `index.html?highlight=${encodeURIComponent(d.name)}`;
         });
 
-    // Column labels - show subset based on period type
-    const labelInterval = timePeriod === "monthly" ? 6 : 2;
+    // Column labels - roughly one every 70px (every 6 months, every 2 quarters)
+    const labelInterval = Math.ceil(70 / cellWidth);
     svg.selectAll(".col-label")
         .data(periods.filter((p, i) => i % labelInterval === 0))
         .enter()
@@ -203,9 +193,12 @@ function render() {
         .attr("text-anchor", "middle")
         .attr("transform", p => `rotate(-45, ${x(p) + cellWidth / 2}, -8)`)
         .text(p => {
-            if (timePeriod === "monthly") {
+            if (level === "month") {
                 const parseMonth = d3.timeParse("%Y-%m");
                 return d3.timeFormat("%b '%y")(parseMonth(p));
+            } else if (level === "day" || level === "week") {
+                const parseDay = d3.timeParse("%Y-%m-%d");
+                return d3.timeFormat("%b %-d '%y")(parseDay(p));
             } else {
                 return p.replace("-", " ");
             }
@@ -0,0 +1,32 @@
+// Live updates from `python3 chart/serve.py --live`
+// The server pushes the months whose data changed; a chart re-fetches only when one of
+// them falls inside its selected range. Without --live, /api/events answers 204 and
+// EventSource stops.
+
+function monthOptionLabel(m) {
+    return new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
+}
+
+function watchStore(startSelect, endSelect, refresh) {
+    if (!window.EventSource) return;
+    const events = new EventSource("/api/events");
+    events.addEventListener("change", event => {
+        const change = JSON.parse(event.data);
+
+        // New months extend the date selects; a range that ended at the latest month follows it
+        const options = endSelect.options;
+        const followLatest = endSelect.value === options[options.length - 1].value;
+        let last = options[options.length - 1].value;
+        while (last < change.last_month) {
+            const [year, month] = last.split("-").map(Number);
+            last = month === 12 ? `${year + 1}-01` : `${year}-${String(month + 1).padStart(2, "0")}`;
+            startSelect.add(new Option(monthOptionLabel(last), last));
+            endSelect.add(new Option(monthOptionLabel(last), last));
+        }
+        if (followLatest) endSelect.value = last;
+
+        if (change.months.some(m => m >= startSelect.value && m <= endSelect.value)) {
+            refresh();
+        }
+    });
+}
@@ -1,5 +1,8 @@
-// Bar Chart Race visualization - Monthly totals
-const csvPath = "../message_stats_monthly.csv?" + Date.now();
+// Bar Chart Race visualization - monthly or cumulative totals
+// serve.py precomputes the frames (top bars per month, delta-encoded); this page only
+// applies each frame's changes and animates between them
+const apiMeta = "/api/meta";
+const apiRace = "/api/race";
 
 const margin = { top: 20, right: 120, bottom: 30, left: 150 };
 const width = Math.min(1200, window.innerWidth - 80) - margin.left - margin.right;
@@ -24,95 +27,91 @@ const speedSlider = document.getElementById("speed");
 const scrubber = document.getElementById("scrubber");
 const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
+const modeSelect = document.getElementById("race-mode");
 
 let isPlaying = false;
 let currentMonthIndex = 0;
 let animationTimer = null;
-let allMonths = [];
 let months = [];
-let monthlyData = {};
-let rawData = [];
-
-d3.csv(csvPath).then(data => {
-    rawData = data;
-    // Get month columns
-    allMonths = Object.keys(data[0]).filter(k => k !== "name" && k !== "total_dm");
+let race = null;
+// Decoded state: values[contact index] and the ranking as of frame stateIndex
+let values = [], order = [], stateIndex = -1;
 
+d3.json(apiMeta).then(meta => {
     // Populate date selects
-    allMonths.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
-
-    // Assign colors to contacts
-    data.forEach((d, i) => {
-        colorMap.set(d.name, colors[i % colors.length]);
-    });
-
-    setupAndRender();
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
     startDateSelect.addEventListener("change", setupAndRender);
     endDateSelect.addEventListener("change", setupAndRender);
+    modeSelect.addEventListener("change", setupAndRender);
 
     function setupAndRender() {
         pause();
         currentMonthIndex = 0;
 
-        const startDate = startDateSelect.value;
-        const endDate = endDateSelect.value;
-
-        // Filter months within range
-        months = allMonths.filter(m => m >= startDate && m <= endDate);
-        if (months.length === 0) return;
-
-        // Calculate top contacts within this range
-        const contactTotals = rawData.map(d => {
-            let total = 0;
-            months.forEach(m => total += (+d[m] || 0));
-            return { name: d.name, total, data: d };
-        });
-        contactTotals.sort((a, b) => b.total - a.total);
-        const topContactNames = new Set(contactTotals.slice(0, 50).map(c => c.name));
-
-        // Build monthly data (not cumulative) for top contacts
-        monthlyData = {};
-        months.forEach(month => {
-            monthlyData[month] = rawData
-                .filter(d => topContactNames.has(d.name))
-                .map(d => ({
-                    name: d.name,
-                    value: +d[month]
-                })).sort((a, b) => b.value - a.value);
+        const params = new URLSearchParams({
+            start: startDateSelect.value,
+            end: endDateSelect.value,
+            bars: numBars,
+            mode: modeSelect.value
         });
+        return d3.json(`${apiRace}?${params}`).then(data => {
+            race = data;
+            months = data.periods;
+            values = new Array(data.contacts.length).fill(0);
+            order = [];
+            stateIndex = -1;
+            if (months.length === 0) return;
+
+            // Colors follow all-time rank so a contact keeps its color across ranges
+            data.contacts.forEach(c => colorMap.set(c.name, colors[(c.rank - 1) % colors.length]));
+
+            // Axis maximum over every frame, so the scale stays put
+            x.domain([0, data.max * 1.1]);
+
+            // Setup scrubber
+            scrubber.max = months.length - 1;
+            scrubber.value = 0;
 
-        // Setup scrubber
-        scrubber.max = months.length - 1;
-        scrubber.value = 0;
+            // Draw initial state
+            updateChart(0, 0);
+        });
+    }
 
-        // Draw initial state
-        updateChart(months[0], 0);
+    // Apply frame deltas until the decoded state is at frame index
+    // (playing forward costs one frame; scrubbing back replays from the start)
+    function seek(index) {
+        if (index < stateIndex) {
+            values.fill(0);
+            order = [];
+            stateIndex = -1;
+        }
+        while (stateIndex < index) {
+            const frame = race.frames[++stateIndex];
+            if (frame.order) order = frame.order;
+            frame.values.forEach(([contact, value]) => values[contact] = value);
+        }
     }
 
     // Initialize scales (inside promise)
     const x = d3.scaleLinear().range([0, width]);
     const y = d3.scaleBand().range([0, numBars * barHeight]).padding(0.1);
 
-    function updateChart(month, duration) {
-        const data = monthlyData[month].slice(0, numBars);
+    function updateChart(index, duration) {
+        seek(index);
+        const data = order.map(c => ({ name: race.contacts[c].name, value: values[c] }));
 
-        // Update scales - find max across filtered months for stable axis
-        const maxValue = d3.max(months, m =>
-            d3.max(monthlyData[m].slice(0, numBars), d => d.value)
-        );
-        x.domain([0, maxValue * 1.1]);
         y.domain(data.map(d => d.name));
 
         // Update month display
-        monthDisplay.textContent = month;
+        monthDisplay.textContent = months[index];
 
         // Bars
         const bars = svg.selectAll(".bar")
@@ -223,13 +222,13 @@ d3.csv(csvPath).then(data => {
         currentMonthIndex++;
         scrubber.value = currentMonthIndex;
         const speed = 550 - parseInt(speedSlider.value);
-        updateChart(months[currentMonthIndex], speed);
+        updateChart(currentMonthIndex, speed);
         animationTimer = setTimeout(tick, speed);
     }
 
     function goToMonth(index) {
         currentMonthIndex = index;
-        updateChart(months[currentMonthIndex], 150);
+        updateChart(currentMonthIndex, 150);
     }
 
     playBtn.addEventListener("click", () => {
@@ -245,10 +244,12 @@ d3.csv(csvPath).then(data => {
         goToMonth(parseInt(scrubber.value));
     });
 
+    watchStore(startDateSelect, endDateSelect, setupAndRender);
+    return setupAndRender();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_monthly.py</code> first.
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.
         </p>`;
 });
@@ -1,5 +1,8 @@
 // Response Times Chart
-const csvPath = "../message_response_times.csv?" + Date.now();
+// serve.py answers /api/* from message_stats.db with only the selected range's top N
+const apiMeta = "/api/meta";
+const apiResponse = "/api/response";
+const apiContact = "/api/contact";
 
 const margin = { top: 20, right: 40, bottom: 30, left: 140 };
 const barHeight = 24;
@@ -10,83 +13,52 @@ const sortModeSelect = document.getElementById("sort-mode");
 const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
 
-let rawData;
-let allMonths = [];
+let plotData;
 let selectedPerson = null;
 
-d3.csv(csvPath).then(data => {
-    rawData = data;
-
-    // Extract unique months from data
-    allMonths = [...new Set(data.map(d => d.month))].sort();
-
+d3.json(apiMeta).then(meta => {
     // Populate date selects
-    allMonths.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
-    render();
+    topNSelect.addEventListener("change", refresh);
+    sortModeSelect.addEventListener("change", refresh);
+    startDateSelect.addEventListener("change", refresh);
+    endDateSelect.addEventListener("change", refresh);
 
-    topNSelect.addEventListener("change", render);
-    sortModeSelect.addEventListener("change", render);
-    startDateSelect.addEventListener("change", render);
-    endDateSelect.addEventListener("change", render);
+    watchStore(startDateSelect, endDateSelect, refresh);
+    return refresh();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_detailed.py</code> first.
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.
         </p>`;
 });
 
-function render() {
-    d3.select("#chart").selectAll("*").remove();
-
-    const topN = parseInt(topNSelect.value);
-    const sortMode = sortModeSelect.value;
-    const startDate = startDateSelect.value;
-    const endDate = endDateSelect.value;
-
-    // Filter data by date range
-    const filteredData = rawData.filter(row => row.month >= startDate && row.month <= endDate);
-
-    // Aggregate by contact (average median response times)
-    const byContact = {};
-    filteredData.forEach(row => {
-        const name = row.name;
-        if (!byContact[name]) {
-            byContact[name] = { my_times: [], their_times: [] };
-        }
-        if (row.my_median_mins) byContact[name].my_times.push(+row.my_median_mins);
-        if (row.their_median_mins) byContact[name].their_times.push(+row.their_median_mins);
+// Fetch per-contact response times within the date range (median of the monthly
+// medians), already sorted by the selected mode and cut to the top N, then draw
+function refresh() {
+    const params = new URLSearchParams({
+        start: startDateSelect.value,
+        end: endDateSelect.value,
+        top: topNSelect.value,
+        sort: sortModeSelect.value
     });
+    return d3.json(`${apiResponse}?${params}`).then(data => {
+        plotData = data.rows;
+        render();
+    });
+}
 
-    let plotData = Object.entries(byContact).map(([name, d]) => {
-        const myAvg = d.my_times.length > 0 ? d3.median(d.my_times) : null;
-        const theirAvg = d.their_times.length > 0 ? d3.median(d.their_times) : null;
-        return {
-            name,
-            myResponse: myAvg,
-            theirResponse: theirAvg,
-            difference: (myAvg || 0) - (theirAvg || 0)
-        };
-    }).filter(d => d.myResponse !== null || d.theirResponse !== null);
-
-    // Sort
-    if (sortMode === "my_response") {
-        plotData.sort((a, b) => (a.myResponse || 999) - (b.myResponse || 999));
-    } else if (sortMode === "their_response") {
-        plotData.sort((a, b) => (a.theirResponse || 999) - (b.theirResponse || 999));
-    } else {
-        plotData.sort((a, b) => a.difference - b.difference);
-    }
-
-    plotData = plotData.slice(0, topN);
+function render() {
+    d3.select("#chart").selectAll("*").remove();
 
     const width = Math.min(1200, window.innerWidth - 100) - margin.left - margin.right;
     const height = plotData.length * barHeight + margin.top + margin.bottom;
@@ -180,17 +152,19 @@ function showPersonDetail(name) {
     document.getElementById("person-detail").style.display = "block";
     document.getElementById("person-name").textContent = name + " - Response Times Over Time";
 
-    // Filter data for this person
-    const personData = rawData.filter(d => d.name === name);
-    if (personData.length === 0) return;
-
-    // Build time series
-    const seriesData = personData.map(d => ({
-        month: d.month,
-        myResponse: d.my_median_mins ? +d.my_median_mins : null,
-        theirResponse: d.their_median_mins ? +d.their_median_mins : null
-    }));
+    // Months with response times, over the contact's whole history
+    d3.json(`${apiContact}?${new URLSearchParams({ name })}`).then(personData => {
+        const response = personData.response;
+        if (response.months.length === 0) return;
+        drawPersonDetail(response.months.map((m, i) => ({
+            month: m,
+            myResponse: response.my_median[i],
+            theirResponse: response.their_median[i]
+        })));
+    });
+}
 
+function drawPersonDetail(seriesData) {
     // Draw detail chart
     const detailDiv = d3.select("#person-detail-chart");
     detailDiv.selectAll("*").remove();
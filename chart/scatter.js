@@ -1,5 +1,8 @@
 // Sent vs Received Scatter Plot
-const csvPath = "../message_stats_sent_recv.csv?" + Date.now();
+// serve.py answers /api/* from message_stats.db with only the selected range's totals
+const apiMeta = "/api/meta";
+const apiSentRecv = "/api/sent_recv";
+const apiContact = "/api/contact";
 
 const margin = { top: 40, right: 40, bottom: 60, left: 70 };
 const width = Math.min(800, window.innerWidth - 100) - margin.left - margin.right;
@@ -19,68 +22,59 @@ const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
 const sizeModeSelect = document.getElementById("size-mode");
 
-let rawData, months;
+let plotData;
 let selectedPerson = null;
 
-d3.csv(csvPath).then(data => {
-    rawData = data;
-
-    // Extract month columns
-    const cols = Object.keys(data[0]);
-    months = cols.filter(c => c.match(/^\d{4}-\d{2}_sent$/)).map(c => c.replace("_sent", ""));
-
+d3.json(apiMeta).then(meta => {
     // Populate date selects
-    months.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
-    render();
-
-    startDateSelect.addEventListener("change", render);
-    endDateSelect.addEventListener("change", render);
+    startDateSelect.addEventListener("change", refresh);
+    endDateSelect.addEventListener("change", refresh);
     sizeModeSelect.addEventListener("change", render);
+
+    watchStore(startDateSelect, endDateSelect, refresh);
+    return refresh();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_detailed.py</code> first.
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.
         </p>`;
 });
 
+// Fetch sent/received totals within the date range for the top 50 contacts, then draw
+function refresh() {
+    const params = new URLSearchParams({
+        start: startDateSelect.value,
+        end: endDateSelect.value,
+        top: 50
+    });
+    return d3.json(`${apiSentRecv}?${params}`).then(data => {
+        // Rows arrive sorted by total within the range
+        plotData = data.rows.map(d => ({
+            name: d.name,
+            sent: d.sent,
+            recv: d.recv,
+            total: d.sent + d.recv,
+            ratio: d.sent / (d.recv || 1)
+        }));
+        render();
+    });
+}
+
 function render() {
     svg.selectAll("*").remove();
 
-    const startDate = startDateSelect.value;
-    const endDate = endDateSelect.value;
     const sizeMode = sizeModeSelect.value;
 
-    // Filter months by date range
-    const filteredMonths = months.filter(m => m >= startDate && m <= endDate);
-
-    // Calculate totals for filtered range
-    const plotData = rawData.map(d => {
-        let sent = 0, recv = 0;
-        filteredMonths.forEach(m => {
-            sent += +d[`${m}_sent`] || 0;
-            recv += +d[`${m}_recv`] || 0;
-        });
-        return {
-            name: d.name,
-            sent,
-            recv,
-            total: sent + recv,
-            ratio: sent / (recv || 1)
-        };
-    }).filter(d => d.total > 0);
-
-    // Sort by total and show only top contacts
-    plotData.sort((a, b) => b.total - a.total);
-
     // Scales
     const maxVal = d3.max(plotData, d => Math.max(d.sent, d.recv));
     const x = d3.scaleLinear()
@@ -198,16 +192,17 @@ function showPersonDetail(name) {
     document.getElementById("person-detail").style.display = "block";
     document.getElementById("person-name").textContent = name + " - Sent/Received Over Time";
 
-    const personData = rawData.find(d => d.name === name);
-    if (!personData) return;
-
-    // Build time series data
-    const seriesData = months.map(m => ({
-        month: m,
-        sent: +personData[`${m}_sent`] || 0,
-        recv: +personData[`${m}_recv`] || 0
-    })).filter(d => d.sent > 0 || d.recv > 0);
+    // Only months with messages come back, over the contact's whole history
+    d3.json(`${apiContact}?${new URLSearchParams({ name })}`).then(personData => {
+        drawPersonDetail(personData.months.map((m, i) => ({
+            month: m,
+            sent: personData.sent[i],
+            recv: personData.recv[i]
+        })));
+    });
+}
 
+function drawPersonDetail(seriesData) {
     // Clear and draw detail chart
     const detailDiv = d3.select("#person-detail-chart");
     detailDiv.selectAll("*").remove();
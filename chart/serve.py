@@ -2,23 +2,384 @@
 """
 Simple dev server for the chart.
 Serves from parent directory so CSV is accessible.
-Usage: python3 chart/serve.py
+
+/api/* endpoints answer date-range + top-N queries from message_stats.db (written by
+query_messages_detailed.py, see aggregate_store.py), so charts only download what
+they draw:
+  /api/meta                                    month/quarter labels for the date selects
+  /api/monthly?start=2023-01&end=2024-06&top=10[&granularity=quarter]
+  /api/series?start=2023-01[-15]&end=...&top=10&width=1200[&level=day|week|month|quarter|year]
+                                               the finest rollup level that fits width pixels
+                                               (a finer level is coarsened; top <= 100)
+  /api/sent_recv?start=...&end=...&top=...
+  /api/race?start=...&end=...&bars=12&mode=monthly|cumulative   delta-encoded race frames
+  /api/contact?name=...                        one contact's monthly history (detail panels)
+  /api/response?start=...&end=...&top=...&sort=my_response|their_response|difference
+  /api/events                                  server-sent "change" events in --live mode
+
+--live polls chat.db / chat.db-wal mtimes (a stat every POLL_SECONDS). Once writes
+have settled for DEBOUNCE_SECONDS, messages newer than the store's ROWID watermark
+are folded into message_stats.db and a change event lists the affected months;
+open charts re-fetch only when those months fall in their selected range. Needs the
+same Full Disk Access as the exporters.
+
+Threaded with HTTP/1.1 keep-alive. Text assets (CSV/JSON/JS/HTML/CSS) are gzipped
+when the browser accepts it, and every file gets a strong ETag from its content
+hash with Cache-Control: no-cache, so unchanged data revalidates as a 304.
+Usage: python3 chart/serve.py [--live]
+       python3 chart/serve.py --load-test   # requests/sec with several chart tabs open
 """
 
+import argparse
+import gzip
+import hashlib
+import http.client
 import http.server
+import io
+import json
 import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
+# aggregate_store.py sits next to the exporters in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aggregate_store
+from contact_index import load_contacts
+from query_messages_detailed import IMESSAGE_DB, update_store
+
 PORT = 8000
 
+POLL_SECONDS = 2
+# Fold once chat.db has been quiet this long, but never wait longer than MAX_DELAY_SECONDS
+DEBOUNCE_SECONDS = 3
+MAX_DELAY_SECONDS = 15
+# Comment lines keep idle SSE connections open and notice closed tabs
+HEARTBEAT_SECONDS = 15
+
+COMPRESSIBLE = {".csv", ".json", ".js", ".html", ".css", ".svg"}
+
+# path -> (query function, accepted parameters)
+API_ROUTES = {
+    "/api/meta": (aggregate_store.meta, ()),
+    "/api/monthly": (aggregate_store.monthly, ("start", "end", "top", "granularity")),
+    "/api/series": (aggregate_store.series, ("start", "end", "top", "level", "width")),
+    "/api/sent_recv": (aggregate_store.sent_recv, ("start", "end", "top")),
+    "/api/race": (aggregate_store.race, ("start", "end", "bars", "mode")),
+    "/api/contact": (aggregate_store.contact, ("name",)),
+    "/api/response": (aggregate_store.response, ("start", "end", "top", "sort")),
+}
+
+
+class FileCache:
+    """Content hash and gzip body per file, recomputed only when mtime/size change."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry["key"] == key:
+            return entry
+
+        with open(path, "rb") as f:
+            body = f.read()
+        entry = {
+            "key": key,
+            "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            "body": body,
+            "gzip": None,
+        }
+        if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+            entry["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+        with self.lock:
+            self.entries[path] = entry
+        return entry
+
+
+class ChangeFeed:
+    """Recent store change events; SSE clients wait for versions they have not sent yet."""
+
+    def __init__(self, keep=100):
+        self.keep = keep
+        self.version = 0
+        self.events = []
+        self.cond = threading.Condition()
+
+    def publish(self, payload):
+        with self.cond:
+            self.version += 1
+            self.events.append((self.version, payload))
+            del self.events[:-self.keep]
+            self.cond.notify_all()
+
+    def wait(self, seen, timeout):
+        """Block until there is an event newer than seen (or timeout); returns (version, payloads)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > seen, timeout)
+            return self.version, [payload for version, payload in self.events if version > seen]
+
+
+def watch_chat_db(feed, contacts):
+    """Poll chat.db mtimes and fold new messages into the store once writes settle."""
+    paths = (IMESSAGE_DB, IMESSAGE_DB + "-wal")
+
+    def mtimes():
+        stamps = []
+        for path in paths:
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    seen = mtimes()
+    first_change = last_change = None
+    while True:
+        time.sleep(POLL_SECONDS)
+        now = time.monotonic()
+        current = mtimes()
+        if current != seen:
+            seen = current
+            last_change = now
+            first_change = first_change or now
+        if first_change is None:
+            continue
+        if now - last_change < DEBOUNCE_SECONDS and now - first_change < MAX_DELAY_SECONDS:
+            continue
+        first_change = None
+        try:
+            months = update_store(contacts)
+        except Exception as e:
+            print(f"Live refresh failed: {e}")
+            continue
+        if months:
+            conn = aggregate_store.connect()
+            last_month = aggregate_store.meta(conn)["months"][-1]
+            conn.close()
+            print(f"Live refresh: {len(months)} months updated")
+            feed.publish({"months": months, "last_month": last_month})
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header (a list of ETags, or *) covers etag. The
+    comparison is weak, as RFC 9110 asks for If-None-Match: W/ prefixes are ignored."""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class ChartRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with keep-alive, gzip and ETag revalidation for files."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY a kept-alive
+    # connection stalls on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def __init__(self, *args, cache, feed=None, **kwargs):
+        self.cache = cache
+        self.feed = feed
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path == "/api/events":
+            self.stream_events()
+        else:
+            super().do_GET()
+
+    def stream_events(self):
+        if self.feed is None:
+            # 204 tells EventSource to stop reconnecting: live mode is off
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        seen = self.feed.version
+        try:
+            while True:
+                seen, payloads = self.feed.wait(seen, HEARTBEAT_SECONDS)
+                chunks = [f"event: change\ndata: {json.dumps(p)}\n\n" for p in payloads] or [": ping\n\n"]
+                self.wfile.write("".join(chunks).encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_head(self):
+        if self.path.startswith("/api/"):
+            return self.send_api()
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            # Directories, redirects and 404s keep the stock behaviour
+            return super().send_head()
+        try:
+            entry = self.cache.get(path)
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        return self.send_body(200, self.guess_type(path), entry["body"], entry["etag"], entry["gzip"])
+
+    def send_api(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path not in API_ROUTES:
+            return self.send_json(404, {"error": f"unknown endpoint {url.path}"})
+        query, accepted = API_ROUTES[url.path]
+        params = {
+            key: values[-1]
+            for key, values in urllib.parse.parse_qs(url.query).items()
+            if key in accepted
+        }
+        try:
+            conn = aggregate_store.connect()
+            try:
+                payload = query(conn, **params)
+            finally:
+                conn.close()
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        except sqlite3.Error as e:
+            if aggregate_store.is_busy(e):
+                return self.send_json(503, {"error": f"{aggregate_store.STORE_PATH} is being updated; try again"})
+            return self.send_json(503, {
+                "error": f"{aggregate_store.STORE_PATH} is missing or outdated; "
+                         "run python3 query_messages_detailed.py"
+            })
+        return self.send_json(200, payload)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        # Small error bodies are not worth compressing
+        gzip_body = gzip.compress(body, compresslevel=6, mtime=0) if len(body) > 1024 else None
+        return self.send_body(status, "application/json", body, etag, gzip_body)
+
+    def send_body(self, status, content_type, body, etag, gzip_body):
+        """Send headers for body (or a 304) and return the bytes for copyfile()."""
+        if status == 200 and etag_matches(self.headers.get("If-None-Match", ""), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return None
+
+        use_gzip = gzip_body is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = gzip_body
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        if gzip_body is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        return io.BytesIO(body)
+
+
+class QuietRequestHandler(ChartRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port, handler_class=ChartRequestHandler, feed=None):
+    handler = partial(handler_class, directory=".", cache=FileCache(), feed=feed)
+    return http.server.ThreadingHTTPServer(("", port), handler)
+
+
+class QuietStockHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def load_test(tabs=6, seconds=5):
+    """Simulate several chart tabs fetching their data, against the stock server and this one."""
+    paths = [
+        f"/{name}" for name in (
+            "message_stats_monthly.csv", "message_stats_quarterly.csv",
+            "message_stats_sent_recv.csv", "message_response_times.csv", "message_day_hour.json",
+        ) if os.path.exists(name)
+    ] + ["/chart/index.html", "/chart/chart.js", "/chart/style.css"]
+
+    def tab(port, revalidate):
+        conn = http.client.HTTPConnection("localhost", port)
+        etags = {}
+        done = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for path in paths:
+                headers = {"Accept-Encoding": "gzip"}
+                if revalidate and etags.get(path):
+                    headers["If-None-Match"] = etags[path]
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                etags[path] = resp.getheader("ETag")
+                done += 1
+        conn.close()
+        return done
+
+    stock = http.server.HTTPServer(("", 0), partial(QuietStockHandler, directory="."))
+    runs = [
+        ("stock HTTPServer", stock, False),
+        ("threaded + gzip", make_server(0, QuietRequestHandler), False),
+        ("threaded + 304s", None, True),
+    ]
+    print(f"Load test: {tabs} tabs x {len(paths)} files, {seconds}s per run")
+    httpd = None
+    for label, server, revalidate in runs:
+        if server is not None:
+            if httpd is not None:
+                httpd.shutdown()
+            httpd = server
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        with ThreadPoolExecutor(tabs) as pool:
+            total = sum(pool.map(partial(tab, port), [revalidate] * tabs))
+        print(f"  {label:<18} {total / seconds:>8,.0f} requests/sec")
+    httpd.shutdown()
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Serve the chart dashboard")
+    parser.add_argument("--live", action="store_true",
+                        help="watch chat.db and push updates to open charts")
+    parser.add_argument("--load-test", action="store_true", help="measure requests/sec and exit")
+    args = parser.parse_args()
+
     # Change to parent directory so CSV is accessible
     os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    handler = partial(http.server.SimpleHTTPRequestHandler, directory=".")
+    if args.load_test:
+        load_test()
+        return
+
+    feed = None
+    if args.live:
+        if not os.path.exists(aggregate_store.STORE_PATH):
+            parser.error(f"{aggregate_store.STORE_PATH} not found; run python3 query_messages_detailed.py first")
+        print("Loading contacts for live refresh...")
+        feed = ChangeFeed()
+        threading.Thread(target=watch_chat_db, args=(feed, load_contacts()), daemon=True).start()
 
-    with http.server.HTTPServer(("", PORT), handler) as httpd:
+    with make_server(PORT, feed=feed) as httpd:
         url = f"http://localhost:{PORT}/chart/"
         print(f"Serving at {url}")
         print("Press Ctrl+C to stop")
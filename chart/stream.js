@@ -1,6 +1,7 @@
 // Stream Graph - stacked area showing messaging volume over time
-const csvPathMonthly = "../message_stats_monthly.csv?" + Date.now();
-const csvPathQuarterly = "../message_stats_quarterly.csv?" + Date.now();
+// serve.py answers /api/* from message_stats.db with only the selected range and top N
+const apiMeta = "/api/meta";
+const apiSeries = "/api/series";
 
 const margin = { top: 20, right: 30, bottom: 50, left: 60 };
 const width = Math.min(1400, window.innerWidth - 80) - margin.left - margin.right;
@@ -22,106 +23,80 @@ const offsetSelect = document.getElementById("offset-mode");
 const startDateSelect = document.getElementById("start-date");
 const endDateSelect = document.getElementById("end-date");
 
-let monthlyData, quarterlyData, colorMap;
-let allMonths = [], allQuarters = [];
+let rangeData;
+const colorMap = new Map();
 const hiddenContacts = new Set();
 
-Promise.all([
-    d3.csv(csvPathMonthly),
-    d3.csv(csvPathQuarterly)
-]).then(([monthly, quarterly]) => {
-    monthlyData = monthly;
-    quarterlyData = quarterly;
-
-    // Get all period columns
-    allMonths = Object.keys(monthly[0]).filter(k => k !== "name" && k !== "total_dm");
-    allQuarters = Object.keys(quarterly[0]).filter(k => k !== "name" && k !== "total_dm");
-
+d3.json(apiMeta).then(meta => {
     // Populate date selects with months
-    allMonths.forEach(m => {
+    meta.months.forEach(m => {
         const label = new Date(m + "-01").toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
         startDateSelect.add(new Option(label, m));
         endDateSelect.add(new Option(label, m));
     });
     // Default to full data range
-    startDateSelect.value = allMonths[0];
-    endDateSelect.value = allMonths[allMonths.length - 1];
-
-    // Assign colors
-    colorMap = new Map();
-    monthlyData.forEach((d, i) => {
-        colorMap.set(d.name, colors[i % colors.length]);
-    });
+    startDateSelect.value = meta.months[0];
+    endDateSelect.value = meta.months[meta.months.length - 1];
 
-    render();
-
-    timePeriodSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
-    topNSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
+    timePeriodSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
+    topNSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
     offsetSelect.addEventListener("change", render);
-    startDateSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
-    endDateSelect.addEventListener("change", () => { hiddenContacts.clear(); render(); });
+    startDateSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
+    endDateSelect.addEventListener("change", () => { hiddenContacts.clear(); refresh(); });
+
+    watchStore(startDateSelect, endDateSelect, refresh);
+    return refresh();
 }).catch(err => {
-    console.error("Failed to load CSV:", err);
+    console.error("Failed to load data:", err);
     document.getElementById("chart").innerHTML =
         `<p style="color: #f87171; text-align: center; padding: 40px;">
-            Failed to load data. Run <code>python3 query_messages_monthly.py</code> first.
+            Failed to load data. Run <code>python3 query_messages_detailed.py</code>, then <code>python3 chart/serve.py</code>.
         </p>`;
 });
 
+// Select value -> /api/series level; "auto" lets the server pick the finest of
+// day/week/month/quarter/year that fits the chart width
+const seriesLevels = { monthly: "month", quarterly: "quarter", auto: "auto" };
+
+// Fetch the top N contacts within the date range (ranked by their totals in it),
+// with one value per period, then draw
+function refresh() {
+    const params = new URLSearchParams({
+        start: startDateSelect.value,
+        end: endDateSelect.value,
+        top: topNSelect.value,
+        level: seriesLevels[timePeriodSelect.value],
+        width: width
+    });
+    return d3.json(`${apiSeries}?${params}`).then(data => {
+        rangeData = data;
+        // Colors follow all-time rank so a contact keeps its color across ranges
+        data.rows.forEach(d => colorMap.set(d.name, colors[(d.rank - 1) % colors.length]));
+        render();
+    });
+}
+
 function render() {
     svg.selectAll("*").remove();
     d3.select("#legend").selectAll("*").remove();
 
-    const timePeriod = timePeriodSelect.value;
-    const topN = parseInt(topNSelect.value);
+    const level = rangeData.level;
     const offsetMode = offsetSelect.value;
-    const startDate = startDateSelect.value;
-    const endDate = endDateSelect.value;
-
-    const rawData = timePeriod === "monthly" ? monthlyData : quarterlyData;
-    let allPeriods = timePeriod === "monthly" ? allMonths : allQuarters;
-
-    // Filter periods within date range
-    let periods;
-    if (timePeriod === "monthly") {
-        periods = allPeriods.filter(p => p >= startDate && p <= endDate);
-    } else {
-        // Convert months to quarters for filtering
-        const startQ = startDate.slice(0, 4) + "-Q" + Math.ceil(parseInt(startDate.slice(5, 7)) / 3);
-        const endQ = endDate.slice(0, 4) + "-Q" + Math.ceil(parseInt(endDate.slice(5, 7)) / 3);
-        periods = allPeriods.filter(p => p >= startQ && p <= endQ);
-    }
 
+    const periods = rangeData.periods;
     if (periods.length === 0) return;
 
-    // Parse period labels
-    const parsePeriod = timePeriod === "monthly"
-        ? d3.timeParse("%Y-%m")
-        : (p => {
-            const [year, q] = p.split("-Q");
-            const month = (parseInt(q) - 1) * 3 + 1;
-            return new Date(parseInt(year), month, 1);
-        });
-
-    // Calculate top contacts within this date range (using monthly data for consistency)
-    const filteredMonths = allMonths.filter(m => m >= startDate && m <= endDate);
-    const contactTotals = monthlyData.map(d => {
-        let total = 0;
-        filteredMonths.forEach(m => total += (+d[m] || 0));
-        return { name: d.name, total };
-    });
-    contactTotals.sort((a, b) => b.total - a.total);
+    // Each period is plotted at its first day
+    const parseStart = d3.timeParse("%Y-%m-%d");
 
-    // Get top N contacts within the range
-    const topContacts = contactTotals.slice(0, topN).map(c => c.name);
-    const visibleContacts = topContacts.filter(c => !hiddenContacts.has(c));
+    // Rows arrive ranked by total within the range
+    const topContacts = rangeData.rows.map(d => d.name);
 
     // Build stacked data
-    const stackData = periods.map(period => {
-        const row = { date: parsePeriod(period), period: period };
-        topContacts.forEach(name => {
-            const d = rawData.find(r => r.name === name);
-            row[name] = hiddenContacts.has(name) ? 0 : (d ? (+d[period] || 0) : 0);
+    const stackData = periods.map((period, i) => {
+        const row = { date: parseStart(rangeData.starts[i]), period: period };
+        rangeData.rows.forEach(d => {
+            row[d.name] = hiddenContacts.has(d.name) ? 0 : d.values[i];
         });
         return row;
     });
@@ -194,13 +169,13 @@ function render() {
                 .style("top", (event.pageY - 10) + "px");
         });
 
-    // X axis
-    const tickInterval = timePeriod === "monthly"
-        ? d3.timeMonth.every(6)
-        : d3.timeMonth.every(12);
-    const tickFormat = timePeriod === "monthly"
-        ? d3.timeFormat("%b '%y")
-        : d3.timeFormat("Q%q '%y");
+    // X axis; days, weeks and years use d3's default time ticks
+    const tickInterval = level === "month" ? d3.timeMonth.every(6)
+        : level === "quarter" ? d3.timeMonth.every(12)
+        : Math.max(2, Math.floor(width / 100));
+    const tickFormat = level === "month" ? d3.timeFormat("%b '%y")
+        : level === "quarter" ? d3.timeFormat("Q%q '%y")
+        : null;
 
     svg.append("g")
         .attr("class", "axis")
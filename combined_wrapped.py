@@ -4,7 +4,7 @@ Combined Wrapped 2025 - Your texting habits across iMessage AND WhatsApp, expose
 Usage: python3 combined_wrapped.py
 """
 
-import sqlite3, os, sys, re, subprocess, argparse, glob, threading, time
+import sqlite3, os, sys, subprocess, argparse, glob, threading, time
 from datetime import datetime, timedelta
 
 # Database paths
@@ -16,6 +16,85 @@ WHATSAPP_PATHS = [
     os.path.expanduser("~/Library/Containers/desktop.WhatsApp/Data/Library/Application Support/WhatsApp/ChatStorage.sqlite"),
 ]
 
+# Decoded attributedBody text. message_text.py (next to this script) decodes large backlogs on
+# a process pool; downloaded on its own, this script uses the single-process copy below. Both
+# read and write the same cache file and schema, so keep TEXT_CACHE_VERSION in sync.
+try:
+    from message_text import TEXT_CACHE_DB, attach_text_cache, update_text_cache
+except ImportError:
+    TEXT_CACHE_DB = "message_text_cache.db"
+    TEXT_CACHE_VERSION = 1
+
+    def decode_attributed_body(data):
+        """Plain text of an attributedBody typedstream blob, or None: the length-prefixed
+        string after the NSString class and the '+' type tag."""
+        start = data.find(b'NSString') if data else -1
+        while start >= 0:
+            tag = data.find(b'\x84\x01+', start + 9, start + 19)
+            if tag >= 0:
+                i = tag + 3
+                if i >= len(data):
+                    return None
+                if data[i] < 0x80:
+                    length, i = data[i], i + 1
+                elif data[i] == 0x81:
+                    length, i = int.from_bytes(data[i + 1:i + 3], 'little'), i + 3
+                elif data[i] == 0x82:
+                    length, i = int.from_bytes(data[i + 1:i + 5], 'little'), i + 5
+                else:
+                    return None
+                if i + length > len(data):
+                    return None
+                return data[i:i + length].decode('utf-8', 'ignore')
+            start = data.find(b'NSString', start + 1)
+        return None
+
+    def update_text_cache(workers=None, db=IMESSAGE_DB, path=TEXT_CACHE_DB):
+        """Decode attributedBody for text-less messages above the cache's ROWID watermark
+        into the owner-only cache at path. Returns the number decoded."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+        cache = sqlite3.connect(path)
+        cache.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS decoded (message_id INTEGER PRIMARY KEY, text TEXT);
+        """)
+        meta = dict(cache.execute("SELECT key, value FROM meta"))
+        if meta.get('version') != TEXT_CACHE_VERSION:
+            cache.execute("DELETE FROM decoded")
+            meta = {}
+        conn = sqlite3.connect(db)
+        top = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+        rows = conn.execute("""
+            SELECT ROWID, attributedBody FROM message
+            WHERE ROWID > ? AND ROWID <= ? AND (text IS NULL OR text = '') AND attributedBody IS NOT NULL
+            ORDER BY ROWID
+        """, (meta.get('watermark', 0), top))
+        count = cache.executemany("INSERT OR REPLACE INTO decoded VALUES (?, ?)",
+                                  ((rowid, decode_attributed_body(body)) for rowid, body in rows)).rowcount
+        conn.close()
+        cache.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [('version', TEXT_CACHE_VERSION), ('watermark', top)])
+        cache.commit()
+        cache.close()
+        return max(count, 0)
+
+    def attach_text_cache(conn, path=TEXT_CACHE_DB):
+        """Attach the decoded-text cache at path as schema tc (an empty in-memory one if it is missing)."""
+        if os.path.exists(path):
+            try:
+                conn.execute("ATTACH DATABASE ? AS tc", (path,))
+                conn.execute("SELECT 1 FROM tc.decoded LIMIT 1")
+                return
+            except sqlite3.Error:
+                try:
+                    conn.execute("DETACH DATABASE tc")
+                except sqlite3.Error:
+                    pass
+        conn.execute("ATTACH DATABASE ':memory:' AS tc")
+        conn.execute("CREATE TABLE tc.decoded (message_id INTEGER PRIMARY KEY, text TEXT)")
+
 WHATSAPP_DB = None
 
 class Spinner:
@@ -70,9 +149,16 @@ TS_JUN_2024_WHATSAPP = 738892800
 TS_2025_END_WHATSAPP = 788918399  # Dec 31, 2025 23:59:59
 TS_2024_END_WHATSAPP = 757382399  # Dec 31, 2024 23:59:59
 
+# bytes.translate deletion table: every byte except ASCII 0-9
+NON_DIGITS = bytes(b for b in range(256) if not 48 <= b <= 57)
+
+def digits_only(value):
+    """Strip everything but digits (translate table, no per-call regex)."""
+    return str(value).encode('utf-8', 'ignore').translate(None, NON_DIGITS).decode('ascii')
+
 def normalize_phone(phone):
     if not phone: return None
-    digits = re.sub(r'\D', '', str(phone))
+    digits = digits_only(phone)
     if len(digits) == 11 and digits.startswith('1'):
         digits = digits[1:]
     elif len(digits) > 10:
@@ -95,7 +181,7 @@ def extract_imessage_contacts():
             for owner, phone in conn.execute("SELECT ZOWNER, ZFULLNUMBER FROM ZABCDPHONENUMBER WHERE ZFULLNUMBER IS NOT NULL"):
                 if owner in people:
                     name = people[owner]
-                    digits = re.sub(r'\D', '', str(phone))
+                    digits = digits_only(phone)
                     if digits:
                         contacts[digits] = name
                         if len(digits) >= 10:
@@ -131,7 +217,7 @@ def get_name_imessage(handle, contacts):
         lookup = handle.lower().strip()
         if lookup in contacts: return contacts[lookup]
         return handle.split('@')[0]
-    digits = re.sub(r'\D', '', str(handle))
+    digits = digits_only(handle)
     if digits in contacts: return contacts[digits]
     if len(digits) == 11 and digits.startswith('1'):
         if digits[1:] in contacts: return contacts[digits[1:]]
@@ -198,8 +284,15 @@ def check_access():
 
     return has_imessage, has_whatsapp
 
+# message rows with text filled in from the decoded attributedBody cache (see attach_text_cache)
+MESSAGES_WITH_TEXT = """(
+        SELECT m.ROWID, m.date, m.is_from_me, COALESCE(NULLIF(m.text, ''), d.text) AS text
+        FROM message m LEFT JOIN tc.decoded d ON d.message_id = m.ROWID
+    )"""
+
 def q_imessage(sql):
     conn = sqlite3.connect(IMESSAGE_DB)
+    attach_text_cache(conn)
     r = conn.execute(sql).fetchall()
     conn.close()
     return r
@@ -210,10 +303,16 @@ def q_whatsapp(sql):
     conn.close()
     return r
 
-def analyze_imessage(ts_start, ts_end, ts_jun):
+def analyze_imessage(ts_start, ts_end, ts_jun, workers=None):
     """Analyze iMessage data and return stats dict."""
     d = {}
 
+    # Fill in text that only exists in attributedBody, so words and emoji count it
+    try:
+        update_text_cache(workers)
+    except (sqlite3.Error, OSError):
+        pass
+
     one_on_one_cte = """
         WITH chat_participants AS (
             SELECT chat_id, COUNT(*) as participant_count
@@ -451,13 +550,13 @@ def analyze_imessage(ts_start, ts_end, ts_jun):
     # Emojis (batch query)
     emojis = ['😂','❤️','😭','🔥','💀','✨','🙏','👀','💯','😈']
     emoji_cases = ', '.join([f"SUM(CASE WHEN text LIKE '%{e}%' THEN 1 ELSE 0 END)" for e in emojis])
-    r = q_imessage(f"SELECT {emoji_cases} FROM message WHERE (date/1000000000+978307200)>{ts_start} AND (date/1000000000+978307200)<{ts_end} AND is_from_me=1")
+    r = q_imessage(f"SELECT {emoji_cases} FROM {MESSAGES_WITH_TEXT} WHERE (date/1000000000+978307200)>{ts_start} AND (date/1000000000+978307200)<{ts_end} AND is_from_me=1")
     d['emoji'] = dict(zip(emojis, r[0])) if r else {e: 0 for e in emojis}
 
     # Words
     r = q_imessage(f"""
         SELECT COUNT(*), COALESCE(SUM(LENGTH(text) - LENGTH(REPLACE(text, ' ', ''))), 0)
-        FROM message
+        FROM {MESSAGES_WITH_TEXT}
         WHERE (date/1000000000+978307200)>{ts_start} AND (date/1000000000+978307200)<{ts_end}
         AND is_from_me=1 AND text IS NOT NULL AND LENGTH(text) > 0
         AND text NOT LIKE 'Loved "%' AND text NOT LIKE 'Liked "%'
@@ -2076,6 +2175,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--output', '-o', default=None)
     parser.add_argument('--use-2024', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
     args = parser.parse_args()
 
     print("\n" + "="*50)
@@ -2132,7 +2232,7 @@ def main():
         ts_jun = TS_JUN_2024_IMESSAGE if year == "2024" else TS_JUN_2025_IMESSAGE
         print(f"[*] Analyzing iMessage {year}...")
         spinner.start("Reading iMessage database...")
-        imessage_data = analyze_imessage(ts_start, ts_end, ts_jun)
+        imessage_data = analyze_imessage(ts_start, ts_end, ts_jun, args.workers)
         spinner.stop(f"{imessage_data['stats'][0]:,} iMessage messages analyzed")
 
     if has_whatsapp:
@@ -10,6 +10,85 @@ from datetime import datetime
 IMESSAGE_DB = os.path.expanduser("~/Library/Messages/chat.db")
 ADDRESSBOOK_DIR = os.path.expanduser("~/Library/Application Support/AddressBook")
 
+# Decoded attributedBody text. message_text.py (next to this script) decodes large backlogs on
+# a process pool; downloaded on its own, this script uses the single-process copy below. Both
+# read and write the same cache file and schema, so keep TEXT_CACHE_VERSION in sync.
+try:
+    from message_text import TEXT_CACHE_DB, attach_text_cache, update_text_cache
+except ImportError:
+    TEXT_CACHE_DB = "message_text_cache.db"
+    TEXT_CACHE_VERSION = 1
+
+    def decode_attributed_body(data):
+        """Plain text of an attributedBody typedstream blob, or None: the length-prefixed
+        string after the NSString class and the '+' type tag."""
+        start = data.find(b'NSString') if data else -1
+        while start >= 0:
+            tag = data.find(b'\x84\x01+', start + 9, start + 19)
+            if tag >= 0:
+                i = tag + 3
+                if i >= len(data):
+                    return None
+                if data[i] < 0x80:
+                    length, i = data[i], i + 1
+                elif data[i] == 0x81:
+                    length, i = int.from_bytes(data[i + 1:i + 3], 'little'), i + 3
+                elif data[i] == 0x82:
+                    length, i = int.from_bytes(data[i + 1:i + 5], 'little'), i + 5
+                else:
+                    return None
+                if i + length > len(data):
+                    return None
+                return data[i:i + length].decode('utf-8', 'ignore')
+            start = data.find(b'NSString', start + 1)
+        return None
+
+    def update_text_cache(workers=None, db=IMESSAGE_DB, path=TEXT_CACHE_DB):
+        """Decode attributedBody for text-less messages above the cache's ROWID watermark
+        into the owner-only cache at path. Returns the number decoded."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+        cache = sqlite3.connect(path)
+        cache.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS decoded (message_id INTEGER PRIMARY KEY, text TEXT);
+        """)
+        meta = dict(cache.execute("SELECT key, value FROM meta"))
+        if meta.get('version') != TEXT_CACHE_VERSION:
+            cache.execute("DELETE FROM decoded")
+            meta = {}
+        conn = sqlite3.connect(db)
+        top = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+        rows = conn.execute("""
+            SELECT ROWID, attributedBody FROM message
+            WHERE ROWID > ? AND ROWID <= ? AND (text IS NULL OR text = '') AND attributedBody IS NOT NULL
+            ORDER BY ROWID
+        """, (meta.get('watermark', 0), top))
+        count = cache.executemany("INSERT OR REPLACE INTO decoded VALUES (?, ?)",
+                                  ((rowid, decode_attributed_body(body)) for rowid, body in rows)).rowcount
+        conn.close()
+        cache.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [('version', TEXT_CACHE_VERSION), ('watermark', top)])
+        cache.commit()
+        cache.close()
+        return max(count, 0)
+
+    def attach_text_cache(conn, path=TEXT_CACHE_DB):
+        """Attach the decoded-text cache at path as schema tc (an empty in-memory one if it is missing)."""
+        if os.path.exists(path):
+            try:
+                conn.execute("ATTACH DATABASE ? AS tc", (path,))
+                conn.execute("SELECT 1 FROM tc.decoded LIMIT 1")
+                return
+            except sqlite3.Error:
+                try:
+                    conn.execute("DETACH DATABASE tc")
+                except sqlite3.Error:
+                    pass
+        conn.execute("ATTACH DATABASE ':memory:' AS tc")
+        conn.execute("CREATE TABLE tc.decoded (message_id INTEGER PRIMARY KEY, text TEXT)")
+
 class Spinner:
     """Animated terminal spinner for long operations"""
     def __init__(self, message=""):
@@ -50,9 +129,16 @@ TS_JUN_2024 = 1717200000
 TS_2025_END = 1767225599  # Dec 31, 2025 23:59:59 UTC
 TS_2024_END = 1735689599  # Dec 31, 2024 23:59:59 UTC
 
+# bytes.translate deletion table: every byte except ASCII 0-9
+NON_DIGITS = bytes(b for b in range(256) if not 48 <= b <= 57)
+
+def digits_only(value):
+    """Strip everything but digits (translate table, no per-call regex)."""
+    return str(value).encode('utf-8', 'ignore').translate(None, NON_DIGITS).decode('ascii')
+
 def normalize_phone(phone):
     if not phone: return None
-    digits = re.sub(r'\D', '', str(phone))
+    digits = digits_only(phone)
     # Handle common international prefixes
     if len(digits) == 11 and digits.startswith('1'):
         digits = digits[1:]  # US/Canada +1
@@ -77,7 +163,7 @@ def extract_contacts():
             for owner, phone in conn.execute("SELECT ZOWNER, ZFULLNUMBER FROM ZABCDPHONENUMBER WHERE ZFULLNUMBER IS NOT NULL"):
                 if owner in people:
                     name = people[owner]
-                    digits = re.sub(r'\D', '', str(phone))
+                    digits = digits_only(phone)
                     # Store multiple formats for better matching
                     if digits:
                         contacts[digits] = name  # Full international
@@ -99,7 +185,7 @@ def get_name(handle, contacts):
         if lookup in contacts: return contacts[lookup]
         return handle.split('@')[0]
     # Try multiple phone formats for matching
-    digits = re.sub(r'\D', '', str(handle))
+    digits = digits_only(handle)
     # Try full digits first (international)
     if digits in contacts: return contacts[digits]
     # Try without leading 1 (US/Canada)
@@ -180,15 +266,28 @@ def check_access():
         subprocess.run(['open', 'x-apple.systempreferences:com.apple.preference.security?Privacy_AllFiles'])
         sys.exit(1)
 
+# message rows with text filled in from the decoded attributedBody cache (see attach_text_cache)
+MESSAGES_WITH_TEXT = """(
+        SELECT m.ROWID, m.date, m.is_from_me, COALESCE(NULLIF(m.text, ''), d.text) AS text
+        FROM message m LEFT JOIN tc.decoded d ON d.message_id = m.ROWID
+    )"""
+
 def q(sql):
     conn = sqlite3.connect(IMESSAGE_DB)
+    attach_text_cache(conn)
     r = conn.execute(sql).fetchall()
     conn.close()
     return r
 
-def analyze(ts_start, ts_end, ts_jun, contacts):
+def analyze(ts_start, ts_end, ts_jun, contacts, workers=None):
     d = {}
 
+    # Fill in text that only exists in attributedBody, so words and emoji count it
+    try:
+        update_text_cache(workers)
+    except (sqlite3.Error, OSError):
+        pass
+
     # === IDENTIFY 1:1 vs GROUP CHATS ===
     # 1:1 chats have exactly 1 participant in chat_handle_join
     # Group chats have 2+ participants
@@ -442,7 +541,7 @@ def analyze(ts_start, ts_end, ts_jun, contacts):
 
     emojis = ['😂','❤️','😭','🔥','💀','✨','🙏','👀','💯','😈']
     emoji_cases = ', '.join([f"SUM(CASE WHEN text LIKE '%{e}%' THEN 1 ELSE 0 END)" for e in emojis])
-    r = q(f"SELECT {emoji_cases} FROM message WHERE (date/1000000000+978307200)>{ts_start} AND (date/1000000000+978307200)<{ts_end} AND is_from_me=1")
+    r = q(f"SELECT {emoji_cases} FROM {MESSAGES_WITH_TEXT} WHERE (date/1000000000+978307200)>{ts_start} AND (date/1000000000+978307200)<{ts_end} AND is_from_me=1")
     counts = dict(zip(emojis, r[0])) if r else {e: 0 for e in emojis}
     d['emoji'] = sorted(counts.items(), key=lambda x:-x[1])[:5]
 
@@ -453,7 +552,7 @@ def analyze(ts_start, ts_end, ts_jun, contacts):
         SELECT
             COUNT(*) as msg_count,
             COALESCE(SUM(LENGTH(text) - LENGTH(REPLACE(text, ' ', ''))), 0) as extra_words
-        FROM message
+        FROM {MESSAGES_WITH_TEXT}
         WHERE (date/1000000000+978307200)>{ts_start} AND (date/1000000000+978307200)<{ts_end}
         AND is_from_me=1
         AND text IS NOT NULL
@@ -2087,6 +2186,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--output', '-o', default=None)
     parser.add_argument('--use-2024', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
     args = parser.parse_args()
 
     print("\n" + "="*50)
@@ -2117,7 +2217,7 @@ def main():
 
     print(f"[*] Analyzing {year}...")
     spinner.start("Reading message database...")
-    data = analyze(ts_start, ts_end, ts_jun, contacts)
+    data = analyze(ts_start, ts_end, ts_jun, contacts, args.workers)
     data['year'] = int(year)  # Pass the year to gen_html
     spinner.stop(f"{data['stats'][0]:,} messages analyzed")
 
@@ -74,7 +74,6 @@ import tempfile
 import shutil
 import threading
 import traceback
-import re
 from datetime import datetime, timedelta
 from pathlib import Path
 from collections import defaultdict
@@ -275,6 +274,15 @@ def load_contacts(tmp_dir: Path) -> dict:
     return contacts
 
 
+# bytes.translate deletion table: every byte except ASCII 0-9
+NON_DIGITS = bytes(b for b in range(256) if not 48 <= b <= 57)
+
+
+def digits_only(value):
+    """Strip everything but digits (translate table, no per-call regex)."""
+    return str(value).encode('utf-8', 'ignore').translate(None, NON_DIGITS).decode('ascii')
+
+
 def resolve_contact(identifier: str, contacts: dict, whatsapp_name: str = None) -> str:
     """Resolve a phone/email to a contact name."""
     if not identifier:
@@ -295,7 +303,7 @@ def resolve_contact(identifier: str, contacts: dict, whatsapp_name: str = None)
         return None
     
     # Phone
-    cleaned = re.sub(r'[^\d]', '', ident)
+    cleaned = digits_only(ident)
     if 5 <= len(cleaned) <= 6:  # Short codes
         return None
     if len(cleaned) >= 10 and cleaned[-10:-7] in ('800', '888', '877', '866', '855', '844', '833'):
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk archive of the analytical message columns, for re-analysis without
+SQLite (or Full Disk Access) once it is written.
+Outputs message_archive/:
+  - index.json: contact names (and which are unresolved handles), column types (array typecodes and NumPy dtypes, so
+    numpy.memmap can open the files too), segments, row count and ROWID watermark
+  - one directory per segment (00000/, 00001/, ...), each holding a batch of rows:
+    - ts.bin, contact.bin, chat.bin, direction.bin, text_len.bin, flags.bin: one flat
+      native-endian array per column (see COLUMNS), one entry per message
+    - offsets.bin: contact i's rows in the segment are [offsets[i], offsets[i + 1])
+
+Within a segment rows are sorted by (contact, ts), so one contact's messages are a
+contiguous slice and a date range within it is two bisects over the memory-mapped ts
+column. ts is the raw chat.db date (nanoseconds since 2001-01-01 UTC). contact is the
+1:1 chat's participant, or the sender in group chats; 0 ("") is a group message from
+me or a message without a handle. Names come from the AddressBook; unresolved handles
+are kept as-is.
+
+Re-running appends the messages above the watermark (ROWID, read in the same snapshot
+as the scan) as a new segment, so an update costs only the new rows; existing
+segments are never rewritten. Past MAX_SEGMENTS segments they are compacted into one.
+Edits to messages that were already archived are not picked up; use --rebuild.
+query_messages_monthly.py --archive reads its monthly DM totals from here instead of chat.db.
+Usage: python3 message_archive.py             # build, or append new messages
+       python3 message_archive.py --rebuild
+       python3 message_archive.py --counts [--days N]   # top contacts, read from the archive only
+       python3 message_archive.py --check     # compare with chat.db, time a range query
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from array import array
+from bisect import bisect_left
+
+from contact_index import load_contacts, resolve_names
+from query_messages_monthly import DM_CHATS_CTE
+
+IMESSAGE_DB = os.path.expanduser("~/Library/Messages/chat.db")
+ARCHIVE_DIR = "message_archive"
+# Appends add a segment each; past this many they are merged into one
+MAX_SEGMENTS = 32
+
+# (column, array typecode); files are written in this order
+COLUMNS = (
+    ("ts", "q"),
+    ("contact", "I"),
+    ("chat", "I"),
+    ("direction", "B"),  # 1 = sent by me
+    ("text_len", "I"),  # characters in message.text
+    ("flags", "B"),
+)
+FLAG_ATTACHMENT = 1
+FLAG_REACTION = 2  # tapback / associated message
+FLAG_GROUP = 4
+FLAG_BODY_ONLY = 8  # text only in attributedBody, so text_len is 0
+FLAG_SYSTEM = 16  # item_type != 0 (renames, participant changes, ...)
+
+EXTRACT_QUERY = """
+    SELECT m.ROWID, m.date, cmj.chat_id, m.is_from_me, COALESCE(LENGTH(m.text), 0),
+           m.text IS NULL AND m.attributedBody IS NOT NULL,
+           m.cache_has_attachments, m.associated_message_type, m.item_type, h.id
+    FROM message m
+    LEFT JOIN chat_message_join cmj ON cmj.message_id = m.ROWID
+    LEFT JOIN handle h ON h.ROWID = m.handle_id
+    WHERE m.ROWID > ?
+"""
+
+
+def _dtype(typecode):
+    """NumPy dtype string for an array typecode on this machine, e.g. 'q' -> '<i8'."""
+    kind = "u" if typecode.isupper() or typecode == "B" else "i"
+    return ("<" if sys.byteorder == "little" else ">") + kind + str(array(typecode).itemsize)
+
+
+def extract(conn, contacts, after_rowid, contact_ids, unresolved=None):
+    """
+    Messages with ROWID > after_rowid as columns sorted by (contact, ts).
+    contact_ids ({name: id}) is extended in place with names seen for the first time,
+    and unresolved (a set, if given) with the handles no AddressBook name matched.
+    Returns {column: array}.
+    """
+    dm_handles = dict(conn.execute(f"WITH {DM_CHATS_CTE} SELECT chat_id, handle FROM dm_chats"))
+    names = resolve_names([h for (h,) in conn.execute("SELECT id FROM handle") if h], contacts)
+    names[None] = ""
+    contact_ids.setdefault("", 0)
+
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    ts, contact, chat = columns["ts"], columns["contact"], columns["chat"]
+    direction, text_len, flags = columns["direction"], columns["text_len"], columns["flags"]
+    seen = set()
+    for (rowid, date_ns, chat_id, is_from_me, length, body_only,
+         has_attachments, associated_type, item_type, handle) in conn.execute(EXTRACT_QUERY, (after_rowid,)):
+        if rowid in seen:  # a message joined to several chats is archived once
+            continue
+        seen.add(rowid)
+        flag = 0
+        if chat_id in dm_handles:
+            handle = dm_handles[chat_id]
+        elif is_from_me:
+            handle = None
+        if chat_id is not None and chat_id not in dm_handles:
+            flag |= FLAG_GROUP
+        if has_attachments:
+            flag |= FLAG_ATTACHMENT
+        if associated_type:
+            flag |= FLAG_REACTION
+        if body_only:
+            flag |= FLAG_BODY_ONLY
+        if item_type:
+            flag |= FLAG_SYSTEM
+        name = names.get(handle, handle)
+        if unresolved is not None and handle is not None and name == handle:
+            unresolved.add(name)
+        ts.append(date_ns or 0)
+        contact.append(contact_ids.setdefault(name, len(contact_ids)))
+        chat.append(chat_id or 0)
+        direction.append(1 if is_from_me else 0)
+        text_len.append(length)
+        flags.append(flag)
+
+    # One integer key per row keeps the sort cheap: contact in the high bits, ts
+    # (shifted to be non-negative) in the low 64
+    order = sorted(range(len(ts)), key=lambda i: (contact[i] << 64) + ts[i] + (1 << 63))
+    return {name: array(col.typecode, map(col.__getitem__, order)) for name, col in columns.items()}
+
+
+def _column(path, typecode):
+    """Read-only memory map of a column file as a memoryview of typecode items."""
+    if not os.path.getsize(path):
+        return memoryview(array(typecode))
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast(typecode)
+
+
+class Segment:
+    """One memory-mapped batch of rows sorted by (contact, ts); each column is a memoryview."""
+
+    def __init__(self, path):
+        self.offsets = _column(os.path.join(path, "offsets.bin"), "Q")
+        for name, typecode in COLUMNS:
+            setattr(self, name, _column(os.path.join(path, f"{name}.bin"), typecode))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def rows(self, contact_id, start_ns=None, end_ns=None):
+        """(lo, hi) row range of a contact's messages with start_ns <= ts < end_ns."""
+        if contact_id + 1 >= len(self.offsets):
+            return 0, 0  # Contact first seen after this segment was written
+        lo, hi = self.offsets[contact_id], self.offsets[contact_id + 1]
+        if start_ns is not None:
+            lo = bisect_left(self.ts, start_ns, lo, hi)
+        if end_ns is not None:
+            hi = bisect_left(self.ts, end_ns, lo, hi)
+        return lo, hi
+
+
+class Archive:
+    """Memory-mapped view of message_archive/: its segments, oldest first."""
+
+    def __init__(self, path=ARCHIVE_DIR):
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        for name, typecode in COLUMNS:
+            if index["columns"][name]["dtype"] != _dtype(typecode):
+                raise ValueError(f"{path} was written on a machine with a different {name} layout; use --rebuild")
+        self.path = path
+        self.index = index
+        self.watermark = index["watermark"]
+        self.contacts = index["contacts"]
+        self.contact_ids = {name: i for i, name in enumerate(self.contacts)}
+        self.unresolved = set(index.get("unresolved", []))
+        self.segments = [Segment(os.path.join(path, segment)) for segment in index["segments"]]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def slices(self, name, start_ns=None, end_ns=None):
+        """(segment, lo, hi) for every segment holding the contact's messages in [start_ns, end_ns)."""
+        contact_id = self.contact_ids[name]
+        for segment in self.segments:
+            lo, hi = segment.rows(contact_id, start_ns, end_ns)
+            if hi > lo:
+                yield segment, lo, hi
+
+    def counts(self, start_ns=None, end_ns=None):
+        """{name: (sent, received)} for every contact with messages in [start_ns, end_ns)."""
+        result = {}
+        for name in self.contacts:
+            sent = total = 0
+            for segment, lo, hi in self.slices(name, start_ns, end_ns):
+                sent += segment.direction[lo:hi].tobytes().count(1)
+                total += hi - lo
+            if total:
+                result[name] = (sent, total - sent)
+        return result
+
+    def date_range(self):
+        """(first, last) ts of the archived messages with a date, or None if there are none."""
+        dated = [(min(t for t in segment.ts if t > 0), max(segment.ts))
+                 for segment in self.segments if len(segment) and max(segment.ts) > 0]
+        if not dated:
+            return None
+        return min(first for first, _ in dated), max(last for _, last in dated)
+
+    def dm_monthly(self, month_starts):
+        """1:1-chat message counts per period for every resolved contact, like the
+        query_messages_monthly.py query: {name: (sent, total)}, lists where entry k counts
+        ts in [month_starts[k], month_starts[k + 1])."""
+        result = {}
+        periods = len(month_starts) - 1
+        for name in self.contacts:
+            if not name or name in self.unresolved:
+                continue
+            sent, total = [0] * periods, [0] * periods
+            for segment, lo, hi in self.slices(name, month_starts[0], month_starts[-1]):
+                bounds = [bisect_left(segment.ts, start, lo, hi) for start in month_starts]
+                for k in range(periods):
+                    a, b = bounds[k], bounds[k + 1]
+                    for flag, chat, direction in zip(segment.flags[a:b], segment.chat[a:b], segment.direction[a:b]):
+                        if chat and not flag & FLAG_GROUP:
+                            total[k] += 1
+                            sent[k] += direction
+            if any(total):
+                result[name] = (sent, total)
+        return result
+
+    def columns(self):
+        """Every row as {column: array}, sorted by (contact, ts) across segments."""
+        columns = {name: array(typecode) for name, typecode in COLUMNS}
+        for contact_id in range(len(self.contacts)):
+            rows = [(segment.ts[i], n, i) for n, segment in enumerate(self.segments)
+                    for i in range(*segment.rows(contact_id))]
+            rows.sort()
+            for name, _ in COLUMNS:
+                sources = [getattr(segment, name) for segment in self.segments]
+                columns[name].extend(sources[n][i] for _, n, i in rows)
+        return columns
+
+
+def _offsets(contact, n_contacts):
+    """offsets array for a contact column sorted by contact."""
+    offsets = array("Q", [0]) * (n_contacts + 1)
+    for contact_id in contact:
+        offsets[contact_id + 1] += 1
+    for i in range(n_contacts):
+        offsets[i + 1] += offsets[i]
+    return offsets
+
+
+def write_segment(columns, n_contacts, path):
+    """Write rows sorted by (contact, ts) (see extract()) as a segment directory.
+    Built under a temp name and renamed, so a segment is either complete or absent."""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for name, _ in COLUMNS:
+        with open(os.path.join(tmp_path, f"{name}.bin"), "wb") as f:
+            columns[name].tofile(f)
+    with open(os.path.join(tmp_path, "offsets.bin"), "wb") as f:
+        _offsets(columns["contact"], n_contacts).tofile(f)
+    os.replace(tmp_path, path)
+    return len(columns["ts"])
+
+
+def write_index(path, contacts, watermark, segments, rows, unresolved=()):
+    """Atomically replace index.json; readers see either the old or the new segment list."""
+    tmp_path = os.path.join(path, "index.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "rows": rows,
+            "watermark": watermark,
+            "columns": {name: {"typecode": typecode, "dtype": _dtype(typecode)} for name, typecode in COLUMNS},
+            "contacts": contacts,
+            "unresolved": sorted(unresolved),
+            "segments": segments,
+        }, f, indent=1)
+    os.replace(tmp_path, os.path.join(path, "index.json"))
+
+
+def _next_segment(segments):
+    return f"{max((int(s) for s in segments), default=-1) + 1:05d}"
+
+
+def compact(path=ARCHIVE_DIR):
+    """Merge every segment into one. Readers that still have the old files mapped keep
+    them until they close."""
+    archive = Archive(path)
+    old_segments = archive.index["segments"]
+    segment = _next_segment(old_segments)
+    rows = write_segment(archive.columns(), len(archive.contacts), os.path.join(path, segment))
+    write_index(path, archive.contacts, archive.watermark, [segment], rows, archive.unresolved)
+    for name in old_segments:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def update_archive(rebuild=False, path=ARCHIVE_DIR):
+    """Build the archive, or append messages above its watermark as a new segment.
+    Returns (new rows, total rows)."""
+    old = None if rebuild or not os.path.exists(os.path.join(path, "index.json")) else Archive(path)
+    contacts = load_contacts()
+    contact_ids = dict(old.contact_ids) if old is not None else {}
+    unresolved = set(old.unresolved) if old is not None else set()
+
+    conn = sqlite3.connect(f"file:{IMESSAGE_DB}?mode=ro", uri=True)
+    # The watermark and the scan come from one snapshot, so no message is archived twice
+    conn.execute("BEGIN")
+    watermark = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+    after = old.watermark if old is not None else 0
+    if watermark <= after:
+        conn.close()
+        return 0, len(old) if old is not None else 0
+    columns = extract(conn, contacts, after, contact_ids, unresolved)
+    conn.close()
+    names = sorted(contact_ids, key=contact_ids.get)
+
+    if old is None:
+        # Built in a temp directory and swapped in
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        added = write_segment(columns, len(names), os.path.join(tmp_path, "00000"))
+        write_index(tmp_path, names, watermark, ["00000"], added, unresolved)
+        old_path = path + ".old"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return added, added
+
+    segments = old.index["segments"]
+    segment = _next_segment(segments)
+    added = write_segment(columns, len(names), os.path.join(path, segment))
+    total = old.index["rows"] + added
+    write_index(path, names, watermark, segments + [segment], total, unresolved)
+    if len(segments) + 1 > MAX_SEGMENTS:
+        compact(path)
+    return added, total
+
+
+def _check(path=ARCHIVE_DIR):
+    """Compare the archive with a fresh extraction from chat.db, then time a year of counts."""
+    archive = Archive(path)
+    conn = sqlite3.connect(f"file:{IMESSAGE_DB}?mode=ro", uri=True)
+    conn.execute("BEGIN")
+    if conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0] != archive.watermark:
+        print("  chat.db has messages past the watermark; run python3 message_archive.py first")
+        return
+    contact_ids = dict(archive.contact_ids)
+    contacts = load_contacts()
+    started = time.perf_counter()
+    fresh = extract(conn, contacts, 0, contact_ids)
+    sql_seconds = time.perf_counter() - started
+    conn.close()
+
+    # Contact ids of a fresh extraction follow first appearance, so compare by name
+    def by_name(columns, names):
+        return sorted(
+            (names[c], *row)
+            for c, *row in zip(columns["contact"], *(columns[name] for name, _ in COLUMNS if name != "contact"))
+        )
+
+    fresh_names = sorted(contact_ids, key=contact_ids.get)
+    archived = archive.columns()
+    assert by_name(archived, archive.contacts) == by_name(fresh, fresh_names), "archive differs from chat.db"
+    print(f"  {len(archive):,} messages, {len(archive.contacts):,} contacts match chat.db")
+
+    last = max((max(segment.ts) for segment in archive.segments if len(segment)), default=0)
+    year_ns = 365 * 24 * 3600 * 1_000_000_000
+    started = time.perf_counter()
+    counts = archive.counts(last - year_ns, last + 1)
+    mmap_seconds = time.perf_counter() - started
+    print(f"  last 365 days, sent/received for {len(counts):,} contacts: "
+          f"{mmap_seconds * 1000:.1f} ms from the archive, {sql_seconds * 1000:.0f} ms to re-read chat.db")
+
+
+def _print_counts(days=None, top=20, path=ARCHIVE_DIR):
+    """Top contacts by messages, all time or over the archive's last `days` days."""
+    archive = Archive(path)
+    start_ns = None
+    if days:
+        last = max((max(segment.ts) for segment in archive.segments if len(segment)), default=0)
+        start_ns = last - days * 24 * 3600 * 1_000_000_000
+    counts = archive.counts(start_ns)
+    ranked = sorted(counts.items(), key=lambda item: -sum(item[1]))[:top]
+    span = f"last {days} days" if days else "all time"
+    print(f"  {len(archive):,} messages in {len(archive.segments)} segments; top {len(ranked)}, {span}:")
+    for name, (sent, received) in ranked:
+        print(f"  {name or '(group, from me)':<30} {sent + received:>8,}  sent {sent:>7,}  received {received:>7,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the columnar message archive")
+    parser.add_argument("--rebuild", action="store_true", help="rewrite from scratch instead of appending")
+    parser.add_argument("--check", action="store_true", help="compare with chat.db and time a range query")
+    parser.add_argument("--counts", action="store_true", help="print top contacts from the archive (no chat.db)")
+    parser.add_argument("--days", type=int, default=None, help="with --counts, only the last N days")
+    args = parser.parse_args()
+
+    if args.counts:
+        _print_counts(args.days)
+        return
+
+    if args.check:
+        print(f"Checking {ARCHIVE_DIR}/...")
+        _check()
+        return
+
+    print(f"Writing {ARCHIVE_DIR}/...")
+    started = time.perf_counter()
+    added, total = update_archive(rebuild=args.rebuild)
+    print(f"  {added:,} new messages, {total:,} total ({time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""attributedBody decoding shared by imessage_wrapped.py, combined_wrapped.py and people_wrapped.py.
+
+On recent macOS message.text is often NULL and the text only lives in the attributedBody
+NSAttributedString typedstream blob. update_text_cache() decodes new blobs once into
+TEXT_CACHE_DB, keyed by message ROWID; attach_text_cache() exposes it to queries as tc.decoded.
+
+The cache is a plain-text copy of those messages. imessage_wrapped.py and combined_wrapped.py
+keep it in the working directory, people_wrapped.py in people_wrapped_data/. It is created
+readable by the owner only and can be deleted at any time; the next run rebuilds it.
+"""
+
+import itertools
+import os
+import re
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+IMESSAGE_DB = os.path.expanduser("~/Library/Messages/chat.db")
+TEXT_CACHE_DB = "message_text_cache.db"
+TEXT_CACHE_VERSION = 1
+TEXT_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS decoded (message_id INTEGER PRIMARY KEY, text TEXT);
+"""
+# Backlogs of at least DECODE_INLINE_BELOW blobs are decoded on a process pool
+DECODE_CHUNK = 10_000
+DECODE_INLINE_BELOW = 50_000
+# Chunks submitted to the pool per worker before waiting on the oldest one
+DECODE_IN_FLIGHT = 2
+# The string payload follows the NSString class and the '+' (length-prefixed bytes) type tag
+TYPEDSTREAM_STRING = re.compile(rb'NSString.{1,8}?\x84\x01\+', re.DOTALL)
+
+
+def decode_attributed_body(data):
+    """Plain text of an attributedBody typedstream blob (bytes or memoryview), or None.
+    The length prefix is a typedstream integer: one byte below 0x80, or 0x81/0x82
+    followed by a 2/4-byte little-endian length. Decodes straight from the buffer."""
+    if not data:
+        return None
+    view = memoryview(data)
+    match = TYPEDSTREAM_STRING.search(view)
+    if not match or match.end() >= len(view):
+        return None
+    i = match.end()
+    tag = view[i]
+    if tag < 0x80:
+        length, i = tag, i + 1
+    elif tag == 0x81:
+        length, i = int.from_bytes(view[i + 1:i + 3], 'little'), i + 3
+    elif tag == 0x82:
+        length, i = int.from_bytes(view[i + 1:i + 5], 'little'), i + 5
+    else:
+        return None
+    if i + length > len(view):
+        return None
+    return str(view[i:i + length], 'utf-8', 'ignore')
+
+
+def decode_chunk(chunk):
+    """Decode a list of (rowid, blob) pairs. Top-level so pool workers can import it."""
+    return [(rowid, decode_attributed_body(body)) for rowid, body in chunk]
+
+
+def decode_chunks(cursor, workers=None):
+    """Yield decoded (rowid, text) chunks from a (rowid, blob) cursor, in cursor order.
+    Chunks of DECODE_CHUNK rows are fetched as they are needed. Large backlogs fan out over
+    a process pool with at most DECODE_IN_FLIGHT chunks per worker outstanding; fewer than
+    DECODE_INLINE_BELOW rows (the usual incremental run) or a single worker decode inline.
+    workers defaults to one per CPU."""
+    workers = workers or os.cpu_count() or 1
+    chunks = iter(lambda: cursor.fetchmany(DECODE_CHUNK), [])
+    head, rows = [], 0
+    for chunk in chunks:
+        head.append(chunk)
+        rows += len(chunk)
+        if rows >= DECODE_INLINE_BELOW:
+            break
+    chunks = itertools.chain(head, chunks)
+    if rows < DECODE_INLINE_BELOW or workers == 1:
+        yield from map(decode_chunk, chunks)
+        return
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in chunks:
+                pending.append([chunk, None])
+                pending[-1][1] = pool.submit(decode_chunk, chunk)
+                if len(pending) >= DECODE_IN_FLIGHT * workers:
+                    yield pending[0][1].result()
+                    pending.popleft()
+            while pending:
+                yield pending[0][1].result()
+                pending.popleft()
+    except (OSError, BrokenProcessPool):
+        # Worker processes unavailable (sandbox, frozen interpreter): finish inline from
+        # the chunks still outstanding, then the rest of the cursor
+        yield from (decode_chunk(chunk) for chunk, _ in pending)
+        yield from map(decode_chunk, chunks)
+
+
+def open_text_cache(path=TEXT_CACHE_DB):
+    """Connect to the cache at path, creating it (and its directory) with mode 0600."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    os.chmod(path, 0o600)
+    return sqlite3.connect(path)
+
+
+def update_text_cache(workers=None, db=IMESSAGE_DB, path=TEXT_CACHE_DB):
+    """Decode attributedBody for text-less messages above the cache's ROWID watermark.
+    Each blob is decoded once across runs. Returns the number decoded."""
+    cache = open_text_cache(path)
+    cache.executescript(TEXT_CACHE_SCHEMA)
+    meta = dict(cache.execute("SELECT key, value FROM meta"))
+    if meta.get('version') != TEXT_CACHE_VERSION:
+        cache.execute("DELETE FROM decoded")
+        meta = {}
+    conn = sqlite3.connect(db)
+    top = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+    rows = conn.execute("""
+        SELECT ROWID, attributedBody FROM message
+        WHERE ROWID > ? AND ROWID <= ? AND (text IS NULL OR text = '') AND attributedBody IS NOT NULL
+        ORDER BY ROWID
+    """, (meta.get('watermark', 0), top))
+    count = 0
+    for decoded in decode_chunks(rows, workers):
+        cache.executemany("INSERT OR REPLACE INTO decoded VALUES (?, ?)", decoded)
+        count += len(decoded)
+    conn.close()
+    cache.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [('version', TEXT_CACHE_VERSION), ('watermark', top)])
+    cache.commit()
+    cache.close()
+    return count
+
+
+def attach_text_cache(conn, path=TEXT_CACHE_DB):
+    """Attach the decoded-text cache at path as schema tc (an empty in-memory one if it is missing)."""
+    if os.path.exists(path):
+        try:
+            conn.execute("ATTACH DATABASE ? AS tc", (path,))
+            conn.execute("SELECT 1 FROM tc.decoded LIMIT 1")
+            return
+        except sqlite3.Error:
+            try:
+                conn.execute("DETACH DATABASE tc")
+            except sqlite3.Error:
+                pass
+    conn.execute("ATTACH DATABASE ':memory:' AS tc")
+    conn.execute("CREATE TABLE tc.decoded (message_id INTEGER PRIMARY KEY, text TEXT)")
@@ -4,7 +4,7 @@ People Wrapped 2025 - AI-powered analysis of your top messaging relationships.
 
 ## Quick Start
 
-1. Download this file
+1. Download this file (and optionally message_text.py next to it, for faster text decoding)
 2. Start Claude Code with: `claude --dangerously-skip-permissions`
 3. Say: "Run python3 people_wrapped.py"
 4. Wait ~10 minutes for extraction + AI summaries
@@ -35,13 +35,22 @@ The "trick" is that Claude Code itself IS the AI - no external API call needed.
 ## FOR CLAUDE CODE
 
 When this script prints "CLAUDE CODE: Please generate summaries...", YOU are the AI.
-Read each JSON file and write a summary directly. Do not write Python scripts or call
-any API - you ARE the language model, just read the messages and write the summary.
+Read each contact's messages and write a summary directly. Do not write Python scripts
+or call any API - you ARE the language model, just read the messages and write the summary.
 
+Each contact has two files in people_wrapped_data/: NN_Name.ndjson holds the messages,
+one JSON object per line, and NN_Name.json is a small header with the contact's stats.
 For each contact:
-1. Read the JSON file (use limit=2000 for large files)
+1. Read the .ndjson messages file (use limit=2000 for large files; if it was extracted
+   with --gzip it is NN_Name.ndjson.gz - read it with `gzip -dc`)
 2. Write a personal summary based on the messages you see
-3. Save it back to the JSON with the summary field added
+3. Save it into the NN_Name.json header as a "summary" field
+If the header has a "digest_file" (extracted with --digest), read that instead of the full
+messages: a sample spread across the year with a little context around each picked message,
+where {"skipped": N} lines mark the messages left out. It already fits, no limit needed.
+If a header has "summary_stale": true, new messages arrived after its summary was written:
+update the summary with them and remove the "summary_stale" field.
+(manifest.json, photos/ and the NN_Name.state files in the same folder are kept up to date by the script - don't edit them)
 
 ### CRITICAL: What makes a GOOD summary vs BAD summary
 
@@ -73,7 +82,10 @@ Use /model sonnet for larger context. After all summaries: python3 people_wrappe
 ---
 """
 
-import sqlite3, os, sys, re, subprocess, argparse, glob, threading, time, base64, json
+import sqlite3, os, sys, re, subprocess, argparse, glob, threading, time, base64, json, heapq, gzip, hashlib, itertools, random, zlib, operator, tempfile
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -86,8 +98,108 @@ WHATSAPP_PATHS = [
     os.path.expanduser("~/Library/Containers/desktop.WhatsApp/Data/Library/Application Support/WhatsApp/ChatStorage.sqlite"),
 ]
 
+# Decoded attributedBody text. message_text.py (next to this script) decodes large backlogs on
+# a process pool; downloaded on its own, this script uses the single-process copy below. Both
+# read and write the same cache file and schema, so keep TEXT_CACHE_VERSION in sync.
+try:
+    from message_text import TEXT_CACHE_DB, attach_text_cache, update_text_cache
+except ImportError:
+    TEXT_CACHE_DB = "message_text_cache.db"
+    TEXT_CACHE_VERSION = 1
+
+    def decode_attributed_body(data):
+        """Plain text of an attributedBody typedstream blob, or None: the length-prefixed
+        string after the NSString class and the '+' type tag."""
+        start = data.find(b'NSString') if data else -1
+        while start >= 0:
+            tag = data.find(b'\x84\x01+', start + 9, start + 19)
+            if tag >= 0:
+                i = tag + 3
+                if i >= len(data):
+                    return None
+                if data[i] < 0x80:
+                    length, i = data[i], i + 1
+                elif data[i] == 0x81:
+                    length, i = int.from_bytes(data[i + 1:i + 3], 'little'), i + 3
+                elif data[i] == 0x82:
+                    length, i = int.from_bytes(data[i + 1:i + 5], 'little'), i + 5
+                else:
+                    return None
+                if i + length > len(data):
+                    return None
+                return data[i:i + length].decode('utf-8', 'ignore')
+            start = data.find(b'NSString', start + 1)
+        return None
+
+    def update_text_cache(workers=None, db=IMESSAGE_DB, path=TEXT_CACHE_DB):
+        """Decode attributedBody for text-less messages above the cache's ROWID watermark
+        into the owner-only cache at path. Returns the number decoded."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+        cache = sqlite3.connect(path)
+        cache.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS decoded (message_id INTEGER PRIMARY KEY, text TEXT);
+        """)
+        meta = dict(cache.execute("SELECT key, value FROM meta"))
+        if meta.get('version') != TEXT_CACHE_VERSION:
+            cache.execute("DELETE FROM decoded")
+            meta = {}
+        conn = sqlite3.connect(db)
+        top = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+        rows = conn.execute("""
+            SELECT ROWID, attributedBody FROM message
+            WHERE ROWID > ? AND ROWID <= ? AND (text IS NULL OR text = '') AND attributedBody IS NOT NULL
+            ORDER BY ROWID
+        """, (meta.get('watermark', 0), top))
+        count = cache.executemany("INSERT OR REPLACE INTO decoded VALUES (?, ?)",
+                                  ((rowid, decode_attributed_body(body)) for rowid, body in rows)).rowcount
+        conn.close()
+        cache.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [('version', TEXT_CACHE_VERSION), ('watermark', top)])
+        cache.commit()
+        cache.close()
+        return max(count, 0)
+
+    def attach_text_cache(conn, path=TEXT_CACHE_DB):
+        """Attach the decoded-text cache at path as schema tc (an empty in-memory one if it is missing)."""
+        if os.path.exists(path):
+            try:
+                conn.execute("ATTACH DATABASE ? AS tc", (path,))
+                conn.execute("SELECT 1 FROM tc.decoded LIMIT 1")
+                return
+            except sqlite3.Error:
+                try:
+                    conn.execute("DETACH DATABASE tc")
+                except sqlite3.Error:
+                    pass
+        conn.execute("ATTACH DATABASE ':memory:' AS tc")
+        conn.execute("CREATE TABLE tc.decoded (message_id INTEGER PRIMARY KEY, text TEXT)")
+
 WHATSAPP_DB = None
+PHOTO_INDEX = None         # See photo_index()
+PHOTO_WORKERS = 8
 DATA_DIR = "people_wrapped_data"
+# Decoded attributedBody text (see message_text.py); delete it to drop the plain-text copy
+TEXT_CACHE_PATH = os.path.join(DATA_DIR, TEXT_CACHE_DB)
+# Per contact: NN_Name.json (header, summary) and NN_Name.ndjson[.gz] (one message per line)
+# Contact photos, once per distinct picture: photos/<photo_hash>.jpg|.png (see save_photo())
+PHOTOS_DIR = os.path.join(DATA_DIR, "photos")
+PHOTO_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg'}
+MESSAGES_EXT = ".ndjson"
+# Optional NN_Name.digest.ndjson: a time-spread sample of the messages that fits --digest bytes
+DIGEST_EXT = ".digest.ndjson"
+DIGEST_CONTEXT = 2        # Messages kept on either side of a sampled one
+DIGEST_MIN_LINE = 48      # Smallest NDJSON line, bounds how many windows a month can need
+# NN_Name.state (JSON; not .json so header globs skip it): what appending to the messages
+# file needs, so new messages are folded in without re-reading it (see save_state())
+STATE_EXT = ".state"
+# Suffix for files moved aside while contacts change rank (see restore_moving())
+MOVING_EXT = ".moving"
+# Index of all contacts, read by status/summarize/run instead of the per-contact files
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
 
 class Spinner:
     """Animated terminal spinner for long operations"""
@@ -124,31 +236,6 @@ class Spinner:
 # Cocoa offset for timestamp conversion
 COCOA_OFFSET = 978307200
 
-def extract_text_from_attributed_body(data):
-    """Extract plain text from iMessage attributedBody blob."""
-    if not data:
-        return None
-    try:
-        idx = data.find(b'NSString')
-        if idx != -1:
-            match = re.search(b'\\x95\\x84\\x01\\+.(.*?)\\x86', data[idx:], re.DOTALL)
-            if match:
-                text = match.group(1)
-                try:
-                    return text.decode('utf-8', errors='ignore').strip()
-                except:
-                    pass
-            match = re.search(b'\\x01\\+.(.*?)(?:\\x86|\\x00\\x00)', data[idx:], re.DOTALL)
-            if match:
-                text = match.group(1)
-                try:
-                    return text.decode('utf-8', errors='ignore').strip()
-                except:
-                    pass
-    except:
-        pass
-    return None
-
 def get_year_timestamps(year):
     """Get start/end timestamps for a year in both iMessage and WhatsApp formats."""
     year = int(year)
@@ -173,9 +260,16 @@ def get_year_timestamps(year):
         'end_whatsapp': end_whatsapp,
     }
 
+# bytes.translate deletion table: every byte except ASCII 0-9
+NON_DIGITS = bytes(b for b in range(256) if not 48 <= b <= 57)
+
+def digits_only(value):
+    """Strip everything but digits (translate table, no per-call regex)."""
+    return str(value).encode('utf-8', 'ignore').translate(None, NON_DIGITS).decode('ascii')
+
 def normalize_phone(phone):
     if not phone: return None
-    digits = re.sub(r'\D', '', str(phone))
+    digits = digits_only(phone)
     if len(digits) == 11 and digits.startswith('1'):
         digits = digits[1:]
     elif len(digits) > 10:
@@ -200,7 +294,7 @@ def extract_imessage_contacts():
             for owner, phone in conn.execute("SELECT ZOWNER, ZFULLNUMBER FROM ZABCDPHONENUMBER WHERE ZFULLNUMBER IS NOT NULL"):
                 if owner in people:
                     name = people[owner]
-                    digits = re.sub(r'\D', '', str(phone))
+                    digits = digits_only(phone)
                     if digits:
                         contacts[digits] = name
                         contact_record_ids[digits] = owner
@@ -242,40 +336,90 @@ def extract_whatsapp_contacts():
         pass
     return contacts
 
-def get_contact_photo(record_id):
-    """Get contact photo as base64 string from AddressBook."""
-    if not record_id:
+def photo_index():
+    """{record id: image path} for every AddressBook contact photo. The Images directories
+    are scanned once per run; Sources/*/Images win over the top-level Images."""
+    global PHOTO_INDEX
+    if PHOTO_INDEX is None:
+        PHOTO_INDEX = {}
+        image_dirs = sorted(glob.glob(os.path.join(ADDRESSBOOK_DIR, "Sources", "*", "Images")))
+        for image_dir in image_dirs + [os.path.join(ADDRESSBOOK_DIR, "Images")]:
+            try:
+                with os.scandir(image_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            PHOTO_INDEX.setdefault(entry.name, entry.path)
+            except OSError:
+                pass
+    return PHOTO_INDEX
+
+def downscale_photo(data, size):
+    """Shrink an image to at most size pixels on its longest side with macOS `sips`.
+    Returns the original bytes if sips is unavailable or the result isn't smaller."""
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = os.path.join(tmp, 'photo'), os.path.join(tmp, 'thumb.jpg')
+        with open(src, 'wb') as f:
+            f.write(data)
+        try:
+            subprocess.run(['sips', '-Z', str(size), '-s', 'format', 'jpeg', src, '--out', dst],
+                           capture_output=True, check=True)
+            with open(dst, 'rb') as f:
+                thumb = f.read()
+        except (OSError, subprocess.CalledProcessError):
+            return data
+    return thumb if len(thumb) < len(data) else data
+
+def get_contact_photo(record_id, size=None):
+    """Get contact photo bytes from AddressBook (downscaled to size, if given), or None."""
+    path = photo_index().get(str(record_id)) if record_id else None
+    if not path:
         return None
-
-    search_patterns = [
-        os.path.join(ADDRESSBOOK_DIR, "Sources", "*", "Images", f"{record_id}"),
-        os.path.join(ADDRESSBOOK_DIR, "Images", f"{record_id}"),
-    ]
-
-    for pattern in search_patterns:
-        matches = glob.glob(pattern)
-        for path in matches:
-            if os.path.isfile(path):
-                try:
-                    with open(path, 'rb') as f:
-                        data = f.read()
-                        if data[:8] == b'\x89PNG\r\n\x1a\n':
-                            mime = 'image/png'
-                        elif data[:2] == b'\xff\xd8':
-                            mime = 'image/jpeg'
-                        else:
-                            mime = 'image/jpeg'
-                        return f"data:{mime};base64,{base64.b64encode(data).decode()}"
-                except:
-                    pass
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if size:
+        data = downscale_photo(data, size)
+    return data
+
+def save_photo(data):
+    """Store photo bytes under PHOTOS_DIR (once per distinct picture). Returns its photo_hash."""
+    photo_hash = hashlib.sha1(data).hexdigest()
+    ext = '.png' if data[:8] == b'\x89PNG\r\n\x1a\n' else '.jpg'
+    path = os.path.join(PHOTOS_DIR, photo_hash + ext)
+    if not os.path.exists(path):
+        os.makedirs(PHOTOS_DIR, exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+    return photo_hash
+
+def load_photo(photo_hash):
+    """Data URI of a photo saved by save_photo(), or None if it is missing."""
+    for ext, mime in PHOTO_TYPES.items():
+        try:
+            with open(os.path.join(PHOTOS_DIR, photo_hash + ext), 'rb') as f:
+                return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+        except OSError:
+            continue
     return None
 
+def load_contact_photos(record_ids, size=None):
+    """Read the photos of many contacts in parallel. Returns {record id: bytes or None};
+    records sharing the same picture share one object."""
+    record_ids = list(dict.fromkeys(r for r in record_ids if r))
+    with ThreadPoolExecutor(max_workers=PHOTO_WORKERS) as pool:
+        photos = dict(zip(record_ids, pool.map(lambda r: get_contact_photo(r, size), record_ids)))
+    by_content = {}
+    return {r: by_content.setdefault(photo, photo) if photo else None for r, photo in photos.items()}
+
 def get_name_imessage(handle, contacts):
     if '@' in handle:
         lookup = handle.lower().strip()
         if lookup in contacts: return contacts[lookup]
         return handle.split('@')[0]
-    digits = re.sub(r'\D', '', str(handle))
+    digits = digits_only(handle)
     if digits in contacts: return contacts[digits]
     if len(digits) == 11 and digits.startswith('1'):
         if digits[1:] in contacts: return contacts[digits[1:]]
@@ -295,7 +439,7 @@ def get_record_id_for_handle(handle, contact_record_ids):
         if lookup in contact_record_ids:
             return contact_record_ids[lookup]
         return None
-    digits = re.sub(r'\D', '', str(handle))
+    digits = digits_only(handle)
     if digits in contact_record_ids:
         return contact_record_ids[digits]
     if len(digits) == 11 and digits.startswith('1'):
@@ -364,18 +508,7 @@ def check_access():
 
 def count_addressbook_photos():
     """Count available contact photos."""
-    count = 0
-    search_patterns = [
-        os.path.join(ADDRESSBOOK_DIR, "Sources", "*", "Images", "*"),
-        os.path.join(ADDRESSBOOK_DIR, "Images", "*"),
-    ]
-    seen = set()
-    for pattern in search_patterns:
-        for path in glob.glob(pattern):
-            if os.path.isfile(path) and path not in seen:
-                seen.add(path)
-                count += 1
-    return count
+    return len(photo_index())
 
 def q_imessage(sql):
     conn = sqlite3.connect(IMESSAGE_DB)
@@ -389,7 +522,7 @@ def q_whatsapp(sql):
     conn.close()
     return r
 
-def get_top_contacts_combined(timestamps, top_n, has_imessage, has_whatsapp, imessage_contacts, whatsapp_contacts, contact_record_ids):
+def get_top_contacts_combined(timestamps, top_n, has_imessage, has_whatsapp, imessage_contacts, whatsapp_contacts, contact_record_ids, photo_size=None):
     """Get top N contacts by message count across both platforms."""
     contacts_data = {}
     phone_to_name = {}
@@ -503,121 +636,499 @@ def get_top_contacts_combined(timestamps, top_n, has_imessage, has_whatsapp, ime
 
     sorted_contacts = sorted(contacts_data.values(), key=lambda x: -x['total'])[:top_n]
 
+    photos = load_contact_photos([c['record_id'] for c in sorted_contacts], photo_size)
     for contact in sorted_contacts:
-        contact['photo'] = get_contact_photo(contact['record_id'])
+        contact['photo'] = photos.get(contact['record_id'])
 
     return sorted_contacts
 
-def get_messages_for_contact(contact, timestamps, has_imessage, has_whatsapp):
-    """Get all messages for a contact, pre-filtered for analysis."""
-    messages = []
+def resolve_target_chats(contacts, has_imessage, has_whatsapp):
+    """Map the 1:1 chats of every selected contact to its index, one query per platform.
+    Returns ({iMessage chat ROWID: index}, {WhatsApp session Z_PK: index})."""
+    im_chats, wa_sessions = {}, {}
+
+    handles = {c['handles']['imessage']: i for i, c in enumerate(contacts) if 'imessage' in c['handles']}
+    if has_imessage and handles:
+        rows = q_imessage("""
+            SELECT chj.chat_id, MIN(h.id)
+            FROM chat_handle_join chj
+            JOIN handle h ON chj.handle_id = h.ROWID
+            GROUP BY chj.chat_id
+            HAVING COUNT(*) = 1
+        """)
+        for chat_id, handle in rows:
+            if handle in handles:
+                im_chats[chat_id] = handles[handle]
+
+    jids = {c['handles']['whatsapp']: i for i, c in enumerate(contacts) if 'whatsapp' in c['handles']}
+    if has_whatsapp and jids:
+        for session, jid in q_whatsapp("SELECT Z_PK, ZCONTACTJID FROM ZWACHATSESSION WHERE ZSESSIONTYPE = 0"):
+            if jid in jids:
+                wa_sessions[session] = jids[jid]
+
+    return im_chats, wa_sessions
+
+class ContactMessages:
+    """One contact's messages. Each chat is a run of (key, msg) ordered by date, either a list
+    or a live iterator over the query; messages() merges the runs by (ts, platform, date) key
+    (iMessage before WhatsApp on ties) and filters. last_key is the key of the last message
+    merged so far."""
+    def __init__(self, runs=()):
+        self.runs = []
+        self.heads = []
+        self.last_key = None
+        for run in runs:
+            run = iter(run)
+            head = next(run, None)
+            if head is not None:
+                self.runs.append(itertools.chain([head], run))
+                self.heads.append(head[0])
+
+    def first_key(self):
+        """Key of the earliest message, or None if there are none."""
+        return min(self.heads, default=None)
+
+    def messages(self, prev_text=None, near_dups=None):
+        """Iterate the merged, filtered messages. prev_text continues the repeat check
+        from messages written earlier; near_dups is an optional NearDuplicates."""
+        merged = heapq.merge(*self.runs, key=lambda item: item[0])
+        return filter_messages(self._track(merged), prev_text, near_dups)
+
+    def _track(self, merged):
+        for key, msg in merged:
+            self.last_key = key
+            yield msg
+
+# Cheap message filters, applied in SQL to the stored `text`: messages under 3 characters,
+# media placeholders and bodies that are only attachment markers (U+FFFC) or whitespace.
+# Tapbacks are excluded by associated_message_type.
+# filter_messages() repeats the length and placeholder checks on the stripped text and
+# does what needs Python: bare links, repeats and near-duplicates.
+PLACEHOLDER_TEXTS = ('Image', 'Attachment', 'Photo', 'Video', 'Audio', 'Sticker')
+KEEP_TEXT_SQL = (
+    "LENGTH(text) >= 3"
+    " AND text NOT IN (%s)" % ', '.join(f"'{t}'" for t in PLACEHOLDER_TEXTS) +
+    " AND (unicode(text) NOT IN (32, 9, 10, 13, 65532) OR TRIM(text, char(32, 9, 10, 13, 65532)) != '')"
+)
+BARE_LINK = re.compile(r'https?://\S+')
+
+# Near-duplicates: templates, forwarded chains and pasted blocks that differ by a few characters
+NEAR_DUP_THRESHOLD = 0.8    # Jaccard similarity of character shingles counted as a repeat
+NEAR_DUP_MIN_CHARS = 40     # Shorter messages are left to the exact repeat check
+SHINGLE_CHARS = 5
+MINHASH_BITS = 6            # 2**6 = 64 signature slots
+
+def minhash(text):
+    """One-permutation MinHash of the text's 5-character shingles (case and spacing ignored).
+    Each shingle is hashed once (crc32, then a multiplicative mix); the top bits pick its
+    slot and each slot keeps its smallest hash. Empty slots borrow from the next filled one
+    (rotation densification), so short texts still get a full signature."""
+    data = ' '.join(text.lower().split()).encode('utf-8')
+    hashes = map(zlib.crc32, [data[i:i + SHINGLE_CHARS] for i in range(max(1, len(data) - SHINGLE_CHARS + 1))])
+    mixed = sorted(map(operator.and_, map(operator.mul, hashes, itertools.repeat(0x9E3779B1)),
+                       itertools.repeat(0xFFFFFFFF)), reverse=True)
+    # Largest first, so each slot ends up holding its smallest hash
+    slots = dict(zip(map(operator.rshift, mixed, itertools.repeat(32 - MINHASH_BITS)), mixed))
+    n = 1 << MINHASH_BITS
+    sig = [0] * n
+    nearest = step = 0
+    for slot in range(2 * n - 1, -1, -1):
+        if slot % n in slots:
+            nearest, step = slots[slot % n], 0
+        else:
+            step += 1
+        if slot < n:
+            sig[slot] = nearest + (step << 32)
+    return tuple(sig)
+
+class NearDuplicates:
+    """Streaming near-duplicate detector for one contact: MinHash signatures of the kept
+    messages, indexed by LSH bands so each message is only compared with likely matches.
+    Memory grows with the kept long messages, not with everything seen."""
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        # Most rows per band whose LSH threshold (1/bands)^(1/rows) stays at or below ours,
+        # so candidates are found generously and the signature check decides
+        n = 1 << MINHASH_BITS
+        self.rows = max(r for r in (1, 2, 4, 8, 16, 32, 64) if (r / n) ** (1 / r) <= threshold or r == 1)
+        self.buckets = {}
+        self.kept = []
+        self.dropped = 0
+        self.dropped_bytes = 0
+
+    def seen(self, text):
+        """True if text nearly repeats a kept message; otherwise it is kept."""
+        if len(text) < NEAR_DUP_MIN_CHARS:
+            return False
+        sig = minhash(text)
+        n = len(sig)
+        keys = self.band_keys(sig)
+        checked = set()
+        for key in keys:
+            for other in self.buckets.get(key, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if sum(map(operator.eq, sig, self.kept[other])) >= self.threshold * n:
+                    return True
+        self.keep(sig, keys)
+        return False
+
+    def band_keys(self, sig):
+        return [(band, sig[band:band + self.rows]) for band in range(0, len(sig), self.rows)]
+
+    def keep(self, sig, keys):
+        for key in keys:
+            self.buckets.setdefault(key, []).append(len(self.kept))
+        self.kept.append(sig)
+
+    def drop(self, msg):
+        """Count a dropped message towards the reduction report."""
+        self.dropped += 1
+        self.dropped_bytes += len(json.dumps(msg, ensure_ascii=False).encode('utf-8')) + 1
+
+    def state(self):
+        """The kept signatures, packed as base64 uint64s for save_state()."""
+        return base64.b64encode(array('Q', itertools.chain.from_iterable(self.kept)).tobytes()).decode('ascii')
+
+    def restore(self, packed):
+        """Re-index signatures from state(), as if their messages had just been seen."""
+        flat = array('Q', base64.b64decode(packed))
+        n = 1 << MINHASH_BITS
+        for start in range(0, len(flat), n):
+            sig = tuple(flat[start:start + n])
+            self.keep(sig, self.band_keys(sig))
+
+def handles_key(handles):
+    """Identity of a contact across extractions."""
+    return json.dumps(handles, sort_keys=True)
+
+def current_watermarks(has_imessage, has_whatsapp):
+    """Highest message ROWID (iMessage) and Z_PK (WhatsApp) right now."""
+    return {
+        'imessage': q_imessage("SELECT COALESCE(MAX(ROWID), 0) FROM message")[0][0] if has_imessage else 0,
+        'whatsapp': q_whatsapp("SELECT COALESCE(MAX(Z_PK), 0) FROM ZWAMESSAGE")[0][0] if has_whatsapp else 0,
+    }
 
+def id_bounds(column, after, upto, platform):
+    """SQL condition after[platform] < column <= upto[platform] (a missing side is open)."""
+    bounds = []
+    if after and after.get(platform) is not None:
+        bounds.append(f"AND {column} > {int(after[platform])}")
+    if upto and upto.get(platform) is not None:
+        bounds.append(f"AND {column} <= {int(upto[platform])}")
+    return ' '.join(bounds)
+
+def chat_runs(rows, platform, rank):
+    """Split (chat, text, is_from_me, date, ts) rows ordered by chat into (chat, run) pairs.
+    Each run lazily yields ((ts, rank, date), msg) and is only valid until the next pair."""
+    for chat, group in itertools.groupby(rows, key=operator.itemgetter(0)):
+        yield chat, (((ts, rank, date), {
+            'text': text,
+            'from_me': bool(is_from_me),
+            'ts': ts,
+            'platform': platform
+        }) for _, text, is_from_me, date, ts in group)
+
+def imessage_runs(chats, timestamps, after=None, upto=None):
+    """(chat_id, run) pairs for the given iMessage chats, see chat_runs()."""
+    chat_list = ','.join(str(int(c)) for c in sorted(chats))
     ts_start_im = timestamps['start_imessage']
     ts_end_im = timestamps['end_imessage']
+    # message_date bounds let each chat's (chat_id, message_date) index range-scan the year
+    ns_start = (ts_start_im - COCOA_OFFSET) * 1000000000
+    ns_end = (ts_end_im - COCOA_OFFSET + 1) * 1000000000
+    conn = sqlite3.connect(IMESSAGE_DB)
+    try:
+        attach_text_cache(conn, TEXT_CACHE_PATH)
+        rows = conn.execute(f"""
+            SELECT chat_id, text, is_from_me, date, ts FROM (
+                SELECT cmj.chat_id, cmj.message_date, COALESCE(NULLIF(m.text, ''), d.text) as text,
+                       m.is_from_me, m.date, (m.date/1000000000+{COCOA_OFFSET}) as ts
+                FROM chat_message_join cmj
+                JOIN message m ON m.ROWID = cmj.message_id
+                LEFT JOIN tc.decoded d ON d.message_id = m.ROWID
+                WHERE cmj.chat_id IN ({chat_list})
+                AND cmj.message_date >= {ns_start} AND cmj.message_date < {ns_end}
+                AND (m.date/1000000000+{COCOA_OFFSET}) BETWEEN {ts_start_im} AND {ts_end_im}
+                AND COALESCE(m.associated_message_type, 0) = 0
+                {id_bounds('cmj.message_id', after, upto, 'imessage')}
+            )
+            WHERE {KEEP_TEXT_SQL}
+            ORDER BY chat_id, message_date
+        """)
+        yield from chat_runs(rows, 'imessage', 0)
+    finally:
+        conn.close()
+
+def whatsapp_runs(sessions, timestamps, after=None, upto=None):
+    """(session Z_PK, run) pairs for the given WhatsApp chat sessions, see chat_runs()."""
+    session_list = ','.join(str(int(s)) for s in sorted(sessions))
     ts_start_wa = timestamps['start_whatsapp']
     ts_end_wa = timestamps['end_whatsapp']
-
-    one_on_one_cte = """
-        WITH chat_participants AS (
-            SELECT chat_id, COUNT(*) as participant_count
-            FROM chat_handle_join
-            GROUP BY chat_id
-        ),
-        one_on_one_messages AS (
-            SELECT m.ROWID as msg_id
-            FROM message m
-            JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
-            JOIN chat_participants cp ON cmj.chat_id = cp.chat_id
-            WHERE cp.participant_count = 1
-        )
-    """
-
-    if has_imessage and 'imessage' in contact['handles']:
-        handle = contact['handles']['imessage']
-        handle_escaped = handle.replace("'", "''")
-        chat_query = f"""
-            SELECT c.ROWID
-            FROM chat c
-            JOIN chat_handle_join chj ON c.ROWID = chj.chat_id
-            JOIN handle h ON chj.handle_id = h.ROWID
-            WHERE h.id = '{handle_escaped}'
-            GROUP BY c.ROWID
-            HAVING COUNT(*) = 1
-        """
-        rows = q_imessage(f"""
-            WITH target_chats AS ({chat_query})
-            SELECT m.text, m.attributedBody, m.is_from_me, (m.date/1000000000+{COCOA_OFFSET}) as ts
-            FROM message m
-            JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
-            WHERE cmj.chat_id IN (SELECT ROWID FROM target_chats)
-            AND (m.date/1000000000+{COCOA_OFFSET}) BETWEEN {ts_start_im} AND {ts_end_im}
-            AND (m.text IS NOT NULL OR m.attributedBody IS NOT NULL)
-            ORDER BY m.date
-        """)
-        for text, attributed_body, is_from_me, ts in rows:
-            msg_text = text
-            if not msg_text and attributed_body:
-                msg_text = extract_text_from_attributed_body(attributed_body)
-            if msg_text:
-                messages.append({
-                    'text': msg_text,
-                    'from_me': bool(is_from_me),
-                    'ts': ts,
-                    'platform': 'imessage'
-                })
-
-    if has_whatsapp and 'whatsapp' in contact['handles']:
-        jid = contact['handles']['whatsapp']
-        jid_escaped = jid.replace("'", "''")
-        wa_cte = f"""
-            WITH dm_sessions AS (
-                SELECT Z_PK FROM ZWACHATSESSION WHERE ZSESSIONTYPE = 0 AND ZCONTACTJID = '{jid_escaped}'
+    conn = sqlite3.connect(WHATSAPP_DB)
+    try:
+        rows = conn.execute(f"""
+            SELECT session, text, is_from_me, 0, ts FROM (
+                SELECT m.ZCHATSESSION as session, m.ZMESSAGEDATE, m.ZTEXT as text,
+                       m.ZISFROMME as is_from_me, (m.ZMESSAGEDATE+{COCOA_OFFSET}) as ts
+                FROM ZWAMESSAGE m
+                WHERE m.ZCHATSESSION IN ({session_list})
+                AND m.ZMESSAGEDATE BETWEEN {ts_start_wa} AND {ts_end_wa}
+                {id_bounds('m.Z_PK', after, upto, 'whatsapp')}
             )
-        """
-        rows = q_whatsapp(f"""{wa_cte}
-            SELECT m.ZTEXT, m.ZISFROMME, (m.ZMESSAGEDATE+{COCOA_OFFSET}) as ts
-            FROM ZWAMESSAGE m
-            WHERE m.ZCHATSESSION IN (SELECT Z_PK FROM dm_sessions)
-            AND m.ZMESSAGEDATE BETWEEN {ts_start_wa} AND {ts_end_wa}
-            AND m.ZTEXT IS NOT NULL
-            ORDER BY m.ZMESSAGEDATE
+            WHERE {KEEP_TEXT_SQL}
+            ORDER BY session, ZMESSAGEDATE
         """)
-        for text, is_from_me, ts in rows:
-            if text:
-                messages.append({
-                    'text': text,
-                    'from_me': bool(is_from_me),
-                    'ts': ts,
-                    'platform': 'whatsapp'
-                })
-
-    messages.sort(key=lambda x: x['ts'])
-
-    filtered = []
-    prev_text = None
-    for msg in messages:
-        text = msg['text'].strip()
+        yield from chat_runs(rows, 'whatsapp', 1)
+    finally:
+        conn.close()
 
-        if len(text) < 3:
-            continue
+def get_messages_for_contacts(contacts, timestamps, has_imessage, has_whatsapp, after=None, upto=None):
+    """Stream every selected contact's messages, pre-filtered for analysis.
+    All chats are resolved up front and read with one query per platform, ordered by
+    (chat, date). A contact is yielded as soon as its last chat starts: that chat streams
+    straight from the query, earlier chats of the contact are held until then.
+    after/upto are current_watermarks()-style dicts limiting the message ids read.
+    Yields (index into contacts, ContactMessages) once per contact; read a contact's
+    messages before asking for the next one."""
+    im_chats, wa_sessions = resolve_target_chats(contacts, has_imessage, has_whatsapp)
+    chats_left = [0] * len(contacts)
+    for i in itertools.chain(im_chats.values(), wa_sessions.values()):
+        chats_left[i] += 1
+    held = {}
+    waiting = set(range(len(contacts)))
+
+    sources = []
+    if im_chats:
+        sources.append((im_chats, imessage_runs(im_chats, timestamps, after, upto)))
+    if wa_sessions:
+        sources.append((wa_sessions, whatsapp_runs(wa_sessions, timestamps, after, upto)))
+    for chats, runs in sources:
+        for chat, run in runs:
+            i = chats[chat]
+            chats_left[i] -= 1
+            if chats_left[i]:
+                held.setdefault(i, []).append(list(run))
+            else:
+                waiting.discard(i)
+                yield i, ContactMessages(held.pop(i, []) + [run])
 
-        if text in ['￼', 'Image', 'Attachment', 'Photo', 'Video', 'Audio', 'Sticker']:
-            continue
+    # Contacts with chats that had nothing in range, or no chats at all
+    for i in sorted(waiting):
+        yield i, ContactMessages(held.pop(i, []))
 
-        if text.startswith(('Loved "', 'Liked "', 'Disliked "', 'Laughed at "', 'Emphasized "', 'Questioned "')):
+def filter_messages(messages, prev_text=None, near_dups=None):
+    """Drop short or placeholder text once stripped (KEEP_TEXT_SQL prefilters the raw column),
+    bare links, repeated messages and, with near_dups, messages close to an earlier one.
+    A generator, so messages can be written out as they pass."""
+    for msg in messages:
+        text = msg['text'].strip()
+        if len(text) < 3 or text in PLACEHOLDER_TEXTS:
             continue
 
-        if re.match(r'^https?://\S+$', text):
+        if BARE_LINK.fullmatch(text):
             continue
 
         if text == prev_text:
             continue
 
-        prev_text = text
         msg['text'] = text
-        filtered.append(msg)
+        if near_dups and near_dups.seen(text):
+            near_dups.drop(msg)
+            continue
 
-    return filtered
+        prev_text = text
+        yield msg
+
+def write_messages(path, messages, compress=False, append=False, digest=None):
+    """Stream messages to an NDJSON file (gzip-compressed if compress), one object per line.
+    With append, adds to the end of the file (a new gzip member) and leaves it untouched
+    if there is nothing to add. Each written line is also fed to digest (a Digest), if given.
+    Returns (count, sha256 of the written NDJSON, last text)."""
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    opener = gzip.open if compress else open
+    checksum = hashlib.sha256()
+    count = 0
+    last_text = None
+    messages = iter(messages)
+    first = next(messages, None)
+    if first is None:
+        if append:
+            return 0, checksum.hexdigest(), None
+    else:
+        messages = itertools.chain([first], messages)
+    with opener(path, 'ab' if append else 'wb') as f:
+        for msg in messages:
+            line = (encode(msg) + '\n').encode('utf-8')
+            checksum.update(line)
+            f.write(line)
+            if digest:
+                digest.add(line, msg)
+            count += 1
+            last_text = msg['text']
+    return count, checksum.hexdigest(), last_text
+
+def digest_weight(text):
+    """Sampling weight: distinct words, so long messages beat "ok"/"lol" and
+    "haha haha haha" doesn't count as long."""
+    return 1 + min(len(set(text.lower().split())), 40)
+
+class Digest:
+    """Single-pass stratified sample of a contact's messages.
+    Each month keeps a weighted reservoir (Efraimidis-Spirakis: key = u ** (1/weight)) of
+    context windows, sized so one month alone could fill the budget. Memory is bounded by the
+    budget, not by how many messages the contact has."""
+    def __init__(self, budget, context=DIGEST_CONTEXT, seed=0):
+        self.budget = budget
+        self.context = context
+        self.capacity = max(1, budget // (DIGEST_MIN_LINE * (2 * context + 1)))
+        self.rng = random.Random(seed)
+        self.strata = {}
+        self.recent = deque(maxlen=context)
+        self.open = []
+        self.seq = 0
+
+    def add(self, line, msg):
+        """Feed the next message (its NDJSON line and the decoded object), in order."""
+        seq = self.seq
+        self.seq += 1
+        for window in self.open:
+            window[2].append((seq, line))
+        self.open = [w for w in self.open if seq - w[1] < self.context]
+
+        key = self.rng.random() ** (1 / digest_weight(msg['text']))
+        reservoir = self.strata.setdefault(datetime.fromtimestamp(msg['ts']).strftime('%Y-%m'), [])
+        if len(reservoir) < self.capacity or key > reservoir[0][0]:
+            window = (key, seq, list(self.recent) + [(seq, line)])
+            if len(reservoir) < self.capacity:
+                heapq.heappush(reservoir, window)
+            else:
+                heapq.heapreplace(reservoir, window)
+            self.open.append(window)
+        self.recent.append((seq, line))
+
+    def lines(self):
+        """Pick windows round-robin across months, best key first, until the budget is
+        spent. Returns the chosen (seq, line) pairs in message order."""
+        queues = [sorted(r) for _, r in sorted(self.strata.items())]
+        chosen, size = {}, 0
+        while queues:
+            for queue in queues:
+                _, _, window = queue.pop()
+                new = [(seq, line) for seq, line in window if seq not in chosen]
+                cost = sum(len(line) for _, line in new) + DIGEST_MIN_LINE
+                if size + cost <= self.budget:
+                    chosen.update(new)
+                    size += cost
+            queues = [q for q in queues if q]
+        return sorted(chosen.items())
+
+    def write(self, path):
+        """Write the sample to path, marking gaps between windows with a {"skipped": N} line.
+        Returns the number of messages kept."""
+        kept = self.lines()
+        with open(path, 'wb') as f:
+            prev = -1
+            for seq, line in kept:
+                if seq > prev + 1:
+                    f.write(b'{"skipped": %d}\n' % (seq - prev - 1))
+                f.write(line)
+                prev = seq
+            if self.seq > prev + 1:
+                f.write(b'{"skipped": %d}\n' % (self.seq - prev - 1))
+        return len(kept)
+
+    def state(self):
+        """Reservoirs, context and random state as JSON-able data for save_state()."""
+        def pairs(items):
+            return [[seq, line.decode('utf-8')] for seq, line in items]
+        version, internal, gauss = self.rng.getstate()
+        return {
+            'budget': self.budget,
+            'context': self.context,
+            'seq': self.seq,
+            'rng': [version, list(internal), gauss],
+            'strata': {month: [[key, seq, pairs(window)] for key, seq, window in reservoir]
+                       for month, reservoir in self.strata.items()},
+            'recent': pairs(self.recent),
+        }
+
+    @classmethod
+    def restore(cls, state):
+        """A Digest that continues from state() exactly as the original would have."""
+        def unpairs(items):
+            return [(seq, line.encode('utf-8')) for seq, line in items]
+        digest = cls(state['budget'], state['context'])
+        version, internal, gauss = state['rng']
+        digest.rng.setstate((version, tuple(internal), gauss))
+        digest.seq = state['seq']
+        digest.strata = {month: [(key, seq, unpairs(window)) for key, seq, window in reservoir]
+                         for month, reservoir in state['strata'].items()}
+        digest.recent.extend(unpairs(state['recent']))
+        # Windows still collecting their trailing context (evicted ones no longer matter)
+        digest.open = [w for reservoir in digest.strata.values() for w in reservoir
+                       if digest.seq - 1 - w[1] < digest.context]
+        return digest
+
+def chain_checksum(previous, segment):
+    """messages_sha256 after appending a segment whose NDJSON hashes to segment: sha256 over
+    both digests, so an append never re-reads the file. A full extraction starts the chain
+    with the plain sha256 of the file."""
+    return hashlib.sha256(bytes.fromhex(previous) + bytes.fromhex(segment)).hexdigest()
+
+def save_state(path, messages_path, messages_sha256, near, near_dup, digest):
+    """Save what the next append to messages_path needs: its checksum, the NearDuplicates
+    signatures and the Digest reservoir (either may be None), tied to the file's size."""
+    state = {
+        'messages_size': os.path.getsize(messages_path),
+        'messages_sha256': messages_sha256,
+        'near_dup': near_dup if near else None,
+        'near': near.state() if near else None,
+        'digest': digest.state() if digest else None,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def load_state(path, messages_path):
+    """The state save_state() wrote for messages_path, or None if it is missing, unreadable
+    or older than the file (an interrupted run appended after it was saved)."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        if state['messages_size'] != os.path.getsize(messages_path):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+def resume_state(state_path, messages_path, near_dup, budget):
+    """(NearDuplicates, Digest) holding everything already in messages_path, ready to take
+    appended messages; None where near_dup or budget is off. Restored from the saved state
+    when it matches these settings, otherwise rebuilt by reading the file once."""
+    near = NearDuplicates(near_dup) if near_dup else None
+    digest = Digest(budget) if budget else None
+    if not (near or digest):
+        return near, digest
+    state = load_state(state_path, messages_path) if state_path else None
+    near_ok = not near or (state and state['near_dup'] == near_dup and state['near'] is not None)
+    digest_ok = not digest or (state and state['digest'] and state['digest']['budget'] == budget)
+    if near_ok and digest_ok:
+        if near:
+            near.restore(state['near'])
+        if digest:
+            digest = Digest.restore(state['digest'])
+        return near, digest
+    with (gzip.open if messages_path.endswith('.gz') else open)(messages_path, 'rb') as f:
+        for line in f:
+            msg = json.loads(line)
+            if near:
+                near.seen(msg['text'])
+            if digest:
+                digest.add(line, msg)
+    return near, digest
 
 def generate_initials_svg(name):
     """Generate an SVG avatar with initials."""
@@ -643,10 +1154,17 @@ def generate_html(contacts_with_summaries, year, output_path):
     """Generate the swipeable HTML report."""
 
     slides_html = []
+    # Each distinct picture goes into the stylesheet once, as a class named by its hash
+    photo_ids = {}
 
     for i, contact in enumerate(contacts_with_summaries):
         name = contact['name']
-        photo = contact.get('photo') or generate_initials_svg(name)
+        # Headers from older versions embed the photo as a data URI
+        photo = (contact.get('photo_hash') and load_photo(contact['photo_hash'])) or contact.get('photo')
+        photo = photo or generate_initials_svg(name)
+        if photo not in photo_ids:
+            photo_ids[photo] = hashlib.sha1(photo.encode()).hexdigest()[:12]
+        photo_id = photo_ids[photo]
         summary = contact.get('summary', 'No summary available.')
         total = contact['total']
         sent = contact['sent']
@@ -666,9 +1184,7 @@ def generate_html(contacts_with_summaries, year, output_path):
     <div class="slide person" data-index="{i}">
       <div class="slide-label">// #{i + 1} - {' + '.join(platform_icons).upper()}</div>
       <div class="slide-header">
-        <div class="contact-photo">
-          <img src="{photo}" alt="{name}">
-        </div>
+        <div class="contact-photo photo-{photo_id}" role="img" aria-label="{name}"></div>
         <h2 class="contact-name">{name}</h2>
         <div class="stats-bar">
           <span class="stat"><span class="num">{total:,}</span> messages</span>
@@ -683,6 +1199,9 @@ def generate_html(contacts_with_summaries, year, output_path):
     </div>'''
         slides_html.append(slide)
 
+    photo_css = '\n'.join(f'    .photo-{photo_id} {{ background-image: url("{photo}"); }}'
+                          for photo, photo_id in photo_ids.items())
+
     # Favicon as base64 SVG
     favicon = "data:image/svg+xml,<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 100 100'><text y='.9em' font-size='90'>🌯</text></svg>"
 
@@ -816,12 +1335,8 @@ def generate_html(contacts_with_summaries, year, output_path):
       overflow: hidden;
       border: 3px solid rgba(167, 139, 250, 0.4);
       box-shadow: 0 4px 20px rgba(167, 139, 250, 0.2);
-    }}
-
-    .contact-photo img {{
-      width: 100%;
-      height: 100%;
-      object-fit: cover;
+      background-size: cover;
+      background-position: center;
     }}
 
     .contact-name {{
@@ -997,6 +1512,9 @@ def generate_html(contacts_with_summaries, year, output_path):
         font-size: 15px;
       }}
     }}
+
+    /* Contact photos, one rule per distinct picture */
+{photo_css}
   </style>
 </head>
 <body>
@@ -1073,8 +1591,11 @@ def generate_html(contacts_with_summaries, year, output_path):
         f.write(html)
 
 
-def extract_messages(year='2025', top_n=25):
-    """Phase 1: Extract messages to JSON files."""
+def extract_messages(year='2025', top_n=None, workers=None, compress=False, digest=None,
+                     near_dup=NEAR_DUP_THRESHOLD, photo_size=None):
+    """Phase 1: Extract messages to NDJSON files, with a small JSON header per contact
+    (and a digest of about `digest` bytes, if given). near_dup is the NearDuplicates
+    threshold; 0 keeps near-duplicates. photo_size downscales contact photos."""
     print()
     print("=" * 60)
     print("  PEOPLE WRAPPED 2025 - Step 1: Extracting Messages")
@@ -1096,13 +1617,34 @@ def extract_messages(year='2025', top_n=25):
     whatsapp_contacts = extract_whatsapp_contacts()
     spinner.stop(f"Contacts: {len(imessage_contacts)} iMessage, {len(whatsapp_contacts)} WhatsApp")
 
+    if has_imessage:
+        spinner.start("Decoding message text...")
+        try:
+            decoded = update_text_cache(workers, path=TEXT_CACHE_PATH)
+            spinner.stop(f"Decoded {decoded:,} new attributedBody messages ({TEXT_CACHE_PATH})")
+        except (sqlite3.Error, OSError):
+            spinner.stop(f"Could not write {TEXT_CACHE_PATH}; messages without plain text are skipped")
+
     timestamps = get_year_timestamps(year)
 
+    # What the previous extraction of this year left behind. Files it was interrupted while
+    # moving go back first; a manifest written since (by status) doesn't list them.
+    if restore_moving() and os.path.exists(os.path.join(DATA_DIR, MANIFEST_FILE)):
+        os.remove(os.path.join(DATA_DIR, MANIFEST_FILE))
+    manifest = load_manifest()
+    if manifest.get('year') != year:
+        manifest = {'contacts': []}
+    top_n = top_n or manifest.get('top') or 25
+    # Files filtered with another near-duplicate threshold can't just be appended to
+    after = manifest.get('watermarks') if manifest.get('near_dup') == near_dup else None
+    previous = {handles_key(e['handles']): e for e in manifest['contacts']}
+    upto = current_watermarks(has_imessage, has_whatsapp)
+
     spinner.start("Identifying top contacts...")
     top_contacts = get_top_contacts_combined(
         timestamps, top_n,
         has_imessage, has_whatsapp,
-        imessage_contacts, whatsapp_contacts, contact_record_ids
+        imessage_contacts, whatsapp_contacts, contact_record_ids, photo_size
     )
     spinner.stop(f"Found {len(top_contacts)} contacts")
 
@@ -1113,63 +1655,348 @@ def extract_messages(year='2025', top_n=25):
         platform_str = ', '.join(platforms)
         print(f"  {i+1:2}. {c['name'][:25]:<25} — {c['total']:,} messages ({platform_str})")
 
-    # Create data directory
+    # Create data directory. The manifest is dropped while files change and rewritten at the
+    # end, so an interrupted run falls back to rebuilding it from the headers.
     os.makedirs(DATA_DIR, exist_ok=True)
+    if os.path.exists(os.path.join(DATA_DIR, MANIFEST_FILE)):
+        os.remove(os.path.join(DATA_DIR, MANIFEST_FILE))
 
     print()
     print("Extracting messages...")
 
+    # Contacts already extracted with a known tail only need messages above the watermarks,
+    # appended if they sort after that tail. Everyone else is extracted in full.
+    prevs = [previous.get(handles_key(c['handles'])) for c in top_contacts]
+    incremental = [
+        i for i, prev in enumerate(prevs)
+        if after and prev and 'last_key' in prev
+        and prev['messages_file'].endswith('.gz') == compress
+        and os.path.exists(os.path.join(DATA_DIR, prev['messages_file']))
+    ]
+    # Contacts whose rank changed move out of the way first, so no file name is claimed twice
+    stems = []
     for i, contact in enumerate(top_contacts):
+        safe_name = re.sub(r'[^\w\s-]', '', contact['name']).strip().replace(' ', '_')
+        stems.append(f"{i+1:02d}_{safe_name}")
+    located = {}
+    for i, prev in enumerate(prevs):
+        if not prev:
+            continue
+        files = {'header': prev['header_file'], 'messages': prev['messages_file']}
+        if prev.get('digest_file'):
+            files['digest'] = prev['digest_file']
+        if prev.get('state_file'):
+            files['state'] = prev['state_file']
+        if prev['header_file'] != stems[i] + '.json':
+            for kind, name in files.items():
+                if os.path.exists(os.path.join(DATA_DIR, name)):
+                    os.replace(os.path.join(DATA_DIR, name), os.path.join(DATA_DIR, name + MOVING_EXT))
+                    files[kind] = name + MOVING_EXT
+        located[i] = {kind: os.path.join(DATA_DIR, name) for kind, name in files.items()}
+
+    tails = set()
+
+    def contact_messages():
+        """(index, ContactMessages) for every contact as its messages stream in: tails first,
+        then full extractions for everyone else."""
+        for n, writer in get_messages_for_contacts(
+                [top_contacts[i] for i in incremental], timestamps, has_imessage, has_whatsapp, after, upto):
+            i = incremental[n]
+            last_key = prevs[i]['last_key']
+            if last_key is not None and writer.first_key() is not None and writer.first_key() <= tuple(last_key):
+                continue  # A late-synced message lands mid-file
+            tails.add(i)
+            yield i, writer
+        full = [i for i in range(len(top_contacts)) if i not in tails]
+        for n, writer in get_messages_for_contacts(
+                [top_contacts[i] for i in full], timestamps, has_imessage, has_whatsapp, None, upto):
+            yield full[n], writer
+
+    entries = {}
+    near_dropped = near_bytes = 0
+    for i, writer in contact_messages():
+        contact = top_contacts[i]
         name = contact['name']
-        safe_name = re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')
-
-        messages = get_messages_for_contact(contact, timestamps, has_imessage, has_whatsapp)
-
-        # Save to JSON
-        data = {
+        stem = stems[i]
+        prev = prevs[i]
+        old = located.get(i, {})
+        json_path = os.path.join(DATA_DIR, stem + ".json")
+        messages_file = stem + MESSAGES_EXT + ('.gz' if compress else '')
+        messages_path = os.path.join(DATA_DIR, messages_file)
+        digest_path = os.path.join(DATA_DIR, stem + DIGEST_EXT)
+        state_path = os.path.join(DATA_DIR, stem + STATE_EXT)
+
+        # Files left at this name by a contact that dropped out of the top N
+        for path in [json_path, digest_path, state_path] + glob.glob(os.path.join(DATA_DIR, stem + MESSAGES_EXT + '*')):
+            if os.path.exists(path) and path not in old.values() and not path.endswith(MOVING_EXT):
+                os.remove(path)
+
+        if i in tails:
+            # Unchanged, or new messages appended after the stored tail. The near-duplicate
+            # index and the digest sample continue from the saved state; only the new
+            # messages are read.
+            if old['messages'] != messages_path:
+                os.replace(old['messages'], messages_path)
+            resample = digest and not (old.get('digest') and prev.get('digest_bytes') == digest)
+            near = sample = None
+            if writer.first_key() is not None or resample:
+                near, sample = resume_state(old.get('state'), messages_path, near_dup, digest)
+            added, segment_sha256, last_text = write_messages(
+                messages_path, writer.messages(prev['last_text'], near), compress, append=True, digest=sample)
+            count = prev['message_count'] + added
+            tail = {
+                'messages_sha256': chain_checksum(prev['messages_sha256'], segment_sha256) if added else prev['messages_sha256'],
+                'last_key': list(writer.last_key) if writer.last_key else prev['last_key'],
+                'last_text': last_text if added else prev['last_text'],
+            }
+            progress = f"+{added} new" if added else "unchanged"
+        else:
+            # Messages stream to NDJSON; the header holds everything status and build need
+            near = NearDuplicates(near_dup) if near_dup else None
+            sample = Digest(digest) if digest else None
+            count, messages_sha256, last_text = write_messages(
+                messages_path, writer.messages(None, near), compress, digest=sample)
+            if old.get('messages') not in (None, messages_path) and os.path.exists(old['messages']):
+                os.remove(old['messages'])
+            tail = {
+                'messages_sha256': messages_sha256,
+                'last_key': list(writer.last_key) if writer.last_key else None,
+                'last_text': last_text,
+            }
+            added = count
+            progress = f"{count} messages"
+        if near and near.dropped:
+            share = near.dropped / (added + near.dropped)
+            progress += f", -{near.dropped} near-duplicates ({share:.0%}, -{near.dropped_bytes / 1024:.1f} KB)"
+            near_dropped += near.dropped
+            near_bytes += near.dropped_bytes
+
+        header = {
             'index': i,
             'name': name,
             'total': contact['total'],
             'sent': contact['sent'],
             'received': contact['received'],
             'handles': contact['handles'],
-            'photo': contact.get('photo'),
+            'photo_hash': save_photo(contact['photo']) if contact.get('photo') else None,
             'record_id': contact.get('record_id'),
-            'messages': messages,
             'year': year,
+            'message_count': count,
+            'messages_file': messages_file,
         }
-
-        json_path = os.path.join(DATA_DIR, f"{i+1:02d}_{safe_name}.json")
-        with open(json_path, 'w') as f:
-            json.dump(data, f, indent=2)
-
-        print(f"  [{i+1}/{len(top_contacts)}] {name}: {len(messages)} messages")
+        if digest:
+            header['digest_file'] = stem + DIGEST_EXT
+            header['digest_bytes'] = digest
+            if sample:
+                sampled = sample.write(digest_path)
+                if old.get('digest') not in (None, digest_path) and os.path.exists(old['digest']):
+                    os.remove(old['digest'])
+                progress += f", digest of {sampled}"
+            elif old['digest'] != digest_path:
+                os.replace(old['digest'], digest_path)
+        elif old.get('digest'):
+            if os.path.exists(old['digest']):
+                os.remove(old['digest'])
+        # State for the next append: rewritten when anything was folded in, otherwise the
+        # saved one still matches the untouched file
+        if near or sample:
+            save_state(state_path, messages_path, tail['messages_sha256'], near, near_dup, sample)
+            tail['state_file'] = stem + STATE_EXT
+        elif old.get('state') and i in tails and not added and os.path.exists(old['state']):
+            if old['state'] != state_path:
+                os.replace(old['state'], state_path)
+            tail['state_file'] = stem + STATE_EXT
+        if old.get('state') not in (None, state_path) and os.path.exists(old['state']):
+            os.remove(old['state'])
+        if 'state_file' not in tail and os.path.exists(state_path):
+            os.remove(state_path)
+        old_header = None
+        if old.get('header') and os.path.exists(old['header']):
+            with open(old['header']) as f:
+                old_header = json.load(f)
+            # Keep the summary (and anything else added to the header); flag it if the
+            # messages it was written from have changed
+            header = {**old_header, **header}
+            header.pop('photo', None)
+            if not digest:
+                header.pop('digest_file', None)
+                header.pop('digest_bytes', None)
+            if header.get('summary') and prev and tail['messages_sha256'] != prev.get('messages_sha256'):
+                header['summary_stale'] = True
+        if header == old_header:
+            if old['header'] != json_path:
+                os.replace(old['header'], json_path)
+        else:
+            with open(json_path, 'w') as f:
+                json.dump(header, f, indent=2)
+            if old.get('header') not in (None, json_path) and os.path.exists(old['header']):
+                os.remove(old['header'])
+        entries[i] = manifest_entry(json_path, header, tail)
+
+        print(f"  [{i+1}/{len(top_contacts)}] {name}: {progress}")
+
+    # Contacts that dropped out of the top N and whose files nobody took over
+    entries = [entries[i] for i in sorted(entries)]
+    file_fields = ('header_file', 'messages_file', 'digest_file', 'state_file')
+    kept = {e[k] for e in entries for k in file_fields if e.get(k)}
+    dropped = [e for e in previous.values() if e not in prevs]
+    for name in {e[k] for e in dropped for k in file_fields if e.get(k)} - kept:
+        if os.path.exists(os.path.join(DATA_DIR, name)):
+            os.remove(os.path.join(DATA_DIR, name))
+    # Photos no contact refers to any more
+    photo_hashes = {e['photo_hash'] for e in entries if e.get('photo_hash')}
+    for path in glob.glob(os.path.join(PHOTOS_DIR, '*')):
+        name, ext = os.path.splitext(os.path.basename(path))
+        if name not in photo_hashes or ext not in PHOTO_TYPES:
+            os.remove(path)
+
+    write_manifest({'year': year, 'top': top_n, 'near_dup': near_dup, 'watermarks': upto, 'contacts': entries})
 
     print()
+    if near_dropped:
+        print(f"  Near-duplicates dropped: {near_dropped:,} messages, {near_bytes / 1024:,.0f} KB")
     print(f"✓ Messages extracted to {DATA_DIR}/")
     return True
 
 
-def get_contacts_needing_summaries():
-    """Get list of contacts that don't have summaries yet."""
+def manifest_entry(json_path, header, tail=None):
+    """Manifest row for one contact header. tail holds what only extraction knows about the
+    message file: messages_sha256 (chained per append, see chain_checksum()), and
+    last_key/last_text/state_file for appending to it.
+    The header's size and mtime let load_manifest() notice summaries written straight into it."""
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    st = os.stat(json_path)
+    photo = header.get('photo')
+    if photo:
+        photo = base64.b64decode(photo.split(',', 1)[1])
+    entry = {
+        'index': header['index'],
+        'name': header['name'],
+        'handles': header['handles'],
+        'total': header['total'],
+        'sent': header['sent'],
+        'received': header['received'],
+        # Files from older versions embed the messages in the JSON itself
+        'message_count': header.get('message_count', len(header.get('messages', []))),
+        'photo_hash': header.get('photo_hash') or (hashlib.sha1(photo).hexdigest() if photo else None),
+        'has_summary': bool(header.get('summary')),
+        'summary_stale': bool(header.get('summary_stale')),
+        'header_file': os.path.basename(json_path),
+        'header_sha256': hashlib.sha256(raw).hexdigest(),
+        'header_size': st.st_size,
+        'header_mtime_ns': st.st_mtime_ns,
+        'messages_file': header.get('messages_file', os.path.basename(json_path)),
+        'messages_sha256': None,
+        'digest_file': header.get('digest_file'),
+        'digest_bytes': header.get('digest_bytes'),
+    }
+    entry.update(tail or {})
+    return entry
+
+MANIFEST_TAIL_FIELDS = ('messages_sha256', 'last_key', 'last_text', 'state_file')
+
+def messages_checksum(path):
+    """sha256 of a message file's uncompressed NDJSON, as returned by write_messages().
+    Only for rebuilding a manifest without a saved state; appends chain instead."""
+    digest = hashlib.sha256()
+    with (gzip.open if path.endswith('.gz') else open)(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_manifest(manifest):
+    """Atomically replace the manifest (write a temp file, then rename over it)."""
+    path = os.path.join(DATA_DIR, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({**manifest, 'version': MANIFEST_VERSION}, f, indent=1)
+    os.replace(tmp_path, path)
+
+def restore_moving():
+    """Put back files an interrupted extraction left moved aside, so their headers (and
+    summaries) are found again. One whose name has since been taken is stale and removed.
+    Returns True if there were any."""
+    paths = glob.glob(os.path.join(DATA_DIR, '*' + MOVING_EXT))
+    for path in paths:
+        original = path[:-len(MOVING_EXT)]
+        if os.path.exists(original):
+            os.remove(path)
+        else:
+            os.replace(path, original)
+    return bool(paths)
+
+def load_manifest():
+    """The manifest: {'year', 'top', 'near_dup', 'watermarks', 'contacts': [entry, ...]} in index order.
+    Only headers whose size or mtime changed since it was written (a summary was saved) are
+    re-read. Without a usable manifest it is rebuilt from the headers, with no watermarks.
+    Either way a refreshed manifest is written back."""
     if not os.path.exists(DATA_DIR):
-        return []
-
-    json_files = sorted(glob.glob(os.path.join(DATA_DIR, "*.json")))
-    needs_summary = []
+        return {'contacts': []}
+    path = os.path.join(DATA_DIR, MANIFEST_FILE)
+    manifest = None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            manifest = None
+    except (OSError, ValueError):
+        pass
 
-    for json_path in json_files:
-        with open(json_path) as f:
-            data = json.load(f)
-        if not data.get('summary'):
-            needs_summary.append({
-                'path': json_path,
-                'name': data['name'],
-                'total': data['total'],
-                'message_count': len(data.get('messages', []))
-            })
+    changed = False
+    if manifest is None:
+        # Data from an older version, or an interrupted extraction
+        entries, year = [], None
+        for json_path in sorted(glob.glob(os.path.join(DATA_DIR, "[0-9]*.json"))):
+            with open(json_path) as f:
+                header = json.load(f)
+            messages_path = os.path.join(DATA_DIR, header.get('messages_file', ''))
+            tail = {'messages_sha256': None}
+            if 'messages_file' in header and os.path.exists(messages_path):
+                state_path = json_path[:-len('.json')] + STATE_EXT
+                state = load_state(state_path, messages_path)
+                if state:
+                    tail = {'messages_sha256': state['messages_sha256'], 'state_file': os.path.basename(state_path)}
+                else:
+                    tail = {'messages_sha256': messages_checksum(messages_path)}
+            entries.append(manifest_entry(json_path, header, tail))
+            year = header.get('year')
+        manifest = {'year': year, 'top': None, 'watermarks': None, 'contacts': entries}
+        changed = bool(entries)
+    else:
+        entries = manifest['contacts']
+        for i, entry in enumerate(entries):
+            json_path = os.path.join(DATA_DIR, entry['header_file'])
+            try:
+                st = os.stat(json_path)
+            except OSError:
+                continue
+            if (st.st_size, st.st_mtime_ns) != (entry['header_size'], entry['header_mtime_ns']):
+                try:
+                    with open(json_path) as f:
+                        header = json.load(f)
+                except ValueError:
+                    continue  # Being written right now; pick it up next time
+                tail = {k: entry[k] for k in MANIFEST_TAIL_FIELDS if k in entry}
+                entries[i] = manifest_entry(json_path, header, tail)
+                changed = True
+
+    if changed:
+        write_manifest(manifest)
+    return manifest
 
-    return needs_summary
+def get_contacts_needing_summaries():
+    """Get list of contacts without a summary, or whose summary predates new messages
+    (from the manifest)."""
+    return [{
+        'path': os.path.join(DATA_DIR, entry['header_file']),
+        'messages_path': os.path.join(DATA_DIR, entry['messages_file']),
+        'digest_path': os.path.join(DATA_DIR, entry['digest_file']) if entry.get('digest_file') else None,
+        'name': entry['name'],
+        'total': entry['total'],
+        'message_count': entry['message_count'],
+        'stale': entry['has_summary'],
+    } for entry in load_manifest()['contacts'] if not entry['has_summary'] or entry['summary_stale']]
 
 
 def build_html(year='2025'):
@@ -1180,9 +2007,9 @@ def build_html(year='2025'):
         print(f"Error: {DATA_DIR}/ not found.")
         return False
 
-    json_files = sorted(glob.glob(os.path.join(DATA_DIR, "*.json")))
-    if not json_files:
-        print(f"Error: No JSON files found in {DATA_DIR}/")
+    entries = load_manifest()['contacts']
+    if not entries:
+        print(f"Error: No extracted contacts found in {DATA_DIR}/")
         return False
 
     print()
@@ -1191,13 +2018,13 @@ def build_html(year='2025'):
     print("=" * 60)
     print()
 
+    # Headers carry the summary and photo_hash; message files are never opened
     contacts = []
-    for json_path in json_files:
-        with open(json_path) as f:
+    for entry in entries:
+        with open(os.path.join(DATA_DIR, entry['header_file'])) as f:
             data = json.load(f)
         contacts.append(data)
-        has_summary = 'summary' in data and data['summary']
-        status = "✓" if has_summary else "✗"
+        status = "✓" if entry['has_summary'] else "✗"
         print(f"  {status} {data['name']}")
 
     spinner = Spinner()
@@ -1221,16 +2048,21 @@ def print_summary_instructions():
     print()
     print(f"  {len(needs_summary)} contacts need summaries:")
     for c in needs_summary:
-        print(f"    - {c['name']} ({c['message_count']:,} messages)")
+        stale = " [new messages since summary]" if c['stale'] else ""
+        print(f"    - {c['name']} ({c['message_count']:,} messages){stale}: {c['digest_path'] or c['messages_path']}")
     print()
     print("=" * 60)
     print()
     print("  CLAUDE CODE: Please generate summaries for the contacts above.")
     print()
-    print("  Read each JSON file in people_wrapped_data/ and write a personal,")
-    print("  specific summary. Pull out inside jokes, memorable moments, how")
-    print("  the relationship evolved. Be specific, quote when it captures")
-    print("  something real.")
+    print("  Read each messages file above (one JSON message per line; in a")
+    print("  .digest.ndjson, {\"skipped\": N} marks messages left out) and write")
+    print("  a personal, specific summary. Pull out inside jokes, memorable")
+    print("  moments, how the relationship evolved. Be specific, quote when it")
+    print("  captures something real. Save it as the \"summary\" field of the")
+    print("  contact's .json header in people_wrapped_data/. For contacts marked")
+    print("  [new messages since summary], update the summary and remove its")
+    print("  \"summary_stale\" field.")
     print()
     print("  IMPORTANT: Do NOT use Task tool or parallel agents.")
     print("  Use /model sonnet for larger context window.")
@@ -1259,26 +2091,42 @@ Commands:
   python3 people_wrapped.py status    Check progress
 
 Options:
-  --top N    Number of contacts to analyze (default: 25)
+  --top N    Number of contacts to analyze (default: 25, or the previous extraction's)
+  --workers N  Processes for decoding message text (default: one per CPU)
+  --gzip     Compress the extracted message files
+  --near-dup T  Drop messages at least T similar to an earlier one (0-1, default 0.8; 0 keeps them)
+  --photo-size PX  Downscale contact photos to PX pixels (uses macOS sips)
+  --digest BYTES  Also write a time-spread sample of each contact within BYTES (~BYTES/4 tokens)
 """
     )
     parser.add_argument('command', nargs='?', default='run',
                        choices=['run', 'extract', 'summarize', 'build', 'status'],
                        help='Command to run')
     parser.add_argument('--year', default='2025', help='Year to analyze')
-    parser.add_argument('--top', type=int, default=25, help='Number of top contacts (default: 25)')
+    parser.add_argument('--top', type=int, default=None,
+                       help="Number of top contacts (default: 25, or the previous extraction's)")
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Processes for decoding message text (default: one per CPU)')
+    parser.add_argument('--gzip', action='store_true', help='Compress the extracted message files')
+    parser.add_argument('--near-dup', type=float, default=NEAR_DUP_THRESHOLD, metavar='T',
+                       help=f'Near-duplicate similarity threshold, 0 to keep them (default: {NEAR_DUP_THRESHOLD})')
+    parser.add_argument('--photo-size', type=int, default=None, metavar='PX',
+                       help='Downscale contact photos to at most PX pixels (default: full size)')
+    parser.add_argument('--digest', type=int, default=None, metavar='BYTES',
+                       help='Also write a sampled digest of each contact within BYTES')
 
     args = parser.parse_args()
 
     if args.command == 'extract':
-        extract_messages(args.year, args.top)
+        extract_messages(args.year, args.top, args.workers, args.gzip, args.digest, args.near_dup, args.photo_size)
     elif args.command == 'summarize':
         print_summary_instructions()
     elif args.command == 'build':
         build_html(args.year)
     elif args.command == 'status':
-        needs = get_contacts_needing_summaries()
-        total = len(glob.glob(os.path.join(DATA_DIR, "*.json"))) if os.path.exists(DATA_DIR) else 0
+        entries = load_manifest()['contacts']
+        needs = [e for e in entries if not e['has_summary'] or e['summary_stale']]
+        total = len(entries)
         complete = total - len(needs)
         print(f"\nProgress: {complete}/{total} summaries complete\n")
         if needs:
@@ -1293,12 +2141,8 @@ Options:
         print("║      AI-powered analysis of your top relationships         ║")
         print("╚════════════════════════════════════════════════════════════╝")
 
-        # Step 1: Check if extraction needed
-        if not os.path.exists(DATA_DIR) or not glob.glob(os.path.join(DATA_DIR, "*.json")):
-            extract_messages(args.year, args.top)
-        else:
-            print()
-            print("✓ Messages already extracted. Skipping Step 1.")
+        # Step 1: Extract, or pick up only messages newer than the last extraction
+        extract_messages(args.year, args.top, args.workers, args.gzip, args.digest, args.near_dup, args.photo_size)
 
         # Step 2: Check if summaries needed
         needs_summary = get_contacts_needing_summaries()
@@ -1,88 +1,48 @@
 #!/usr/bin/env python3
 """
-Script to query detailed iMessage stats for advanced visualizations.
+Script to export every chart dataset from a single scan of the 1:1 messages.
 Outputs:
+  - message_stats_monthly.csv: DM totals by month per contact
+  - message_stats_quarterly.csv: DM totals by quarter per contact
   - message_stats_sent_recv.csv: sent/received breakdown by month per contact
   - message_response_times.csv: response time stats per contact per month
-  - message_day_hour.csv: day/hour heatmap data per contact
-Usage: python3 query_messages_detailed.py
+  - message_day_hour.json: day/hour heatmap data per contact
+  - message_stats.db: indexed aggregates for every contact (chart/serve.py /api endpoints)
+  - --format long: message_contacts.csv + message_stats_long.csv (sparse sent/recv per month)
+  - --compact-dayhour: message_day_hour.bin + message_day_hour.index.json (packed uint32 grids)
+  - message_day_hour.format.json: which day/hour format was written, so dayhour.js fetches only that
+Usage: python3 query_messages_detailed.py [--top N|all] [--format wide|long|both]
+                                          [--compact-dayhour] [--profile]
+       python3 query_messages_detailed.py --incremental   # fold new messages into message_stats.db
 """
 
+import argparse
 import csv
-import glob
 import json
 import os
-import re
 import sqlite3
-from datetime import datetime
+import struct
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
 from collections import defaultdict
 
+from aggregate_store import STORE_PATH, fold_updates, month_label, store_end_month, watermark, write_store
+from contact_index import load_contacts, resolve_names
+from query_messages_monthly import DM_CHATS_CTE, add_output_args, generate_months, write_long_csvs, write_monthly_csvs
+from quantile_sketch import QuantileSketch
+
 IMESSAGE_DB = os.path.expanduser("~/Library/Messages/chat.db")
-ADDRESSBOOK_DIR = os.path.expanduser("~/Library/Application Support/AddressBook")
 
 # Apple Cocoa epoch offset (seconds between 1970 and 2001)
 APPLE_EPOCH_OFFSET = 978307200
 
+DAY_HOUR_BIN = "message_day_hour.bin"
+DAY_HOUR_INDEX = "message_day_hour.index.json"
+DAY_HOUR_FORMAT = "message_day_hour.format.json"
 
-def load_contacts():
-    """Load contacts from macOS AddressBook."""
-    contacts = {}
-    db_paths = glob.glob(
-        os.path.join(ADDRESSBOOK_DIR, "Sources", "*", "AddressBook-v22.abcddb")
-    )
-    main_db = os.path.join(ADDRESSBOOK_DIR, "AddressBook-v22.abcddb")
-    if os.path.exists(main_db):
-        db_paths.append(main_db)
-
-    for db_path in db_paths:
-        try:
-            conn = sqlite3.connect(db_path)
-            people = {}
-            for row in conn.execute(
-                "SELECT ROWID, ZFIRSTNAME, ZLASTNAME FROM ZABCDRECORD WHERE ZFIRSTNAME IS NOT NULL OR ZLASTNAME IS NOT NULL"
-            ):
-                name = f"{row[1] or ''} {row[2] or ''}".strip()
-                if name:
-                    people[row[0]] = name
-
-            for owner, phone in conn.execute(
-                "SELECT ZOWNER, ZFULLNUMBER FROM ZABCDPHONENUMBER WHERE ZFULLNUMBER IS NOT NULL"
-            ):
-                if owner in people:
-                    digits = re.sub(r"\D", "", str(phone))
-                    if digits:
-                        contacts[digits] = people[owner]
-                        if len(digits) >= 10:
-                            contacts[digits[-10:]] = people[owner]
-                        if len(digits) == 11 and digits.startswith("1"):
-                            contacts[digits[1:]] = people[owner]
-
-            for owner, email in conn.execute(
-                "SELECT ZOWNER, ZADDRESS FROM ZABCDEMAILADDRESS WHERE ZADDRESS IS NOT NULL"
-            ):
-                if owner in people:
-                    contacts[email.lower().strip()] = people[owner]
-
-            conn.close()
-        except Exception:
-            pass
-
-    return contacts
-
-
-def resolve_name(handle, contacts):
-    """Resolve a handle (phone/email) to a contact name."""
-    if "@" in handle:
-        return contacts.get(handle.lower().strip(), handle)
-
-    digits = re.sub(r"\D", "", str(handle))
-    if digits in contacts:
-        return contacts[digits]
-    if len(digits) == 11 and digits.startswith("1") and digits[1:] in contacts:
-        return contacts[digits[1:]]
-    if len(digits) >= 10 and digits[-10:] in contacts:
-        return contacts[digits[-10:]]
-    return handle
+MINUTE_NS = 60 * 1_000_000_000
+HOUR_NS = 60 * MINUTE_NS
 
 
 def ns_to_datetime(ns_timestamp):
@@ -96,6 +56,82 @@ def ns_to_datetime(ns_timestamp):
         return None
 
 
+def new_response_cell():
+    """
+    Response-time sketches for one contact-month, in minutes.
+    my_response_times: time for me to reply after they message
+    their_response_times: time for them to reply after I message
+    """
+    return {"my_response_times": QuantileSketch(), "their_response_times": QuantileSketch()}
+
+
+def add_response_gap(cell, prev_from_me, is_from_me, prev_ns, date_ns):
+    """Record the gap between two consecutive messages in a chat if it is a reply."""
+    time_diff = (date_ns - prev_ns) / MINUTE_NS
+
+    # Only count responses within 24 hours
+    if time_diff <= 24 * 60:
+        if prev_from_me == 0 and is_from_me == 1:
+            # They messaged, I replied
+            cell["my_response_times"].add(time_diff)
+        elif prev_from_me == 1 and is_from_me == 0:
+            # I messaged, they replied
+            cell["their_response_times"].add(time_diff)
+
+
+def response_values(cell):
+    """
+    (my_median, their_median, my_count, their_count, my_p90, their_p90, my_p99, their_p99)
+    for a cell, quantiles rounded to 0.1 min (None when empty); None if the cell has no gaps.
+    Quantiles come from QuantileSketch and are within 1% of the exact value.
+    """
+    my_times, their_times = cell["my_response_times"], cell["their_response_times"]
+    if not (my_times.count or their_times.count):
+        return None
+
+    def fmt(value):
+        return round(value, 1) if value else None
+
+    return (
+        fmt(my_times.quantile(0.5)),
+        fmt(their_times.quantile(0.5)),
+        my_times.count,
+        their_times.count,
+        fmt(my_times.quantile(0.9)),
+        fmt(their_times.quantile(0.9)),
+        fmt(my_times.quantile(0.99)),
+        fmt(their_times.quantile(0.99)),
+    )
+
+
+def build_local_days(month_tuples):
+    """
+    Precompute local-midnight boundaries (iMessage nanoseconds) for every day in the
+    month range, so timestamps map to month/weekday/hour with one bisect instead of
+    building a datetime per message.
+    Returns (day_starts, day_info): day_starts has one trailing entry marking the end
+    of the range; day_info[i] = (month_idx, year, weekday, is_24h). Days that are not
+    24 hours long (DST changes) fall back to datetime for the hour.
+    """
+    month_idx = {ym: i for i, ym in enumerate(month_tuples)}
+    last_year, last_month = month_tuples[-1]
+    day = date(month_tuples[0][0], month_tuples[0][1], 1)
+    end = date(last_year + last_month // 12, last_month % 12 + 1, 1)
+
+    day_starts, days = [], []
+    while day <= end:
+        local_midnight = datetime(day.year, day.month, day.day)
+        day_starts.append((int(local_midnight.timestamp()) - APPLE_EPOCH_OFFSET) * 1_000_000_000)
+        days.append(day)
+        day += timedelta(days=1)
+
+    day_info = [
+        (month_idx[(d.year, d.month)], d.year, d.weekday(), day_starts[i + 1] - day_starts[i] == 24 * HOUR_NS)
+        for i, d in enumerate(days[:-1])
+    ]
+    return day_starts, day_info
+
+
 def get_date_range(conn):
     """Get the date range of messages in the database."""
     result = conn.execute("SELECT MIN(date), MAX(date) FROM message WHERE date > 0").fetchone()
@@ -110,244 +146,344 @@ def get_date_range(conn):
     return min_date, max_date
 
 
+def write_sent_recv_csv(results, months):
+    """Write message_stats_sent_recv.csv: two columns (sent, recv) per month per contact."""
+    with open("message_stats_sent_recv.csv", "w", newline="") as f:
+        # Format: name, total_sent, total_recv, YYYY-MM_sent, YYYY-MM_recv, ...
+        fieldnames = ["name", "total_sent", "total_recv"]
+        for m in months:
+            fieldnames.extend([f"{m}_sent", f"{m}_recv"])
+
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+
+        for r in results:
+            sent, recv = r["sent"], r["recv"]
+            row = [r["name"], sum(sent), sum(recv)]
+            for month_sent, month_recv in zip(sent, recv):
+                row.extend([month_sent, month_recv])
+            writer.writerow(row)
+
+
+def write_day_hour_compact(day_hour_output):
+    """
+    Write the day/hour grids as packed little-endian uint32 blocks of 168 cells
+    (weekday * 24 + hour, 0 = Monday), one block for each contact's all-time grid and
+    one per contact-year, plus a small JSON index of block numbers. dayhour.js reads
+    the .bin as an ArrayBuffer and views any block without parsing.
+    """
+    index = {"dtype": "<u4", "cells": 168, "layout": "weekday*24+hour, weekday 0 = Monday", "contacts": {}}
+    blocks = 0
+    with open(DAY_HOUR_BIN, "wb") as f:
+        for name, data in day_hour_output.items():
+            entry = {"all_time": blocks, "by_year": {}}
+            f.write(_pack_grid(data["all_time"]))
+            blocks += 1
+            for year in sorted(data["by_year"]):
+                entry["by_year"][str(year)] = blocks
+                f.write(_pack_grid(data["by_year"][year]))
+                blocks += 1
+            index["contacts"][name] = entry
+    index["blocks"] = blocks
+    with open(DAY_HOUR_INDEX, "w") as f:
+        json.dump(index, f)
+
+
+def _pack_grid(grid):
+    return struct.pack("<168I", *(count for row in grid for count in row))
+
+
+def print_query_plan(conn, query, params):
+    """Print EXPLAIN QUERY PLAN and flag steps that build a temp B-tree (external sort)."""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    temp_btrees = [step for step in plan if "TEMP B-TREE" in step]
+    print("  Query plan:")
+    for step in plan:
+        print(f"    {step}")
+    print(f"  Temp B-trees: {len(temp_btrees)}")
+
+
+def month_start_ns(key):
+    """Local midnight starting month bucket key (year * 12 + month - 1), in iMessage nanoseconds."""
+    local_midnight = datetime(key // 12, key % 12 + 1, 1)
+    return (int(local_midnight.timestamp()) - APPLE_EPOCH_OFFSET) * 1_000_000_000
+
+
+def update_store(contacts, path=STORE_PATH):
+    """
+    Fold messages added to chat.db since the store was written (ROWID above its
+    watermark) into message_stats.db without rescanning history: sent/received counts
+    are incremented at every rollup level, and response times are recomputed for only the contact-months
+    that received messages, from those chats' messages in that month.
+    Returns the changed month labels, sorted (empty when there is nothing new).
+    """
+    store = sqlite3.connect(path)
+    last_rowid, first_month = watermark(store)
+
+    conn = sqlite3.connect(f"file:{IMESSAGE_DB}?mode=ro", uri=True)
+    conn.execute("BEGIN")
+    new_rowid = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+    if new_rowid <= last_rowid:
+        conn.close()
+        store.close()
+        return []
+
+    dm_handles = dict(conn.execute(f"WITH {DM_CHATS_CTE} SELECT chat_id, handle FROM dm_chats"))
+    handle_names = resolve_names(dm_handles.values(), contacts)
+    chats_by_name = defaultdict(list)
+    for chat_id, handle in dm_handles.items():
+        if handle_names[handle] != handle:  # Skip unresolved
+            chats_by_name[handle_names[handle]].append(chat_id)
+    chat_names = {chat_id: name for name, chat_ids in chats_by_name.items() for chat_id in chat_ids}
+
+    counts = defaultdict(lambda: [0, 0])
+    affected = set()
+    for chat_id, is_from_me, date_ns in conn.execute(
+        f"""
+        WITH {DM_CHATS_CTE}
+        SELECT cmj.chat_id, m.is_from_me, m.date
+        FROM message m
+        JOIN chat_message_join cmj ON cmj.message_id = m.ROWID
+        WHERE m.ROWID > ? AND cmj.chat_id IN (SELECT chat_id FROM dm_chats)
+        """,
+        (last_rowid,),
+    ):
+        name = chat_names.get(chat_id)
+        dt = ns_to_datetime(date_ns)
+        if name is None or dt is None:
+            continue
+        key = dt.year * 12 + dt.month - 1
+        if key < first_month:
+            continue
+        counts[(dt.date().toordinal(), name)][0 if is_from_me else 1] += 1
+        affected.add((key, name))
+        # A message in the last 24 hours of a month can be the predecessor of a reply
+        # in the next month
+        if date_ns >= month_start_ns(key + 1) - 24 * HOUR_NS:
+            affected.add((key + 1, name))
+
+    # Gaps over 24 hours are not responses, so a day of lead-in before the month is
+    # enough to find each in-month message's predecessor
+    responses = {}
+    for key, name in affected:
+        cell = new_response_cell()
+        start_ns, end_ns = month_start_ns(key), month_start_ns(key + 1)
+        for chat_id in chats_by_name[name]:
+            prev_ns = prev_from_me = None
+            for is_from_me, date_ns in conn.execute(
+                """
+                SELECT m.is_from_me, m.date
+                FROM chat_message_join cmj
+                JOIN message m ON m.ROWID = cmj.message_id
+                WHERE cmj.chat_id = ? AND cmj.message_date >= ? AND cmj.message_date < ?
+                ORDER BY cmj.message_date
+                """,
+                (chat_id, start_ns - 24 * HOUR_NS, end_ns),
+            ):
+                if prev_ns is not None and date_ns >= start_ns:
+                    add_response_gap(cell, prev_from_me, is_from_me, prev_ns, date_ns)
+                prev_ns, prev_from_me = date_ns, is_from_me
+        responses[(key, name)] = response_values(cell)
+    conn.close()
+
+    fold_updates(store, counts, responses, new_rowid)
+    store.close()
+    return sorted({month_label(key) for key, _ in affected})
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Export chart datasets from iMessage")
+    add_output_args(parser)
+    parser.add_argument("--compact-dayhour", action="store_true",
+                        help=f"also write {DAY_HOUR_BIN} (packed uint32 grids) + {DAY_HOUR_INDEX}")
+    parser.add_argument("--profile", action="store_true", help="print query plan, temp B-tree usage and timings")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"only fold messages newer than the last export into {STORE_PATH} (no CSVs)")
+    args = parser.parse_args()
+    profile = args.profile
+
+    if args.incremental:
+        if not os.path.exists(STORE_PATH):
+            parser.error(f"{STORE_PATH} not found; run a full export first")
+        print("Loading contacts...")
+        changed = update_store(load_contacts())
+        print(f"  {len(changed)} months updated" + (f": {', '.join(changed)}" if changed else ""))
+        return
+
     print("Loading contacts...")
     contacts = load_contacts()
     print(f"  {len(contacts)} contact mappings loaded\n")
 
     print("Querying iMessage database for detailed stats...")
     conn = sqlite3.connect(IMESSAGE_DB)
+    # Read everything from one snapshot, so the store's ROWID watermark matches the
+    # scan exactly and update_store() never folds a message in twice
+    conn.execute("BEGIN")
+    last_rowid = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+    # Resolve each 1:1 chat's participant once up front instead of once per message row
+    dm_handles = dict(conn.execute(f"WITH {DM_CHATS_CTE} SELECT chat_id, handle FROM dm_chats"))
+    handle_names = resolve_names(dm_handles.values(), contacts)
+    chat_names = {
+        chat_id: handle_names[handle]
+        for chat_id, handle in dm_handles.items()
+        if handle_names[handle] != handle  # Skip unresolved
+    }
 
     # Get date range from user's actual messages
     min_date, max_date = get_date_range(conn)
     start_year, start_month = min_date.year, min_date.month
-    end_year = max_date.year
-    end_month = max_date.month + 1
-    if end_month > 12:
-        end_month = 1
-        end_year += 1
+    end_year, end_month = divmod(store_end_month(max_date.year * 12 + max_date.month - 1), 12)
+    end_month += 1
 
     print(f"  Message date range: {min_date.strftime('%Y-%m')} to {max_date.strftime('%Y-%m')}\n")
 
     # Get start timestamp based on actual first message
     start_ns = (int(min_date.timestamp()) - APPLE_EPOCH_OFFSET) * 1_000_000_000
 
-    # ============================================
-    # 1. Sent vs Received by month per contact
-    # ============================================
-    print("  Fetching sent/received data...")
-
-    sent_recv_query = """
-        WITH chat_participant_count AS (
-            SELECT chat_id, COUNT(DISTINCT handle_id) as participant_count
-            FROM chat_handle_join
-            GROUP BY chat_id
-        )
-        SELECT
-            h.id AS handle_id,
-            m.is_from_me,
-            m.date
-        FROM message m
-        JOIN chat_message_join cmj ON cmj.message_id = m.ROWID
-        JOIN chat_handle_join chj ON chj.chat_id = cmj.chat_id
-        JOIN handle h ON h.ROWID = chj.handle_id
-        JOIN chat_participant_count cpc ON cpc.chat_id = cmj.chat_id
-        WHERE cpc.participant_count = 1 AND m.date >= ?
-        ORDER BY h.id, m.date
-    """
-
-    # Aggregate by contact and month
-    sent_recv_data = defaultdict(lambda: defaultdict(lambda: {"sent": 0, "recv": 0}))
-
-    for handle, is_from_me, date_ns in conn.execute(sent_recv_query, (start_ns,)):
-        name = resolve_name(handle, contacts)
-        if name == handle:  # Skip unresolved
-            continue
-        dt = ns_to_datetime(date_ns)
-        if dt is None:
-            continue
-        month_key = dt.strftime("%Y-%m")
-        if is_from_me:
-            sent_recv_data[name][month_key]["sent"] += 1
-        else:
-            sent_recv_data[name][month_key]["recv"] += 1
+    # Months are indexes into month_tuples; labels are only built at output time
+    month_tuples = generate_months(start_year, start_month, end_year, end_month)
+    day_starts, day_info = build_local_days(month_tuples)
+    n_days = len(day_info)
 
     # ============================================
-    # 2. Response times per contact per month
+    # Single pass over every 1:1 message, ordered by chat and date.
+    # Feeds sent/received counts, monthly totals, response times
+    # (previous message in the same chat) and the day/hour grid at once.
     # ============================================
-    print("  Calculating response times...")
-
-    response_query = """
-        WITH chat_participant_count AS (
-            SELECT chat_id, COUNT(DISTINCT handle_id) as participant_count
-            FROM chat_handle_join
-            GROUP BY chat_id
-        )
+    print("  Scanning 1:1 messages...")
+
+    # Ordered by (chat_id, message_date) so response times can compare consecutive
+    # rows. The IN list is walked in chat_id order and each chat is read through
+    # chat.db's (chat_id, message_date, message_id) index, so no sort is needed.
+    dm_query = f"""
+        WITH {DM_CHATS_CTE}
         SELECT
-            h.id AS handle_id,
+            cmj.chat_id,
             m.is_from_me,
-            m.date,
-            cmj.chat_id
-        FROM message m
-        JOIN chat_message_join cmj ON cmj.message_id = m.ROWID
-        JOIN chat_handle_join chj ON chj.chat_id = cmj.chat_id
-        JOIN handle h ON h.ROWID = chj.handle_id
-        JOIN chat_participant_count cpc ON cpc.chat_id = cmj.chat_id
-        WHERE cpc.participant_count = 1 AND m.date >= ?
-        ORDER BY cmj.chat_id, m.date
+            m.date
+        FROM chat_message_join cmj
+        JOIN message m ON m.ROWID = cmj.message_id
+        WHERE cmj.chat_id IN (SELECT chat_id FROM dm_chats) AND m.date >= ?
+        ORDER BY cmj.chat_id, cmj.message_date
     """
+    if profile:
+        print_query_plan(conn, dm_query, (start_ns,))
+    scan_started = time.perf_counter()
 
-    # Group messages by chat
-    chat_messages = defaultdict(list)
-    chat_to_name = {}
+    # 1. Sent vs Received by day index per contact; months (and the store's
+    #    week/month/quarter/year rollups) are summed from these after the scan
+    daily_counts = defaultdict(lambda: defaultdict(lambda: [0, 0]))
 
-    for handle, is_from_me, date_ns, chat_id in conn.execute(response_query, (start_ns,)):
-        name = resolve_name(handle, contacts)
-        if name == handle:
-            continue
-        dt = ns_to_datetime(date_ns)
-        if dt is None:
-            continue
-        chat_messages[chat_id].append({
-            "is_from_me": is_from_me,
-            "datetime": dt,
-            "name": name
-        })
-        chat_to_name[chat_id] = name
-
-    # Calculate response times
-    # my_response_times: time for me to reply after they message
-    # their_response_times: time for them to reply after I message
-    response_times = defaultdict(lambda: defaultdict(lambda: {
-        "my_response_times": [],
-        "their_response_times": []
-    }))
-
-    for chat_id, messages in chat_messages.items():
-        name = chat_to_name[chat_id]
-        messages.sort(key=lambda x: x["datetime"])
-
-        for i in range(1, len(messages)):
-            prev = messages[i - 1]
-            curr = messages[i]
-
-            # Calculate time difference in minutes
-            time_diff = (curr["datetime"] - prev["datetime"]).total_seconds() / 60
-
-            # Only count responses within 24 hours
-            if time_diff > 24 * 60:
-                continue
-
-            month_key = curr["datetime"].strftime("%Y-%m")
-
-            if prev["is_from_me"] == 0 and curr["is_from_me"] == 1:
-                # They messaged, I replied
-                response_times[name][month_key]["my_response_times"].append(time_diff)
-            elif prev["is_from_me"] == 1 and curr["is_from_me"] == 0:
-                # I messaged, they replied
-                response_times[name][month_key]["their_response_times"].append(time_diff)
+    # 2. Response times per contact per month index, in minutes, as fixed-size sketches
+    response_times = defaultdict(lambda: defaultdict(new_response_cell))
 
-    # ============================================
     # 3. Day/Hour heatmap per contact
-    # ============================================
-    print("  Building day/hour heatmap data...")
-
     day_hour_data = defaultdict(lambda: defaultdict(lambda: [[0]*24 for _ in range(7)]))
 
-    day_hour_query = """
-        WITH chat_participant_count AS (
-            SELECT chat_id, COUNT(DISTINCT handle_id) as participant_count
-            FROM chat_handle_join
-            GROUP BY chat_id
-        )
-        SELECT
-            h.id AS handle_id,
-            m.date
-        FROM message m
-        JOIN chat_message_join cmj ON cmj.message_id = m.ROWID
-        JOIN chat_handle_join chj ON chj.chat_id = cmj.chat_id
-        JOIN handle h ON h.ROWID = chj.handle_id
-        JOIN chat_participant_count cpc ON cpc.chat_id = cmj.chat_id
-        WHERE cpc.participant_count = 1 AND m.date >= ?
-    """
+    prev_chat_id = prev_ns = prev_from_me = None
 
-    for handle, date_ns in conn.execute(day_hour_query, (start_ns,)):
-        name = resolve_name(handle, contacts)
-        if name == handle:
+    for chat_id, is_from_me, date_ns in conn.execute(dm_query, (start_ns,)):
+        name = chat_names.get(chat_id)
+        if name is None:
             continue
-        dt = ns_to_datetime(date_ns)
-        if dt is None:
+        day_idx = bisect_right(day_starts, date_ns) - 1
+        if day_idx < 0 or day_idx >= n_days:
             continue
+        month_idx, year, day_of_week, is_24h = day_info[day_idx]
 
-        day_of_week = dt.weekday()  # 0=Monday, 6=Sunday
-        hour = dt.hour
-        year = dt.year
+        daily_counts[name][day_idx][0 if is_from_me else 1] += 1
 
+        if chat_id == prev_chat_id:
+            add_response_gap(response_times[name][month_idx], prev_from_me, is_from_me, prev_ns, date_ns)
+        prev_chat_id, prev_ns, prev_from_me = chat_id, date_ns, is_from_me
+
+        if is_24h:
+            hour = (date_ns - day_starts[day_idx]) // HOUR_NS
+        else:
+            hour = ns_to_datetime(date_ns).hour
         day_hour_data[name][year][day_of_week][hour] += 1
 
     conn.close()
+    if profile:
+        print(f"  Scan took {time.perf_counter() - scan_started:.2f}s")
 
     # ============================================
     # Write CSV files
     # ============================================
 
-    # Get all months based on actual data range
-    months = []
-    for year in range(start_year, end_year + 1):
-        for month in range(1, 13):
-            if (year, month) >= (start_year, start_month) and (year, month) <= (end_year, end_month):
-                months.append(f"{year}-{month:02d}")
+    months = [f"{y}-{m:02d}" for y, m in month_tuples]
 
-    # Get top contacts by total messages
-    contact_totals = {}
-    for name, month_data in sent_recv_data.items():
-        total = sum(d["sent"] + d["recv"] for d in month_data.values())
-        contact_totals[name] = total
+    sent_counts = defaultdict(lambda: [0] * len(month_tuples))
+    recv_counts = defaultdict(lambda: [0] * len(month_tuples))
+    first_day = date(start_year, start_month, 1).toordinal()
+    daily = {}
+    for name, days in daily_counts.items():
+        sent, recv = sent_counts[name], recv_counts[name]
+        for day_idx, cell in days.items():
+            month_idx = day_info[day_idx][0]
+            sent[month_idx] += cell[0]
+            recv[month_idx] += cell[1]
+            daily[(first_day + day_idx, name)] = cell
 
-    top_contacts = sorted(contact_totals.keys(), key=lambda x: contact_totals[x], reverse=True)[:50]
+    # Get top contacts by total messages
+    contact_totals = {
+        name: sum(sent_counts[name]) + sum(recv_counts[name])
+        for name in set(sent_counts) | set(recv_counts)
+    }
+
+    ranked = sorted(contact_totals.keys(), key=lambda x: (-contact_totals[x], x))
+    top_contacts = ranked[:args.top]
+    monthly_results = [
+        {
+            "name": name,
+            "total_dm": contact_totals[name],
+            "months": [s + r for s, r in zip(sent_counts[name], recv_counts[name])],
+            "sent": sent_counts[name],
+            "recv": recv_counts[name],
+        }
+        for name in ranked
+    ]
+    # The CSVs keep --top; the store below gets every contact
+    top_results = monthly_results[:args.top]
+    wide = args.format in ("wide", "both")
+
+    # 0. Monthly/quarterly DM totals, from the same counts
+    print("")
+    if wide:
+        write_monthly_csvs(top_results, month_tuples)
+    if args.format in ("long", "both"):
+        write_long_csvs(top_results, month_tuples)
 
     # 1. Write sent/received CSV
-    print("\nWriting message_stats_sent_recv.csv...")
-    with open("message_stats_sent_recv.csv", "w", newline="") as f:
-        # Format: name, total_sent, total_recv, YYYY-MM_sent, YYYY-MM_recv, ...
-        fieldnames = ["name", "total_sent", "total_recv"]
-        for m in months:
-            fieldnames.extend([f"{m}_sent", f"{m}_recv"])
-
-        writer = csv.writer(f)
-        writer.writerow(fieldnames)
+    if wide:
+        print("Writing message_stats_sent_recv.csv...")
+        write_sent_recv_csv(top_results, months)
+
+    # 2. Response time quantiles per contact-month, for every contact
+    response_rows = []
+    for name in ranked:
+        for month_idx in sorted(response_times[name]):
+            values = response_values(response_times[name][month_idx])
+            if values:
+                response_rows.append((name, month_idx, *values))
+
+    print(f"Writing {STORE_PATH}...")
+    write_store(monthly_results, month_tuples, daily, response_rows, last_rowid)
+    print(f"  {len(ranked)} contacts (all, for the /api endpoints in chart/serve.py)")
 
-        for name in top_contacts:
-            total_sent = sum(sent_recv_data[name][m]["sent"] for m in months)
-            total_recv = sum(sent_recv_data[name][m]["recv"] for m in months)
-            row = [name, total_sent, total_recv]
-            for m in months:
-                row.extend([sent_recv_data[name][m]["sent"], sent_recv_data[name][m]["recv"]])
-            writer.writerow(row)
-
-    # 2. Write response times CSV
     print("Writing message_response_times.csv...")
+    exported = set(top_contacts)
     with open("message_response_times.csv", "w", newline="") as f:
-        # Format: name, month, my_median_mins, their_median_mins, my_count, their_count
+        # Format: name, month, my_median_mins, their_median_mins, my_count, their_count,
+        #         my_p90_mins, their_p90_mins, my_p99_mins, their_p99_mins
         writer = csv.writer(f)
-        writer.writerow(["name", "month", "my_median_mins", "their_median_mins", "my_count", "their_count"])
-
-        for name in top_contacts:
-            for m in months:
-                my_times = response_times[name][m]["my_response_times"]
-                their_times = response_times[name][m]["their_response_times"]
-
-                my_median = sorted(my_times)[len(my_times)//2] if my_times else None
-                their_median = sorted(their_times)[len(their_times)//2] if their_times else None
-
-                if my_times or their_times:
-                    writer.writerow([
-                        name, m,
-                        round(my_median, 1) if my_median else "",
-                        round(their_median, 1) if their_median else "",
-                        len(my_times),
-                        len(their_times)
-                    ])
+        writer.writerow([
+            "name", "month", "my_median_mins", "their_median_mins", "my_count", "their_count",
+            "my_p90_mins", "their_p90_mins", "my_p99_mins", "their_p99_mins"
+        ])
+        for row in response_rows:
+            if row[0] in exported:
+                writer.writerow([row[0], months[row[1]], *("" if v is None else v for v in row[2:])])
 
     # 3. Write day/hour heatmap CSV (as JSON per contact)
     print("Writing message_day_hour.json...")
@@ -366,6 +502,18 @@ def main():
     with open("message_day_hour.json", "w") as f:
         json.dump(day_hour_output, f)
 
+    if args.compact_dayhour:
+        print(f"Writing {DAY_HOUR_BIN} + {DAY_HOUR_INDEX}...")
+        write_day_hour_compact(day_hour_output)
+    else:
+        # Never leave a stale compact copy behind
+        for path in (DAY_HOUR_BIN, DAY_HOUR_INDEX):
+            if os.path.exists(path):
+                os.remove(path)
+    # dayhour.js reads this first and requests only the format that exists
+    with open(DAY_HOUR_FORMAT, "w") as f:
+        json.dump({"format": "compact" if args.compact_dayhour else "json"}, f)
+
     print(f"\nDone! Generated data for {len(top_contacts)} contacts.")
 
 
@@ -1,83 +1,38 @@
 #!/usr/bin/env python3
 """
 Script to query iMessage stats with monthly DM totals by contact.
-Outputs: message_stats_monthly.csv
-Usage: python3 query_messages_monthly.py
+Outputs: message_stats_monthly.csv, message_stats_quarterly.csv
+  --format long: message_contacts.csv + message_stats_long.csv (sparse, non-zero cells only)
+  --archive: read message_archive/ (see message_archive.py) instead of chat.db, so no
+  Full Disk Access is needed once the archive is written
+Usage: python3 query_messages_monthly.py [--top N|all] [--format wide|long|both] [--archive [DIR]]
+
+query_messages_detailed.py writes the same two files (plus the detailed datasets)
+from its single pass; this script is the quick monthly-only export.
 """
 
+import argparse
 import csv
-import glob
 import os
-import re
 import sqlite3
 from datetime import datetime
 
-IMESSAGE_DB = os.path.expanduser("~/Library/Messages/chat.db")
-ADDRESSBOOK_DIR = os.path.expanduser("~/Library/Application Support/AddressBook")
+from contact_index import load_contacts, resolve_names
 
+IMESSAGE_DB = os.path.expanduser("~/Library/Messages/chat.db")
 
-def load_contacts():
-    """Load contacts from macOS AddressBook."""
-    contacts = {}
-    db_paths = glob.glob(
-        os.path.join(ADDRESSBOOK_DIR, "Sources", "*", "AddressBook-v22.abcddb")
-    )
-    main_db = os.path.join(ADDRESSBOOK_DIR, "AddressBook-v22.abcddb")
-    if os.path.exists(main_db):
-        db_paths.append(main_db)
-
-    for db_path in db_paths:
-        try:
-            conn = sqlite3.connect(db_path)
-            # Get names
-            people = {}
-            for row in conn.execute(
-                "SELECT ROWID, ZFIRSTNAME, ZLASTNAME FROM ZABCDRECORD WHERE ZFIRSTNAME IS NOT NULL OR ZLASTNAME IS NOT NULL"
-            ):
-                name = f"{row[1] or ''} {row[2] or ''}".strip()
-                if name:
-                    people[row[0]] = name
-
-            # Map phone numbers to names
-            for owner, phone in conn.execute(
-                "SELECT ZOWNER, ZFULLNUMBER FROM ZABCDPHONENUMBER WHERE ZFULLNUMBER IS NOT NULL"
-            ):
-                if owner in people:
-                    digits = re.sub(r"\D", "", str(phone))
-                    if digits:
-                        contacts[digits] = people[owner]
-                        if len(digits) >= 10:
-                            contacts[digits[-10:]] = people[owner]
-                        if len(digits) == 11 and digits.startswith("1"):
-                            contacts[digits[1:]] = people[owner]
-
-            # Map emails to names
-            for owner, email in conn.execute(
-                "SELECT ZOWNER, ZADDRESS FROM ZABCDEMAILADDRESS WHERE ZADDRESS IS NOT NULL"
-            ):
-                if owner in people:
-                    contacts[email.lower().strip()] = people[owner]
-
-            conn.close()
-        except Exception:
-            pass
-
-    return contacts
-
-
-def resolve_name(handle, contacts):
-    """Resolve a handle (phone/email) to a contact name."""
-    if "@" in handle:
-        return contacts.get(handle.lower().strip(), handle)
-
-    digits = re.sub(r"\D", "", str(handle))
-    if digits in contacts:
-        return contacts[digits]
-    if len(digits) == 11 and digits.startswith("1") and digits[1:] in contacts:
-        return contacts[digits[1:]]
-    if len(digits) >= 10 and digits[-10:] in contacts:
-        return contacts[digits[-10:]]
-    return handle
+# 1:1 chats with their single participant's handle. Exporter queries start from
+# this dimension so group-chat messages never enter the join (and are never
+# multiplied by group size) before being filtered out. chat_handle_join is unique
+# on (chat_id, handle_id), so COUNT(*) needs no DISTINCT temp B-tree.
+DM_CHATS_CTE = """
+    dm_chats AS (
+        SELECT chj.chat_id, MIN(h.id) AS handle
+        FROM chat_handle_join chj
+        JOIN handle h ON h.ROWID = chj.handle_id
+        GROUP BY chj.chat_id
+        HAVING COUNT(*) = 1
+    )"""
 
 
 def generate_months(start_year, start_month, end_year, end_month):
@@ -93,21 +48,15 @@ def generate_months(start_year, start_month, end_year, end_month):
     return months
 
 
-def get_month_timestamps(year, month):
-    """Get iMessage timestamps (nanoseconds since 2001-01-01) for start and end of a month."""
-    # Apple Cocoa epoch is 978307200 seconds after Unix epoch
-    APPLE_EPOCH_OFFSET = 978307200
-
-    start = datetime(year, month, 1)
-    if month == 12:
-        end = datetime(year + 1, 1, 1)
-    else:
-        end = datetime(year, month + 1, 1)
-
-    # Convert to iMessage format: nanoseconds since 2001-01-01
-    start_ns = (int(start.timestamp()) - APPLE_EPOCH_OFFSET) * 1_000_000_000
-    end_ns = (int(end.timestamp()) - APPLE_EPOCH_OFFSET) * 1_000_000_000
-    return start_ns, end_ns
+def month_bucket_sql(date_column="m.date"):
+    """
+    SQL expression mapping an iMessage timestamp to a local-time integer month bucket
+    (year * 12 + month - 1), so one GROUP BY replaces a CASE column per month.
+    """
+    return (
+        f"(CAST(strftime('%Y', {date_column} / 1000000000 + 978307200, 'unixepoch', 'localtime') AS INTEGER) * 12"
+        f" + CAST(strftime('%m', {date_column} / 1000000000 + 978307200, 'unixepoch', 'localtime') AS INTEGER) - 1)"
+    )
 
 
 def get_date_range(conn):
@@ -126,88 +75,14 @@ def get_date_range(conn):
     return min_date, max_date
 
 
-def main():
-    print("Loading contacts...")
-    contacts = load_contacts()
-    print(f"  {len(contacts)} contact mappings loaded\n")
-
-    print("Querying iMessage database...")
-    conn = sqlite3.connect(IMESSAGE_DB)
-
-    # Get date range from user's actual messages
-    min_date, max_date = get_date_range(conn)
-    start_year, start_month = min_date.year, min_date.month
-    # End at next month to include current month's data
-    end_year = max_date.year
-    end_month = max_date.month + 1
-    if end_month > 12:
-        end_month = 1
-        end_year += 1
-
-    print(f"  Message date range: {min_date.strftime('%Y-%m')} to {max_date.strftime('%Y-%m')}\n")
-
-    # Generate month columns based on actual data range
-    months = generate_months(start_year, start_month, end_year, end_month)
-    month_labels = [f"{y}-{m:02d}" for y, m in months]
-
-    # Build dynamic SQL for monthly counts
-    month_cases = []
-    for y, m in months:
-        start_ts, end_ts = get_month_timestamps(y, m)
-        label = f"{y}_{m:02d}"
-        month_cases.append(
-            f"SUM(CASE WHEN cpc.participant_count = 1 AND m.date >= {start_ts} AND m.date < {end_ts} THEN 1 ELSE 0 END) AS dm_{label}"
-        )
-
-    month_sql = ",\n            ".join(month_cases)
-
-    query = f"""
-        WITH chat_participant_count AS (
-            SELECT chat_id, COUNT(DISTINCT handle_id) as participant_count
-            FROM chat_handle_join
-            GROUP BY chat_id
-        )
-        SELECT
-            h.id AS recipient_id,
-            SUM(CASE WHEN cpc.participant_count = 1 THEN 1 ELSE 0 END) AS total_dm,
-            {month_sql}
-        FROM message m
-        JOIN chat_message_join cmj ON cmj.message_id = m.ROWID
-        JOIN chat_handle_join chj ON chj.chat_id = cmj.chat_id
-        JOIN handle h ON h.ROWID = chj.handle_id
-        JOIN chat_participant_count cpc ON cpc.chat_id = cmj.chat_id
-        GROUP BY h.id
-        ORDER BY total_dm DESC
-        LIMIT 100
+def write_monthly_csvs(results, months):
     """
-
-    rows = conn.execute(query).fetchall()
-    conn.close()
-
-    # Build results with resolved names, aggregating by contact name
-    by_name = {}
-    for row in rows:
-        handle = row[0]
-        total_dm = row[1]
-        monthly_counts = row[2:]
-
-        name = resolve_name(handle, contacts)
-        # Skip if no contact match
-        if name == handle:
-            continue
-
-        if name not in by_name:
-            by_name[name] = {
-                "name": name,
-                "total_dm": 0,
-                "months": [0] * len(months),
-            }
-        by_name[name]["total_dm"] += total_dm
-        for i, count in enumerate(monthly_counts):
-            by_name[name]["months"][i] += count
-
-    # Sort by total_dm descending and take top 50
-    results = sorted(by_name.values(), key=lambda x: x["total_dm"], reverse=True)[:50]
+    Write message_stats_monthly.csv and message_stats_quarterly.csv.
+    results: [{"name", "total_dm", "months": [count per entry of months]}]
+    months: [(year, month)] column order, as returned by generate_months().
+    """
+    month_labels = [f"{y}-{m:02d}" for y, m in months]
+    (start_year, start_month), (end_year, end_month) = months[0], months[-1]
 
     # Write monthly CSV
     csv_path = "message_stats_monthly.csv"
@@ -221,36 +96,24 @@ def main():
     print(f"Results written to {csv_path}")
     print(f"  {len(results)} contacts, {len(month_labels)} month columns")
 
-    # Generate quarterly data based on actual date range
-    quarters = []
-    quarter_labels = []
-    end_quarter = (end_month - 1) // 3 + 1
-    for y in range(start_year, end_year + 1):
-        for q in range(1, 5):
-            quarters.append((y, q))
-            quarter_labels.append(f"{y}-Q{q}")
-    # Filter to valid range
+    # Roll the same month arrays up into quarters (no second query)
     start_quarter = (start_month - 1) // 3 + 1
-    quarters = [(y, q) for y, q in quarters if (y, q) >= (start_year, start_quarter) and (y, q) <= (end_year, end_quarter)]
+    end_quarter = (end_month - 1) // 3 + 1
+    quarters = [
+        (y, q)
+        for y in range(start_year, end_year + 1)
+        for q in range(1, 5)
+        if (start_year, start_quarter) <= (y, q) <= (end_year, end_quarter)
+    ]
     quarter_labels = [f"{y}-Q{q}" for y, q in quarters]
+    first_quarter = start_year * 4 + start_quarter - 1
+    month_to_quarter = [y * 4 + (m - 1) // 3 - first_quarter for y, m in months]
 
-    # Map months to quarters
-    def month_to_quarter_idx(month_label):
-        y, m = int(month_label[:4]), int(month_label[5:7])
-        q = (m - 1) // 3 + 1
-        try:
-            return quarters.index((y, q))
-        except ValueError:
-            return None
-
-    # Aggregate monthly data to quarterly
     quarterly_results = []
     for r in results:
         q_totals = [0] * len(quarters)
-        for i, month_val in enumerate(r["months"]):
-            q_idx = month_to_quarter_idx(month_labels[i])
-            if q_idx is not None:
-                q_totals[q_idx] += month_val
+        for q_idx, month_val in zip(month_to_quarter, r["months"]):
+            q_totals[q_idx] += month_val
         quarterly_results.append({
             "name": r["name"],
             "total_dm": r["total_dm"],
@@ -270,5 +133,179 @@ def main():
     print(f"  {len(quarterly_results)} contacts, {len(quarter_labels)} quarter columns")
 
 
+def write_long_csvs(results, months):
+    """
+    Write the sparse long format, sized by non-zero cells rather than contacts x months:
+      message_contacts.csv: contact_id, name, total_sent, total_recv
+      message_stats_long.csv: contact_id, period, sent, recv (only non-zero cells)
+    results: [{"name", "sent": [...], "recv": [...]}] in rank order; contact_id is the 1-based rank.
+    """
+    month_labels = [f"{y}-{m:02d}" for y, m in months]
+
+    with open("message_contacts.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["contact_id", "name", "total_sent", "total_recv"])
+        for contact_id, r in enumerate(results, 1):
+            writer.writerow([contact_id, r["name"], sum(r["sent"]), sum(r["recv"])])
+
+    cells = 0
+    with open("message_stats_long.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["contact_id", "period", "sent", "recv"])
+        for contact_id, r in enumerate(results, 1):
+            for label, sent, recv in zip(month_labels, r["sent"], r["recv"]):
+                if sent or recv:
+                    writer.writerow([contact_id, label, sent, recv])
+                    cells += 1
+    print("Results written to message_contacts.csv, message_stats_long.csv")
+    print(f"  {len(results)} contacts, {cells} non-zero contact-months")
+
+
+def top_arg(value):
+    """argparse type for --top: a positive contact count, or 'all' (returned as None)."""
+    if value == "all":
+        return None
+    try:
+        top = int(value)
+    except ValueError:
+        top = 0
+    if top < 1:
+        raise argparse.ArgumentTypeError("expected a positive number or 'all'")
+    return top
+
+
+def add_output_args(parser):
+    """Output options shared by the exporters."""
+    parser.add_argument("--top", type=top_arg, default=50, metavar="N|all",
+                        help="number of contacts to export (default: 50)")
+    parser.add_argument("--format", choices=["wide", "long", "both"], default="wide",
+                        help="wide CSVs (one column per month), sparse long CSVs, or both")
+
+
+def archive_counts(path):
+    """
+    The main() query's per-contact month arrays, read from a message_archive.py archive.
+    Returns (by_name, months) in the shape main() builds from chat.db.
+    """
+    # Imported here: message_archive.py imports DM_CHATS_CTE from this module
+    from message_archive import Archive
+
+    archive = Archive(path)
+    dates = archive.date_range()
+    if dates:
+        min_date, max_date = (datetime.fromtimestamp(ns / 1_000_000_000 + 978307200) for ns in dates)
+    else:
+        min_date, max_date = datetime(2019, 1, 1), datetime.now()
+    months = month_range(min_date, max_date)
+    # Local-time month boundaries in chat.db nanoseconds, one past the last month
+    end_year, end_month = divmod(months[-1][0] * 12 + months[-1][1], 12)
+    month_starts = [int((datetime(y, m, 1).timestamp() - 978307200) * 1_000_000_000)
+                    for y, m in months + [(end_year, end_month + 1)]]
+
+    by_name = {}
+    for name, (sent, total) in archive.dm_monthly(month_starts).items():
+        by_name[name] = {
+            "name": name,
+            "total_dm": sum(total),
+            "months": total,
+            "sent": sent,
+            "recv": [t - s for s, t in zip(sent, total)],
+        }
+    return by_name, months
+
+
+def month_range(min_date, max_date):
+    """Month columns from min_date's month to the month after max_date's."""
+    print(f"  Message date range: {min_date.strftime('%Y-%m')} to {max_date.strftime('%Y-%m')}\n")
+    # End at next month to include current month's data
+    end_year = max_date.year
+    end_month = max_date.month + 1
+    if end_month > 12:
+        end_month = 1
+        end_year += 1
+    return generate_months(min_date.year, min_date.month, end_year, end_month)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export monthly DM totals from iMessage")
+    add_output_args(parser)
+    parser.add_argument("--archive", nargs="?", const="message_archive", default=None, metavar="DIR",
+                        help="read message_archive/ instead of chat.db (see message_archive.py)")
+    args = parser.parse_args()
+
+    if args.archive:
+        print(f"Reading {args.archive}/...")
+        by_name, months = archive_counts(args.archive)
+        write_results(args, by_name, months)
+        return
+
+    print("Loading contacts...")
+    contacts = load_contacts()
+    print(f"  {len(contacts)} contact mappings loaded\n")
+
+    print("Querying iMessage database...")
+    conn = sqlite3.connect(IMESSAGE_DB)
+
+    # Get date range from user's actual messages
+    min_date, max_date = get_date_range(conn)
+    # Generate month columns based on actual data range
+    months = month_range(min_date, max_date)
+    first_bucket = min_date.year * 12 + min_date.month - 1
+
+    # One row per (contact, month) with counts; pivoted to columns in Python below
+    query = f"""
+        WITH {DM_CHATS_CTE}
+        SELECT
+            dc.handle AS recipient_id,
+            {month_bucket_sql()} AS month_bucket,
+            SUM(m.is_from_me) AS sent_count,
+            COUNT(*) AS dm_count
+        FROM dm_chats dc
+        JOIN chat_message_join cmj ON cmj.chat_id = dc.chat_id
+        JOIN message m ON m.ROWID = cmj.message_id
+        GROUP BY dc.handle, month_bucket
+    """
+
+    rows = conn.execute(query).fetchall()
+    conn.close()
+    names = resolve_names({row[0] for row in rows}, contacts)
+
+    # Pivot (contact, month, count) rows into per-contact month arrays,
+    # aggregating handles that resolve to the same contact name
+    by_name = {}
+    for handle, bucket, sent, count in rows:
+        name = names[handle]
+        # Skip if no contact match
+        if name == handle:
+            continue
+
+        if name not in by_name:
+            by_name[name] = {
+                "name": name,
+                "total_dm": 0,
+                "months": [0] * len(months),
+                "sent": [0] * len(months),
+                "recv": [0] * len(months),
+            }
+        by_name[name]["total_dm"] += count
+        if bucket is not None and 0 <= bucket - first_bucket < len(months):
+            by_name[name]["months"][bucket - first_bucket] += count
+            by_name[name]["sent"][bucket - first_bucket] += sent
+            by_name[name]["recv"][bucket - first_bucket] += count - sent
+
+    write_results(args, by_name, months)
+
+
+def write_results(args, by_name, months):
+    """Rank the per-contact month arrays and write the CSVs --format asks for."""
+    # Sort by total_dm descending and take the top N (all with --top all)
+    results = sorted(by_name.values(), key=lambda x: (-x["total_dm"], x["name"]))[:args.top]
+
+    if args.format in ("wide", "both"):
+        write_monthly_csvs(results, months)
+    if args.format in ("long", "both"):
+        write_long_csvs(results, months)
+
+
 if __name__ == "__main__":
     main()
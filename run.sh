@@ -4,6 +4,8 @@
 # Use this to refresh data and restart the dashboard
 #
 # Usage: cd ~/imessage-dashboard && ./run.sh
+#        ./run.sh --refresh   # re-export all history first
+#        ./run.sh --live      # keep charts updated as new messages arrive
 #
 
 set -e
@@ -24,14 +26,17 @@ echo ""
 if [ "$1" = "--refresh" ] || [ "$1" = "-r" ]; then
     echo -e "${BOLD}Refreshing message data...${NC}"
     echo ""
-    python3 query_messages_monthly.py
-    echo ""
     python3 query_messages_detailed.py
     echo ""
 fi
 
+SERVE_ARGS=""
+if [ "$1" = "--live" ]; then
+    SERVE_ARGS="--live"
+fi
+
 echo -e "${GREEN}Starting dashboard at http://localhost:8000/chart/${NC}"
 echo "Press Ctrl+C to stop"
 echo ""
 
-python3 chart/serve.py
+python3 chart/serve.py $SERVE_ARGS
@@ -122,13 +122,18 @@ CB="?$(date +%s)"
 
 # Download Python scripts
 echo "  Downloading data scripts..."
+curl -fsSL "$BASE_URL/contact_index.py$CB" -o contact_index.py
+curl -fsSL "$BASE_URL/quantile_sketch.py$CB" -o quantile_sketch.py
+curl -fsSL "$BASE_URL/aggregate_store.py$CB" -o aggregate_store.py
 curl -fsSL "$BASE_URL/query_messages_monthly.py$CB" -o query_messages_monthly.py
 curl -fsSL "$BASE_URL/query_messages_detailed.py$CB" -o query_messages_detailed.py
+curl -fsSL "$BASE_URL/message_archive.py$CB" -o message_archive.py
 
 # Download chart files
 echo "  Downloading chart files..."
 curl -fsSL "$BASE_URL/chart/serve.py$CB" -o chart/serve.py
 curl -fsSL "$BASE_URL/chart/index.html$CB" -o chart/index.html
+curl -fsSL "$BASE_URL/chart/live.js$CB" -o chart/live.js
 curl -fsSL "$BASE_URL/chart/chart.js$CB" -o chart/chart.js
 curl -fsSL "$BASE_URL/chart/race.html$CB" -o chart/race.html
 curl -fsSL "$BASE_URL/chart/race.js$CB" -o chart/race.js
@@ -154,8 +159,6 @@ echo -e "${BOLD}Step 4/4: Analyzing your messages...${NC}"
 echo "(This may take 30-60 seconds)"
 echo ""
 
-$PYTHON_CMD query_messages_monthly.py
-echo ""
 $PYTHON_CMD query_messages_detailed.py
 echo ""
 
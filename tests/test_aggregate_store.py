@@ -0,0 +1,100 @@
+"""Folding an incremental update must leave the store as a full export of the same data."""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import aggregate_store  # noqa: E402
+from query_messages_monthly import generate_months  # noqa: E402
+
+
+def export(path, daily, latest):
+    """Write the store the way query_messages_detailed.py does for messages up to latest."""
+    end_year, end_month = divmod(aggregate_store.store_end_month(latest.year * 12 + latest.month - 1), 12)
+    months = generate_months(2024, 1, end_year, end_month + 1)
+    names = sorted({name for _, name in daily})
+    aggregate_store.write_store([{"name": name} for name in names], months, daily, [], 0, path)
+
+
+class FoldMatchesExportTest(unittest.TestCase):
+    def test_fold_then_compare_with_fresh_export(self):
+        before = {
+            (date(2024, 1, 15).toordinal(), "Alice"): [3, 2],
+            (date(2024, 2, 3).toordinal(), "Bob"): [1, 4],
+        }
+        new = {
+            (date(2024, 2, 20).toordinal(), "Alice"): [1, 0],
+            (date(2024, 4, 9).toordinal(), "Bob"): [2, 2],
+        }
+        combined = dict(before)
+        for key, (sent, recv) in new.items():
+            old = combined.get(key, [0, 0])
+            combined[key] = [old[0] + sent, old[1] + recv]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            folded, fresh = os.path.join(tmp, "folded.db"), os.path.join(tmp, "fresh.db")
+            export(folded, before, date(2024, 2, 3))
+            conn = sqlite3.connect(folded)
+            aggregate_store.fold_updates(conn, new, {}, 10)
+            conn.close()
+            export(fresh, combined, date(2024, 4, 9))
+
+            folded_conn, fresh_conn = aggregate_store.connect(folded), aggregate_store.connect(fresh)
+            try:
+                self.assertEqual(aggregate_store.meta(folded_conn), aggregate_store.meta(fresh_conn))
+                self.assertEqual(aggregate_store.monthly(folded_conn, top="all"),
+                                 aggregate_store.monthly(fresh_conn, top="all"))
+                self.assertEqual(aggregate_store.series(folded_conn, top="all", level="day"),
+                                 aggregate_store.series(fresh_conn, top="all", level="day"))
+            finally:
+                folded_conn.close()
+                fresh_conn.close()
+
+
+class ResponseCandidatesTest(unittest.TestCase):
+    def test_only_the_busiest_contacts_are_ranked(self):
+        busy = [f"Busy{i:02d}" for i in range(aggregate_store.RESPONSE_CANDIDATES)]
+        day = date(2024, 1, 10).toordinal()
+        daily = {(day, name): [50, 50] for name in busy}
+        daily[(day, "Rare")] = [1, 1]
+        rows = [(name, 0, 10.0 + i, 10.0, 20, 20, None, None, None, None) for i, name in enumerate(busy)]
+        rows.append(("Rare", 0, 0.1, 0.1, 1, 1, None, None, None, None))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "store.db")
+            names = busy + ["Rare"]
+            aggregate_store.write_store([{"name": name} for name in names], [(2024, 1)], daily, rows, 0, path)
+            conn = aggregate_store.connect(path)
+            try:
+                ranked = aggregate_store.response(conn, top="all", sort="my_response")["rows"]
+            finally:
+                conn.close()
+        self.assertEqual([row["name"] for row in ranked], busy)
+
+
+class SeriesBoundsTest(unittest.TestCase):
+    def test_explicit_level_and_top_are_bounded(self):
+        names = [f"C{i:03d}" for i in range(aggregate_store.MAX_SERIES_TOP + 20)]
+        first, last = date(2010, 1, 1).toordinal(), date(2024, 12, 31).toordinal()
+        daily = {(day, name): [1, 1] for name in names for day in (first, last)}
+        months = generate_months(2010, 1, 2025, 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "store.db")
+            aggregate_store.write_store([{"name": name} for name in names], months, daily, [], 0, path)
+            conn = aggregate_store.connect(path)
+            try:
+                result = aggregate_store.series(conn, level="day", top="all")
+            finally:
+                conn.close()
+        budget = aggregate_store.DEFAULT_WIDTH // aggregate_store.MIN_POINT_PX
+        self.assertNotEqual(result["level"], "day")
+        self.assertLessEqual(len(result["periods"]), budget)
+        self.assertEqual(len(result["rows"]), aggregate_store.MAX_SERIES_TOP)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Handle resolution, and the digits_only() copies in the single-file scripts."""
+
+import ast
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+from contact_index import build_index, resolve_names  # noqa: E402
+
+# Scripts downloaded on their own keep a copy of contact_index's digit stripping
+COPIES = ("combined_wrapped.py", "imessage_wrapped.py", "people_wrapped.py", "localbrief.py")
+
+
+def digit_helpers(filename):
+    """ast.dump of the module-level NON_DIGITS value and digits_only body (docstring dropped)."""
+    with open(os.path.join(ROOT, filename), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename)
+    found = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and [getattr(t, "id", None) for t in node.targets] == ["NON_DIGITS"]:
+            found["NON_DIGITS"] = ast.dump(node.value)
+        elif isinstance(node, ast.FunctionDef) and node.name == "digits_only":
+            body = node.body[1:] if ast.get_docstring(node) is not None else node.body
+            found["digits_only"] = ast.dump(ast.Module(body=body, type_ignores=[])) + ast.dump(node.args)
+    return found
+
+
+class DigitsOnlyCopiesTest(unittest.TestCase):
+    def test_copies_match_contact_index(self):
+        reference = digit_helpers("contact_index.py")
+        self.assertEqual(set(reference), {"NON_DIGITS", "digits_only"})
+        for filename in COPIES:
+            with self.subTest(filename):
+                self.assertEqual(digit_helpers(filename), reference)
+
+
+class ResolveNamesTest(unittest.TestCase):
+    def test_full_and_last10_keys_win_over_last7(self):
+        contacts = build_index([("+1 (415) 555-0100", "Alice"), ("(212) 555-0100", "Bob")], [])
+        resolved = resolve_names(["+14155550100", "2125550100", "+12125550100"], contacts)
+        self.assertEqual(resolved, {"+14155550100": "Alice", "2125550100": "Bob", "+12125550100": "Bob"})
+
+    def test_last7_fallback_only_when_unambiguous(self):
+        contacts = build_index([("+1 (415) 555-0100", "Alice"), ("(212) 555-0100", "Bob"), ("650-555-0199", "Cara")], [])
+        # 555-0100 belongs to two people, so an unknown area code must not pick either
+        self.assertEqual(resolve_names(["+13105550100"], contacts), {"+13105550100": "+13105550100"})
+        self.assertEqual(resolve_names(["555-0100"], contacts), {"555-0100": "555-0100"})
+        # 555-0199 has a single owner, so the local form still resolves
+        self.assertEqual(resolve_names(["555-0199", "+17075550199"], contacts), {"555-0199": "Cara", "+17075550199": "Cara"})
+
+    def test_same_name_twice_is_not_ambiguous(self):
+        contacts = build_index([("415-555-0100", "Alice"), ("+44 20 7946 555-0100", "Alice")], [])
+        self.assertEqual(resolve_names(["555-0100"], contacts), {"555-0100": "Alice"})
+
+    def test_bare_seven_digit_contact(self):
+        # A contact saved as a bare 7-digit number matches itself and, as the only owner, the local key
+        contacts = build_index([("5550100", "Dan")], [])
+        self.assertEqual(resolve_names(["5550100", "+14155550100"], contacts), {"5550100": "Dan", "+14155550100": "Dan"})
+
+
+if __name__ == "__main__":
+    unittest.main()
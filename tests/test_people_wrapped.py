@@ -0,0 +1,116 @@
+"""Appending from saved state must give what one pass over the whole messages file gives."""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import people_wrapped  # noqa: E402
+from people_wrapped import Digest, NearDuplicates, resume_state, save_state, write_messages  # noqa: E402
+
+
+def fixture_messages(n, seed=0):
+    rng = random.Random(seed)
+    words = "see you at the usual place tomorrow bring the book we talked about last week".split()
+    template = "Reminder: the building water will be shut off between 9am and noon for maintenance"
+    ts = 1735689600
+    messages = []
+    for _ in range(n):
+        ts += rng.randint(60, 86400)
+        text = template + " " + rng.choice(words) if rng.random() < 0.2 else " ".join(rng.choices(words, k=rng.randint(3, 15)))
+        messages.append({"text": text, "from_me": rng.random() < 0.5, "ts": ts, "platform": "imessage"})
+    return messages
+
+
+def kept(messages, near):
+    return [m for m in messages if not near.seen(m["text"])]
+
+
+class ResumeStateTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.messages_path = os.path.join(self.dir.name, "01_A.ndjson")
+        self.state_path = os.path.join(self.dir.name, "01_A" + people_wrapped.STATE_EXT)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_append_from_state_matches_single_pass(self):
+        messages = fixture_messages(600)
+        head, new = messages[:450], messages[450:]
+
+        near, digest = NearDuplicates(), Digest(4000)
+        _, sha, _ = write_messages(self.messages_path, kept(head, near), digest=digest)
+        save_state(self.state_path, self.messages_path, sha, near, near.threshold, digest)
+
+        near, digest = resume_state(self.state_path, self.messages_path, NearDuplicates().threshold, 4000)
+        write_messages(self.messages_path, kept(new, near), append=True, digest=digest)
+        appended = os.path.join(self.dir.name, "appended.digest.ndjson")
+        digest.write(appended)
+
+        near_once, digest_once = NearDuplicates(), Digest(4000)
+        whole = os.path.join(self.dir.name, "whole.ndjson")
+        write_messages(whole, kept(messages, near_once), digest=digest_once)
+        once = os.path.join(self.dir.name, "once.digest.ndjson")
+        digest_once.write(once)
+
+        with open(self.messages_path, "rb") as a, open(whole, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        with open(appended, "rb") as a, open(once, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual(near.kept, near_once.kept)
+        self.assertEqual(json.dumps(digest.state()), json.dumps(digest_once.state()))
+
+    def test_stale_state_is_rebuilt_from_the_file(self):
+        messages = fixture_messages(200, seed=1)
+        near, digest = NearDuplicates(), Digest(4000)
+        _, sha, _ = write_messages(self.messages_path, kept(messages[:100], near), digest=digest)
+        save_state(self.state_path, self.messages_path, sha, near, near.threshold, digest)
+        # Appended after the state was saved, as by an interrupted run
+        write_messages(self.messages_path, kept(messages[100:], near), append=True, digest=digest)
+
+        resumed_near, resumed_digest = resume_state(self.state_path, self.messages_path, near.threshold, 4000)
+        self.assertEqual(resumed_near.kept, near.kept)
+        self.assertEqual(resumed_digest.state(), digest.state())
+
+
+class RestoreMovingTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_dir = people_wrapped.DATA_DIR
+        people_wrapped.DATA_DIR = self.dir.name
+
+    def tearDown(self):
+        people_wrapped.DATA_DIR = self.data_dir
+        self.dir.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir.name, name), "w") as f:
+            f.write(content)
+
+    def header(self, index, name):
+        return json.dumps({"index": index, "name": name, "handles": {"imessage": name}, "total": 3, "sent": 1,
+                           "received": 2, "message_count": 1, "messages_file": f"{index + 1:02d}_{name}.ndjson",
+                           "summary": f"about {name}"})
+
+    def test_interrupted_rank_change_is_undone(self):
+        moving = people_wrapped.MOVING_EXT
+        self.write("02_B.json" + moving, self.header(1, "B"))
+        self.write("02_B.ndjson" + moving, '{"text": "hi there", "ts": 0}\n')
+        # Taken over by another contact before the run stopped
+        self.write("03_C.json", self.header(2, "C"))
+        self.write("03_C.json" + moving, self.header(2, "stale"))
+
+        self.assertTrue(people_wrapped.restore_moving())
+        self.assertEqual(sorted(os.listdir(self.dir.name)), ["02_B.json", "02_B.ndjson", "03_C.json"])
+        self.assertFalse(people_wrapped.restore_moving())
+        contacts = people_wrapped.load_manifest()["contacts"]
+        self.assertEqual([(e["name"], e["has_summary"]) for e in contacts], [("B", True), ("C", True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""The exporter's sketched response-time quantiles must stay within 1% of the exact ones."""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from quantile_sketch import MIN_VALUE, RELATIVE_ACCURACY  # noqa: E402
+from query_messages_detailed import MINUTE_NS, add_response_gap, new_response_cell, response_values  # noqa: E402
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def fixture_chats(seed=0, chats=40):
+    """Synthetic 1:1 chats as lists of (is_from_me, date_ns), in date order.
+    Reply gaps are mostly quick with a long tail; some exceed the 24h reply window."""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(chats):
+        date_ns, rows = 0, []
+        for _ in range(rng.randint(1, 3000)):
+            date_ns += int(rng.lognormvariate(1.5, 2.2) * MINUTE_NS)
+            rows.append((int(rng.random() < 0.5), date_ns))
+        result.append(rows)
+    return result
+
+
+def exact_gaps(rows):
+    """(my_gaps, their_gaps) in minutes: direction changes between consecutive messages within 24h."""
+    mine, theirs = [], []
+    for (prev_from_me, prev_ns), (is_from_me, date_ns) in zip(rows, rows[1:]):
+        gap = (date_ns - prev_ns) / MINUTE_NS
+        if gap > 24 * 60 or prev_from_me == is_from_me:
+            continue
+        (mine if is_from_me else theirs).append(gap)
+    return mine, theirs
+
+
+def exact_quantile(gaps, q):
+    return sorted(gaps)[int(q * len(gaps))] if gaps else None
+
+
+class ResponseQuantilesTest(unittest.TestCase):
+    def assert_close(self, reported, exact):
+        if exact is None or exact < MIN_VALUE:
+            # Empty sides and sub-MIN_VALUE gaps are exported as blanks
+            self.assertIsNone(reported)
+            return
+        # Sketch error plus the exporter's rounding to 0.1 min
+        self.assertLessEqual(abs(reported - exact), RELATIVE_ACCURACY * exact + 0.05 + 1e-9, (reported, exact))
+
+    def test_exporter_quantiles_match_exact(self):
+        for rows in fixture_chats():
+            cell = new_response_cell()
+            for (prev_from_me, prev_ns), (is_from_me, date_ns) in zip(rows, rows[1:]):
+                add_response_gap(cell, prev_from_me, is_from_me, prev_ns, date_ns)
+            mine, theirs = exact_gaps(rows)
+            values = response_values(cell)
+            if not (mine or theirs):
+                self.assertIsNone(values)
+                continue
+            my_median, their_median, my_count, their_count, my_p90, their_p90, my_p99, their_p99 = values
+            self.assertEqual((my_count, their_count), (len(mine), len(theirs)))
+            for q, mine_reported, theirs_reported in zip(
+                QUANTILES, (my_median, my_p90, my_p99), (their_median, their_p90, their_p99)
+            ):
+                self.assert_close(mine_reported, exact_quantile(mine, q))
+                self.assert_close(theirs_reported, exact_quantile(theirs, q))
+
+    def test_sketch_within_relative_accuracy(self):
+        for rows in fixture_chats(seed=1):
+            cell = new_response_cell()
+            for (prev_from_me, prev_ns), (is_from_me, date_ns) in zip(rows, rows[1:]):
+                add_response_gap(cell, prev_from_me, is_from_me, prev_ns, date_ns)
+            for sketch, gaps in zip(
+                (cell["my_response_times"], cell["their_response_times"]), exact_gaps(rows)
+            ):
+                for q in QUANTILES:
+                    exact = exact_quantile(gaps, q)
+                    if exact is None:
+                        self.assertIsNone(sketch.quantile(q))
+                    elif exact < MIN_VALUE:
+                        self.assertEqual(sketch.quantile(q), 0.0)
+                    else:
+                        self.assertLessEqual(abs(sketch.quantile(q) - exact), RELATIVE_ACCURACY * exact + 1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
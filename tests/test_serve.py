@@ -0,0 +1,49 @@
+"""Conditional GETs and store lock handling in chart/serve.py."""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "chart"))
+
+import aggregate_store  # noqa: E402
+from serve import etag_matches  # noqa: E402
+
+
+class EtagMatchesTest(unittest.TestCase):
+    def test_header_is_a_list_compared_exactly(self):
+        self.assertTrue(etag_matches('"a1", W/"b2"', '"b2"'))
+        self.assertTrue(etag_matches('*', '"b2"'))
+        self.assertFalse(etag_matches('"xb2"', '"b2"'))
+        self.assertFalse(etag_matches('"b2b2"', '"b2"'))
+        self.assertFalse(etag_matches('', '"b2"'))
+
+
+class BusyStoreTest(unittest.TestCase):
+    def test_lock_is_told_apart_from_a_missing_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "store.db")
+            with self.assertRaises(sqlite3.Error) as missing:
+                aggregate_store.connect(path).execute("SELECT 1 FROM meta")
+            self.assertFalse(aggregate_store.is_busy(missing.exception))
+
+            writer = sqlite3.connect(path)
+            writer.execute("CREATE TABLE meta (key TEXT, value TEXT)")
+            writer.commit()
+            writer.execute("BEGIN EXCLUSIVE")
+            reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=0)
+            try:
+                with self.assertRaises(sqlite3.Error) as locked:
+                    reader.execute("SELECT 1 FROM meta")
+                self.assertTrue(aggregate_store.is_busy(locked.exception))
+            finally:
+                reader.close()
+                writer.rollback()
+                writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()